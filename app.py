@@ -19,6 +19,22 @@ from utils.response_utils import create_response
 from models.thirdparty import ThirdPartyDelivery
 from routes.media import media_bp
 from routes.aws import aws_bp
+from cache.image_dimensions import init_image_dimension_store
+from cache.dish_overview import init_dish_overview_cache
+from cache.delivery_platforms import init_delivery_platform_registry
+from cache.user_state import init_user_state_cache
+from cache.merchant_dishes import init_merchant_dish_cache
+from cache.known_media import init_known_media_cache
+from cache.fallback_flavor_tags import init_fallback_flavor_tag_cache
+from cache.geo_index import init_merchant_geo_index
+from cache.flavor_index import init_flavor_vector_index
+from cache.counter_buffer import init_counter_buffer
+from cache.idempotency import init_idempotency_store
+from services.rabbitmq_service import init_disk_spool, init_async_publisher, init_event_coalescer
+from services.outbox_relay import init_outbox
+from routes.metrics import metrics_bp
+from utils.background import init_background_workers
+from commands import register_commands
 
 def create_app():
     app = Flask(__name__)
@@ -30,7 +46,25 @@ def create_app():
     app.register_blueprint(user_actions_bp)
     app.register_blueprint(media_bp)
     app.register_blueprint(aws_bp)
+    app.register_blueprint(metrics_bp)
 
+    register_commands(app)
+    init_image_dimension_store(app)
+    init_dish_overview_cache(app)
+    init_delivery_platform_registry(app)
+    init_user_state_cache(app)
+    init_merchant_dish_cache(app)
+    init_known_media_cache(app)
+    init_fallback_flavor_tag_cache(app)
+    init_merchant_geo_index(app)
+    init_flavor_vector_index(app)
+    init_counter_buffer(app)
+    init_idempotency_store(app)
+    init_disk_spool(app)
+    init_async_publisher(app)
+    init_event_coalescer(app)
+    init_outbox(app)
+    init_background_workers(app)
 
     @app.errorhandler(404)
     def not_found(error):
@@ -0,0 +1,205 @@
+"""
+Write-behind counter buffer
+Coalesces +1/-1 counter deltas per row in process memory and applies them with
+one batched UPDATE ... FROM (VALUES ...) per counter, so a burst of likes on one
+taste becomes a single row update instead of hundreds serialized on its lock.
+
+Deltas are staged on the SQLAlchemy session and only enter the buffer when the
+action's transaction commits (a rollback drops them). The buffer is flushed
+every COUNTER_BUFFER_FLUSH_INTERVAL_MS, early once COUNTER_BUFFER_MAX_EVENTS
+deltas are pending, and at interpreter exit. Counters are eventually
+consistent within that window; reconcile-counters fixes anything lost to a
+crash. It skips rows with activity in the last COUNTER_RECONCILE_GRACE_SECONDS,
+whose deltas may still be buffered here and would otherwise count twice.
+"""
+
+import atexit
+import threading
+import time
+import logging
+from collections import defaultdict
+from sqlalchemy import event, values, column, func, String, Integer
+from sqlalchemy.orm import Session
+from extensions import db
+from models.dish import Dish
+from models.taste import Taste
+from cache.dish_overview import dish_overview_cache
+from utils.background import register_background_worker
+
+
+logger = logging.getLogger(__name__)
+
+
+_STAGED_KEY = 'counter_buffer_staged'
+
+
+class CounterBuffer:
+
+    DISH_RECOMMEND = 'dish_recommend'
+    TASTE_USEFUL = 'taste_useful'
+
+    #counter name -> (id column, counter column)
+    COUNTERS = {
+        DISH_RECOMMEND: (Dish._id, Dish.recommendedCount),
+        TASTE_USEFUL: (Taste._id, Taste.usefulTotal),
+    }
+
+    def __init__(self, max_events=500):
+        self.enabled = False
+        self.max_events = max_events
+
+        self._deltas = defaultdict(int)
+        self._pending_events = 0
+        self._oldest_pending = None
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self.wakeup = threading.Event()
+
+        self._metrics = {
+            'flushes': 0,
+            'failed_flushes': 0,
+            'flushed_events': 0,
+            'flushed_rows': 0,
+            'last_flush_ms': 0.0,
+            'max_flush_ms': 0.0
+        }
+
+    def apply(self, counter, rows):
+        """Add (row_id, delta) rows to a counter with one UPDATE ... FROM (VALUES ...), without committing"""
+        id_column, count_column = self.COUNTERS[counter]
+        batch = values(
+            column('id', String), column('delta', Integer), name='deltas'
+        ).data(rows)
+
+        model = id_column.class_
+        db.session.execute(
+            db.update(model)
+            .where(id_column == batch.c.id)
+            #counter changes are not edits, keep updatedAt (Taste bumps it on every UPDATE otherwise)
+            .values({count_column: func.coalesce(count_column, 0) + batch.c.delta, model.updatedAt: model.updatedAt})
+        )
+
+    def stage(self, session, counter, row_id, delta):
+        """Attach a delta to the session's transaction, it is buffered on commit"""
+        if delta:
+            session.info.setdefault(_STAGED_KEY, []).append((counter, row_id, delta))
+
+    def add(self, counter, row_id, delta, events=1):
+        with self._lock:
+            self._deltas[(counter, row_id)] += delta
+            self._pending_events += events
+            if self._oldest_pending is None:
+                self._oldest_pending = time.monotonic()
+            full = self._pending_events >= self.max_events
+
+        if full:
+            self.wakeup.set()
+
+    def _take(self):
+        with self._lock:
+            deltas = {key: delta for key, delta in self._deltas.items() if delta}
+            events = self._pending_events
+            self._deltas = defaultdict(int)
+            self._pending_events = 0
+            self._oldest_pending = None
+        return deltas, events
+
+    def _restore(self, deltas, events):
+        #a failed flush puts its deltas back in front of anything added meanwhile
+        with self._lock:
+            for key, delta in deltas.items():
+                self._deltas[key] += delta
+            self._pending_events += events
+            if self._oldest_pending is None:
+                self._oldest_pending = time.monotonic()
+
+    def flush(self):
+        """
+        Apply every pending delta, one UPDATE per counter.
+
+        Returns:
+            int: Number of rows updated
+        """
+        with self._flush_lock:
+            deltas, events = self._take()
+            if not deltas:
+                return 0
+
+            started = time.monotonic()
+            by_counter = defaultdict(list)
+            for (counter, row_id), delta in deltas.items():
+                by_counter[counter].append((row_id, delta))
+
+            try:
+                for counter, rows in by_counter.items():
+                    self.apply(counter, rows)
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                self._restore(deltas, events)
+                self._metrics['failed_flushes'] += 1
+                logger.error(f"Counter buffer flush failed: {str(e)}")
+                return 0
+
+            elapsed_ms = (time.monotonic() - started) * 1000
+            self._metrics['flushes'] += 1
+            self._metrics['flushed_events'] += events
+            self._metrics['flushed_rows'] += len(deltas)
+            self._metrics['last_flush_ms'] = elapsed_ms
+            self._metrics['max_flush_ms'] = max(self._metrics['max_flush_ms'], elapsed_ms)
+
+            dish_overview_cache.invalidate_many(
+                [row_id for row_id, _ in by_counter.get(self.DISH_RECOMMEND, [])]
+            )
+            return len(deltas)
+
+    def metrics(self):
+        with self._lock:
+            pending_keys = len(self._deltas)
+            pending_events = self._pending_events
+            oldest_pending = self._oldest_pending
+
+        return {
+            'enabled': self.enabled,
+            'pending_keys': pending_keys,
+            'pending_events': pending_events,
+            'oldest_pending_ms': (time.monotonic() - oldest_pending) * 1000 if oldest_pending else 0.0,
+            **self._metrics
+        }
+
+
+counter_buffer = CounterBuffer()
+
+
+@event.listens_for(Session, 'after_commit')
+def _buffer_committed_deltas(session):
+    staged = session.info.pop(_STAGED_KEY, None)
+    for counter, row_id, delta in staged or ():
+        counter_buffer.add(counter, row_id, delta)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _drop_rolled_back_deltas(session):
+    session.info.pop(_STAGED_KEY, None)
+
+
+def init_counter_buffer(app):
+    counter_buffer.enabled = app.config.get('COUNTER_BUFFER_ENABLED', False)
+    counter_buffer.max_events = app.config.get('COUNTER_BUFFER_MAX_EVENTS', 500)
+
+    if not counter_buffer.enabled:
+        return
+
+    register_background_worker(
+        app,
+        name='counter-buffer',
+        target=counter_buffer.flush,
+        interval=app.config.get('COUNTER_BUFFER_FLUSH_INTERVAL_MS', 200) / 1000,
+        wakeup=counter_buffer.wakeup
+    )
+
+    def flush_on_exit():
+        with app.app_context():
+            counter_buffer.flush()
+
+    atexit.register(flush_on_exit)
@@ -0,0 +1,137 @@
+"""
+Delivery platform registry
+Process-wide copy of the thirdPartyDeliveries table with pre-parsed redirect url
+templates, so delivery links are built with in-memory string formatting.
+Loaded at startup, refreshed lazily after the TTL, and invalidated immediately
+when DeliveryService creates a platform.
+"""
+
+import threading
+import time
+import logging
+from string import Formatter
+from models.thirdparty import ThirdPartyDelivery
+
+
+logger = logging.getLogger(__name__)
+
+
+class DeliveryPlatform:
+    """Read-only snapshot of a ThirdPartyDelivery row"""
+
+    __slots__ = ('_id', 'name', 'icon', 'redirect_url', '_pieces', '_prefix')
+
+    def __init__(self, _id, name, icon, redirect_url):
+        self._id = _id
+        self.name = name
+        self.icon = icon
+        self.redirect_url = redirect_url
+        self._pieces = None
+        self._prefix = None
+
+        if not redirect_url:
+            return
+
+        if '{external_id}' in redirect_url:
+            pieces = list(Formatter().parse(redirect_url))
+            if all(field in (None, 'external_id') and not spec and not conversion
+                   for _, field, spec, conversion in pieces):
+                self._pieces = [(literal, field is not None) for literal, field, _, _ in pieces]
+        else:
+            separator = '' if redirect_url.endswith('/') else '/'
+            self._prefix = f"{redirect_url}{separator}"
+
+    def construct_url(self, external_id):
+        """Same output as ThirdPartyDelivery.construct_url"""
+        if not external_id or not self.redirect_url:
+            return None
+
+        if self._prefix is not None:
+            return f"{self._prefix}{external_id}"
+
+        if self._pieces is not None:
+            external_id = str(external_id)
+            return ''.join(literal + external_id if has_field else literal
+                           for literal, has_field in self._pieces)
+
+        # unusual template (format spec, other fields), keep the model's behaviour
+        return self.redirect_url.format(external_id=external_id)
+
+
+class DeliveryPlatformRegistry:
+
+    def __init__(self, ttl_seconds=300):
+        self.ttl_seconds = ttl_seconds
+        self._platforms = ()
+        self._by_name = {}
+        self._loaded_at = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        platforms = tuple(
+            DeliveryPlatform(row._id, row.name, row.icon, row.redirect_url)
+            for row in ThirdPartyDelivery.get_all_active_platforms()
+        )
+
+        with self._lock:
+            self._platforms = platforms
+            self._by_name = {platform.name: platform for platform in platforms}
+            self._loaded_at = time.monotonic()
+
+        return platforms
+
+    def _ensure_fresh(self):
+        loaded_at = self._loaded_at
+        if loaded_at is not None and time.monotonic() - loaded_at < self.ttl_seconds:
+            return
+
+        try:
+            self.load()
+        except Exception as e:
+            # keep serving the previous snapshot if the refresh fails
+            logger.error(f"Failed to refresh delivery platforms: {str(e)}")
+            if loaded_at is None:
+                raise
+
+    def all(self):
+        self._ensure_fresh()
+        return self._platforms
+
+    def get(self, name):
+        self._ensure_fresh()
+        return self._by_name.get(name)
+
+    def invalidate(self):
+        self._loaded_at = None
+
+    def links_for(self, external_ids):
+        """
+        Args:
+            external_ids: {platform name: merchant external id}
+
+        Returns:
+            list: (platform, url) pairs for the platforms the merchant is on
+        """
+        links = []
+        for platform in self.all():
+            external_id = external_ids.get(platform.name)
+            if external_id:
+                delivery_url = platform.construct_url(external_id)
+                if delivery_url:
+                    links.append((platform, delivery_url))
+        return links
+
+
+delivery_platform_registry = DeliveryPlatformRegistry()
+
+
+def init_delivery_platform_registry(app):
+    delivery_platform_registry.ttl_seconds = app.config.get('DELIVERY_PLATFORM_REGISTRY_TTL', 300)
+
+    with app.app_context():
+        try:
+            platforms = delivery_platform_registry.load()
+            print(f"Delivery platform registry loaded {len(platforms)} platforms")
+        except Exception as e:
+            # loaded lazily on first use instead
+            print(f"Delivery platform registry load failed: {e}")
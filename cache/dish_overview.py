@@ -0,0 +1,62 @@
+"""
+Dish overview cache
+Holds the non-personal part of the dish overview payload per dish_id.
+Per-user fields (isCollected, isRecommended, merchant.distance_km) are layered
+on top of a cached entry by DishService for every request.
+
+Entries are invalidated explicitly when the dish or its recommend count changes
+in this process; the TTL bounds staleness for writes made by other workers.
+"""
+
+from cache.ttl_cache import TTLCache
+
+
+class DishOverviewCache:
+
+    def __init__(self, ttl_seconds=120, max_size=10000):
+        self._cache = TTLCache(ttl_seconds, max_size=max_size)
+
+    def configure(self, ttl_seconds, max_size):
+        self._cache = TTLCache(ttl_seconds, max_size=max_size)
+
+    def get(self, dish_id):
+        return self._cache.get(dish_id)
+
+    def get_many(self, dish_ids):
+        return self._cache.get_many(dish_ids)
+
+    def set(self, dish_id, payload, latitude=None, longitude=None):
+        """
+        Args:
+            dish_id: Dish ID
+            payload: dish_overview_schema output without per-user fields
+            latitude/longitude: Merchant coordinates for the distance overlay
+
+        Returns:
+            dict: The cached entry
+        """
+        entry = {
+            "payload": payload,
+            "latitude": latitude,
+            "longitude": longitude
+        }
+        return self._cache.set(dish_id, entry)
+
+    def invalidate(self, dish_id):
+        self._cache.delete(dish_id)
+
+    def invalidate_many(self, dish_ids):
+        self._cache.delete_many(dish_ids)
+
+    def clear(self):
+        self._cache.clear()
+
+
+dish_overview_cache = DishOverviewCache()
+
+
+def init_dish_overview_cache(app):
+    dish_overview_cache.configure(
+        ttl_seconds=app.config.get('DISH_OVERVIEW_CACHE_TTL', 120),
+        max_size=app.config.get('DISH_OVERVIEW_CACHE_MAX_SIZE', 10000)
+    )
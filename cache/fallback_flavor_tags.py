@@ -0,0 +1,41 @@
+"""
+Fallback flavor tag cache
+Process-local cache of flavor tags FlavorTagStore computed from the profile for
+dishes without a current dishFlavorTags entry, so overview misses do not reload
+the wide DishProfile row every time. Dishes without a profile are cached as None.
+Entries expire after the TTL, by then the recompute job has usually stored them.
+"""
+
+from cache.ttl_cache import TTLCache
+
+
+class FallbackFlavorTagCache:
+
+    def __init__(self, ttl_seconds=600, max_size=10000):
+        self._cache = TTLCache(ttl_seconds, max_size=max_size)
+
+    def configure(self, ttl_seconds, max_size):
+        self._cache = TTLCache(ttl_seconds, max_size=max_size)
+
+    def get_many(self, dish_ids):
+        """
+        Returns:
+            dict: dish_id -> formatted tags (None for dishes without a profile), for the cached dishes
+        """
+        return self._cache.get_many(dish_ids)
+
+    def set(self, dish_id, tags):
+        self._cache.set(dish_id, tags)
+
+    def clear(self):
+        self._cache.clear()
+
+
+fallback_flavor_tag_cache = FallbackFlavorTagCache()
+
+
+def init_fallback_flavor_tag_cache(app):
+    fallback_flavor_tag_cache.configure(
+        ttl_seconds=app.config.get('FLAVOR_TAG_FALLBACK_CACHE_TTL', 600),
+        max_size=app.config.get('FLAVOR_TAG_FALLBACK_CACHE_MAX_SIZE', 10000)
+    )
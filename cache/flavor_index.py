@@ -0,0 +1,287 @@
+"""
+Flavor vector index
+Every dish profile's flavor/texture scalars, L2-normalized into one contiguous
+float32 matrix, so "similar dishes" is a cosine top-k over an in-memory matmul.
+The background worker does the first load; later ticks only read profiles
+with an id above the last one seen (new model batches) and overwrite or append
+rows. Profiles rewritten in place keep their id, so the whole index is rebuilt
+off to the side every FLAVOR_INDEX_REBUILD_INTERVAL and swapped in. Requests
+never load the index themselves and get a "not ready" answer until it is.
+"""
+
+import time
+import threading
+import logging
+import numpy as np
+from flask import current_app
+from sqlalchemy import func
+from extensions import db
+from models.dish import Dish
+from models.dish_profile import DishProfile
+from utils.background import register_background_worker
+
+
+logger = logging.getLogger(__name__)
+
+
+class FlavorVectorIndex:
+
+    def __init__(self, block_size=65536, load_batch_size=20000):
+        self.block_size = block_size
+        self.load_batch_size = load_batch_size
+        self.dimensions = len(DishProfile.SCORE_FIELDS)
+
+        self._vectors = np.zeros((0, self.dimensions), dtype=np.float32)
+        self._merchant_codes = np.zeros(0, dtype=np.int32)
+        self._cuisine_codes = np.zeros(0, dtype=np.int32)
+        self._size = 0
+
+        self._dish_ids = []
+        self._row_by_dish = {}
+        self._merchant_code_by_id = {}
+        self._cuisine_code_by_name = {}
+        self._last_profile_id = None
+
+        self._lock = threading.Lock()
+        #serializes refresh / rebuild, the DB reads happen outside _lock
+        self._load_lock = threading.Lock()
+        self._loader = None
+        #set when the background worker loads the index, requests then never start a loader
+        self.worker_enabled = False
+        self._last_rebuild = 0.0
+        self.rebuild_interval = 3600
+        self.loaded = False
+
+    def _code(self, codes, key):
+        if key not in codes:
+            codes[key] = len(codes)
+        return codes[key]
+
+    def _grow(self, needed):
+        capacity = self._vectors.shape[0]
+        if needed <= capacity:
+            return
+
+        capacity = max(needed, capacity * 2, 1024)
+        vectors = np.zeros((capacity, self.dimensions), dtype=np.float32)
+        vectors[:self._size] = self._vectors[:self._size]
+        merchant_codes = np.full(capacity, -1, dtype=np.int32)
+        merchant_codes[:self._size] = self._merchant_codes[:self._size]
+        cuisine_codes = np.full(capacity, -1, dtype=np.int32)
+        cuisine_codes[:self._size] = self._cuisine_codes[:self._size]
+
+        #readers holding the old arrays keep a consistent view
+        self._vectors, self._merchant_codes, self._cuisine_codes = vectors, merchant_codes, cuisine_codes
+
+    def _fetch(self, last_profile_id):
+        #coalesce missing scores to 0 like the tag generator, profiles are joined to dishes by pg_id
+        columns = [func.coalesce(getattr(DishProfile, field), 0) for field in DishProfile.SCORE_FIELDS]
+        query = db.session.query(
+            DishProfile.id, Dish._id, Dish.merchant_col, DishProfile.background_cuisine, *columns
+        ).join(Dish, Dish.pg_id == DishProfile.dish_id).order_by(DishProfile.id)
+
+        if last_profile_id is not None:
+            query = query.filter(DishProfile.id > last_profile_id)
+
+        return query.limit(self.load_batch_size).all()
+
+    def refresh(self):
+        """
+        Read profiles newer than the last one indexed; later profiles of a dish replace its row.
+
+        Returns:
+            int: Number of profiles applied
+        """
+        applied = 0
+
+        with self._load_lock:
+            while True:
+                rows = self._fetch(self._last_profile_id)
+                if not rows:
+                    break
+
+                vectors = np.array([row[4:] for row in rows], dtype=np.float32)
+                norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+                vectors = np.divide(vectors, norms, out=np.zeros_like(vectors), where=norms > 0)
+
+                with self._lock:
+                    self._grow(self._size + len(rows))
+
+                    for row, vector in zip(rows, vectors):
+                        dish_id = row[1]
+                        index = self._row_by_dish.get(dish_id)
+                        if index is None:
+                            index = self._size
+                            self._row_by_dish[dish_id] = index
+                            self._dish_ids.append(dish_id)
+                            self._size += 1
+
+                        self._vectors[index] = vector
+                        self._merchant_codes[index] = self._code(self._merchant_code_by_id, row[2])
+                        cuisine = row[3].strip().lower() if row[3] else None
+                        self._cuisine_codes[index] = self._code(self._cuisine_code_by_name, cuisine) if cuisine else -1
+
+                    self._last_profile_id = rows[-1][0]
+                applied += len(rows)
+
+            self.loaded = True
+
+        return applied
+
+    def rebuild(self):
+        """
+        Load every profile into a fresh index and swap it in, so profiles rewritten
+        in place (same id, new scores) and deleted profiles are picked up.
+
+        Returns:
+            int: Number of dishes indexed
+        """
+        fresh = FlavorVectorIndex(block_size=self.block_size, load_batch_size=self.load_batch_size)
+        fresh.refresh()
+
+        with self._load_lock:
+            with self._lock:
+                self._vectors, self._merchant_codes, self._cuisine_codes = (
+                    fresh._vectors, fresh._merchant_codes, fresh._cuisine_codes
+                )
+                self._size = fresh._size
+                self._dish_ids, self._row_by_dish = fresh._dish_ids, fresh._row_by_dish
+                self._merchant_code_by_id = fresh._merchant_code_by_id
+                self._cuisine_code_by_name = fresh._cuisine_code_by_name
+                self._last_profile_id = fresh._last_profile_id
+            self._last_rebuild = time.monotonic()
+            self.loaded = True
+
+        return fresh._size
+
+    def run_worker_tick(self):
+        #the first tick (and every rebuild interval) loads everything, the others pick up new model batches
+        if not self.loaded or time.monotonic() - self._last_rebuild >= self.rebuild_interval:
+            indexed = self.rebuild()
+            logger.info(f"Flavor index rebuilt, {indexed} dishes indexed")
+            return
+
+        applied = self.refresh()
+        if applied:
+            logger.info(f"Flavor index applied {applied} profiles, {self._size} dishes indexed")
+
+    def _load_in_background(self, app):
+        try:
+            with app.app_context():
+                self.rebuild()
+        except Exception as e:
+            logger.error(f"Flavor index load failed: {str(e)}")
+        finally:
+            self._loader = None
+
+    def ensure_loaded(self):
+        """
+        Start loading the index in the background when no worker does, never blocks.
+
+        Returns:
+            bool: True if the index is loaded
+        """
+        if self.loaded:
+            return True
+
+        with self._lock:
+            if self._loader is None and not self.worker_enabled:
+                self._loader = threading.Thread(
+                    target=self._load_in_background,
+                    args=(current_app._get_current_object(),),
+                    name='flavor-vector-index-load',
+                    daemon=True
+                )
+                self._loader.start()
+        return False
+
+    def __contains__(self, dish_id):
+        return dish_id in self._row_by_dish
+
+    def __len__(self):
+        return self._size
+
+    def similar(self, dish_id, k=10, cuisine=None, merchant_ids=None):
+        """
+        Top-k dishes by cosine similarity to dish_id.
+
+        Args:
+            dish_id: Dish ID (Dish._id) of the query dish
+            k: Number of results
+            cuisine: Optional background_cuisine to restrict results to (case-insensitive)
+            merchant_ids: Optional iterable of merchant IDs to restrict results to
+
+        Returns:
+            list: (dish_id, similarity) best first, or None if the dish is not indexed
+        """
+        #one consistent view; a refresh only appends past size, a rebuild swaps in new objects
+        with self._lock:
+            vectors, merchant_codes, cuisine_codes = self._vectors, self._merchant_codes, self._cuisine_codes
+            size = self._size
+            dish_ids, row_by_dish = self._dish_ids, self._row_by_dish
+            merchant_code_by_id, cuisine_code_by_name = self._merchant_code_by_id, self._cuisine_code_by_name
+
+            index = row_by_dish.get(dish_id)
+            if index is None:
+                return None
+            query = vectors[index].copy()
+
+        mask = None
+        if cuisine is not None:
+            code = cuisine_code_by_name.get(cuisine.strip().lower())
+            if code is None:
+                return []
+            mask = cuisine_codes[:size] == code
+
+        if merchant_ids is not None:
+            codes = [merchant_code_by_id[merchant_id] for merchant_id in merchant_ids
+                     if merchant_id in merchant_code_by_id]
+            merchant_mask = np.isin(merchant_codes[:size], np.array(codes, dtype=np.int32))
+            mask = merchant_mask if mask is None else mask & merchant_mask
+
+        best_rows = np.zeros(0, dtype=np.int64)
+        best_scores = np.zeros(0, dtype=np.float32)
+
+        #blocked matmul keeps the temporary score buffer small
+        for start in range(0, size, self.block_size):
+            end = min(start + self.block_size, size)
+            scores = vectors[start:end] @ query
+
+            if mask is not None:
+                scores[~mask[start:end]] = -np.inf
+            if start <= index < end:
+                scores[index - start] = -np.inf
+
+            if k < len(scores):
+                top = np.argpartition(-scores, k)[:k]
+            else:
+                top = np.arange(len(scores))
+            top = top[np.isfinite(scores[top])]
+
+            best_rows = np.concatenate([best_rows, top + start])
+            best_scores = np.concatenate([best_scores, scores[top]])
+
+            if len(best_rows) > k:
+                keep = np.argpartition(-best_scores, k)[:k]
+                best_rows, best_scores = best_rows[keep], best_scores[keep]
+
+        order = np.lexsort((best_rows, -best_scores))[:k]
+        return [(dish_ids[row], float(best_scores[i])) for i, row in zip(order, best_rows[order])]
+
+
+flavor_vector_index = FlavorVectorIndex()
+
+
+def init_flavor_vector_index(app):
+    flavor_vector_index.block_size = app.config.get('FLAVOR_INDEX_BLOCK_SIZE', 65536)
+    flavor_vector_index.rebuild_interval = app.config.get('FLAVOR_INDEX_REBUILD_INTERVAL', 3600)
+
+    #the first tick does the full load, later ticks pick up new model batches
+    if app.config.get('FLAVOR_INDEX_WORKER_ENABLED', False):
+        flavor_vector_index.worker_enabled = True
+        register_background_worker(
+            app,
+            name='flavor-vector-index',
+            target=flavor_vector_index.run_worker_tick,
+            interval=app.config.get('FLAVOR_INDEX_REFRESH_INTERVAL', 600)
+        )
@@ -0,0 +1,171 @@
+"""
+Merchant geo index
+In-memory grid over merchant coordinates for "near me" queries. Merchants are
+bucketed into fixed-size lat/lon cells; a radius query only visits the cells
+overlapping its bounding box and computes exact distances for those candidates
+with vectorized haversine. Refreshes diff the (id, lat, lon) projection against
+the current snapshot and only rebuild the cells that changed.
+"""
+
+import math
+import threading
+import logging
+import numpy as np
+from extensions import db
+from models.merchant import Merchant
+from utils.background import register_background_worker
+from utils.geo_utils import haversine_many, KM_PER_DEGREE_LAT
+
+
+logger = logging.getLogger(__name__)
+
+
+class _Snapshot:
+    """Immutable index state, swapped atomically on refresh"""
+
+    __slots__ = ('positions', 'cells')
+
+    def __init__(self, positions, cells):
+        #merchant_id -> (lat, lon)
+        self.positions = positions
+        #(cell_lat, cell_lon) -> (merchant ids, lat radians, lon radians)
+        self.cells = cells
+
+
+class MerchantGeoIndex:
+
+    def __init__(self, cell_size_deg=0.05):
+        self.cell_size_deg = cell_size_deg
+        self._snapshot = _Snapshot({}, {})
+        self._lock = threading.Lock()
+        self.loaded = False
+
+    def _cell_of(self, lat, lon):
+        return (math.floor(lat / self.cell_size_deg), math.floor(lon / self.cell_size_deg))
+
+    def _build_cell(self, members, positions):
+        merchant_ids = sorted(members)
+        latitudes = np.radians(np.array([positions[merchant_id][0] for merchant_id in merchant_ids]))
+        longitudes = np.radians(np.array([positions[merchant_id][1] for merchant_id in merchant_ids]))
+        return (merchant_ids, latitudes, longitudes)
+
+    def refresh(self):
+        """
+        Re-read merchant coordinates and rebuild only the cells whose members moved.
+
+        Returns:
+            int: Number of merchants added, moved or removed
+        """
+        rows = db.session.query(Merchant._id, Merchant.latitude, Merchant.longitude).filter(
+            Merchant.latitude.isnot(None),
+            Merchant.longitude.isnot(None)
+        ).all()
+        positions = {merchant_id: (lat, lon) for merchant_id, lat, lon in rows}
+
+        with self._lock:
+            current = self._snapshot
+            dirty_cells = set()
+            changed = 0
+
+            for merchant_id, position in positions.items():
+                previous = current.positions.get(merchant_id)
+                if previous != position:
+                    changed += 1
+                    dirty_cells.add(self._cell_of(*position))
+                    if previous is not None:
+                        dirty_cells.add(self._cell_of(*previous))
+
+            for merchant_id, previous in current.positions.items():
+                if merchant_id not in positions:
+                    changed += 1
+                    dirty_cells.add(self._cell_of(*previous))
+
+            if not changed:
+                self.loaded = True
+                return 0
+
+            members = {cell: set() for cell in dirty_cells}
+            for merchant_id, position in positions.items():
+                cell = self._cell_of(*position)
+                if cell in members:
+                    members[cell].add(merchant_id)
+
+            #untouched cells are shared with the previous snapshot
+            cells = dict(current.cells)
+            for cell, cell_members in members.items():
+                if cell_members:
+                    cells[cell] = self._build_cell(cell_members, positions)
+                else:
+                    cells.pop(cell, None)
+
+            self._snapshot = _Snapshot(positions, cells)
+            self.loaded = True
+
+        return changed
+
+    def run_worker_tick(self):
+        changed = self.refresh()
+        if changed:
+            logger.info(f"Merchant geo index updated {changed} merchants")
+
+    def ensure_loaded(self):
+        if not self.loaded:
+            self.refresh()
+
+    def query(self, latitude, longitude, radius_km):
+        """
+        Args:
+            latitude/longitude: Search center
+            radius_km: Search radius in kilometres
+
+        Returns:
+            list: (merchant_id, distance_km) within the radius, nearest first
+        """
+        snapshot = self._snapshot
+
+        #bounding box in degrees of the spherical cap, longitude span widens towards the poles
+        lat_span = radius_km / KM_PER_DEGREE_LAT
+        cos_lat = max(math.cos(math.radians(latitude)), 1e-6)
+        sin_lon_span = math.sin(math.radians(lat_span)) / cos_lat
+        lon_span = math.degrees(math.asin(sin_lon_span)) if lat_span < 90 and sin_lon_span < 1 else 180.0
+
+        min_cell = self._cell_of(latitude - lat_span, longitude - lon_span)
+        max_cell = self._cell_of(latitude + lat_span, longitude + lon_span)
+
+        merchant_ids = []
+        latitudes = []
+        longitudes = []
+        for cell_lat in range(min_cell[0], max_cell[0] + 1):
+            for cell_lon in range(min_cell[1], max_cell[1] + 1):
+                cell = snapshot.cells.get((cell_lat, cell_lon))
+                if cell:
+                    merchant_ids.extend(cell[0])
+                    latitudes.append(cell[1])
+                    longitudes.append(cell[2])
+
+        if not merchant_ids:
+            return []
+
+        distances = haversine_many(latitude, longitude, np.concatenate(latitudes), np.concatenate(longitudes))
+        within = np.flatnonzero(distances <= radius_km)
+        order = within[np.argsort(distances[within], kind='stable')]
+
+        return [(merchant_ids[index], float(distances[index])) for index in order]
+
+    def __len__(self):
+        return len(self._snapshot.positions)
+
+
+merchant_geo_index = MerchantGeoIndex()
+
+
+def init_merchant_geo_index(app):
+    merchant_geo_index.cell_size_deg = app.config.get('MERCHANT_GEO_INDEX_CELL_DEG', 0.05)
+
+    if app.config.get('MERCHANT_GEO_INDEX_WORKER_ENABLED', False):
+        register_background_worker(
+            app,
+            name='merchant-geo-index',
+            target=merchant_geo_index.run_worker_tick,
+            interval=app.config.get('MERCHANT_GEO_INDEX_REFRESH_INTERVAL', 300)
+        )
@@ -0,0 +1,292 @@
+"""
+Idempotency store
+Idempotency-Key -> stored response for retried mutating requests, shared by
+every worker through the idempotencyKeys table. The first request claims its
+key with one INSERT ... ON CONFLICT, committed on its own connection, so a
+retry routed to another worker sees the claim right away: it waits for the
+stored response, or gets "in progress" after IDEMPOTENCY_WAIT_TIMEOUT. A claim
+whose owner crashed is taken over once its IDEMPOTENCY_LEASE_SECONDS lease ends.
+
+Only successful responses are stored (a failed attempt releases its claim, so
+a retry runs the action again). Stored responses are also kept in a process
+TTL cache, and duplicates within one worker wait on an in-process event, so a
+replay or a collapsed duplicate does not poll the DB. If the table cannot be
+reached the store falls back to deduplicating within the worker.
+"""
+
+import time
+import threading
+import logging
+from datetime import datetime, timedelta
+from sqlalchemy import select, delete, update, and_
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.dialects.postgresql import insert
+from extensions import db
+from models.idempotency_key import IdempotencyKey
+from cache.ttl_cache import TTLCache
+from utils.background import register_background_worker
+
+
+logger = logging.getLogger(__name__)
+
+
+class IdempotencyStore:
+
+    #outcomes of run()
+    EXECUTED = 'executed'
+    REPLAYED = 'replayed'
+    MISMATCH = 'mismatch'
+    IN_PROGRESS = 'in_progress'
+
+    POLL_INTERVAL_SECONDS = 0.1
+
+    def __init__(self, ttl_seconds=86400, max_size=100000, wait_timeout=10, lease_seconds=60):
+        self.ttl_seconds = ttl_seconds
+        self.wait_timeout = wait_timeout
+        self.lease_seconds = lease_seconds
+        self._responses = TTLCache(ttl_seconds, max_size=max_size)
+        self._in_flight = {}
+        self._lock = threading.Lock()
+
+        self._metrics = {
+            'executed': 0,
+            'replayed': 0,
+            'collapsed': 0,
+            'mismatched': 0,
+            'timed_out': 0,
+            'store_errors': 0,
+            'purged': 0
+        }
+
+    def configure(self, ttl_seconds, max_size, wait_timeout, lease_seconds):
+        self.ttl_seconds = ttl_seconds
+        self._responses = TTLCache(ttl_seconds, max_size=max_size)
+        self.wait_timeout = wait_timeout
+        self.lease_seconds = lease_seconds
+
+    def _replay(self, key, fingerprint):
+        stored = self._responses.get(key)
+        if stored is None:
+            return None
+
+        if stored[0] != fingerprint:
+            self._metrics['mismatched'] += 1
+            return (self.MISMATCH, None)
+
+        self._metrics['replayed'] += 1
+        return (self.REPLAYED, stored[1])
+
+    @staticmethod
+    def _where(key):
+        user_id, endpoint, idempotency_key = key
+        table = IdempotencyKey.__table__
+        return and_(table.c.userId == user_id, table.c.endpoint == endpoint, table.c.key == idempotency_key)
+
+    def _try_claim(self, key, fingerprint):
+        """
+        Claim key for this request, taking over an expired claim.
+
+        Returns:
+            tuple: None once claimed, else (fingerprint, response, status code) of the existing claim
+        """
+        table = IdempotencyKey.__table__
+        user_id, endpoint, idempotency_key = key
+
+        while True:
+            now = datetime.utcnow()
+            stmt = insert(table).values(
+                userId=user_id,
+                endpoint=endpoint,
+                key=idempotency_key,
+                fingerprint=fingerprint,
+                createdAt=now,
+                expiresAt=now + timedelta(seconds=self.lease_seconds)
+            )
+            stmt = stmt.on_conflict_do_update(
+                index_elements=['userId', 'endpoint', 'key'],
+                set_={
+                    'fingerprint': stmt.excluded.fingerprint,
+                    'response': None,
+                    'statusCode': None,
+                    'createdAt': stmt.excluded.createdAt,
+                    'expiresAt': stmt.excluded.expiresAt
+                },
+                where=table.c.expiresAt <= now
+            ).returning(table.c.key)
+
+            with db.engine.begin() as connection:
+                if connection.execute(stmt).first() is not None:
+                    return None
+
+                existing = connection.execute(
+                    select(table.c.fingerprint, table.c.response, table.c.statusCode).where(self._where(key))
+                ).first()
+
+            #released between the two statements, claim again
+            if existing is not None:
+                return tuple(existing)
+
+    def _claim(self, key, fingerprint):
+        """
+        Returns:
+            tuple: None when this request should run the handler, else (outcome, response)
+        """
+        deadline = time.monotonic() + self.wait_timeout
+        waited = False
+
+        while True:
+            try:
+                existing = self._try_claim(key, fingerprint)
+            except SQLAlchemyError as e:
+                self._metrics['store_errors'] += 1
+                logger.error(f"Idempotency store unavailable, deduplicating within this worker only: {str(e)}")
+                return None
+
+            if existing is None:
+                return None
+
+            stored_fingerprint, body, status = existing
+            if stored_fingerprint != fingerprint:
+                self._metrics['mismatched'] += 1
+                return (self.MISMATCH, None)
+
+            if body is not None:
+                response = (body, status)
+                self._responses.set(key, (fingerprint, response))
+                self._metrics['replayed'] += 1
+                if waited:
+                    self._metrics['collapsed'] += 1
+                return (self.REPLAYED, response)
+
+            #another worker is running the same request, wait for its response
+            if time.monotonic() >= deadline:
+                self._metrics['timed_out'] += 1
+                return (self.IN_PROGRESS, None)
+
+            waited = True
+            time.sleep(self.POLL_INTERVAL_SECONDS)
+
+    def _finish(self, key, fingerprint, response, cacheable):
+        """Store a successful response on the claim, or release the claim so a retry runs again"""
+        table = IdempotencyKey.__table__
+
+        try:
+            with db.engine.begin() as connection:
+                if cacheable:
+                    body, status = response if isinstance(response, tuple) else (response, 200)
+                    connection.execute(
+                        update(table).where(self._where(key), table.c.fingerprint == fingerprint).values(
+                            response=body,
+                            statusCode=status,
+                            expiresAt=datetime.utcnow() + timedelta(seconds=self.ttl_seconds)
+                        )
+                    )
+                else:
+                    connection.execute(
+                        delete(table).where(self._where(key), table.c.response.is_(None))
+                    )
+        except (SQLAlchemyError, TypeError, ValueError) as e:
+            self._metrics['store_errors'] += 1
+            logger.error(f"Failed to store idempotent response: {str(e)}")
+
+    def run(self, key, fingerprint, handler, cacheable):
+        """
+        Run handler once per key across workers, or return the response stored for it.
+
+        Args:
+            key: Scoped idempotency key (user, endpoint, header value)
+            fingerprint: Digest of the request payload, a key reused with another payload is rejected
+            handler: Callable producing the response
+            cacheable: Predicate telling whether a response may be stored
+
+        Returns:
+            tuple: (outcome, response), response is None for MISMATCH and IN_PROGRESS
+        """
+        collapsed = False
+
+        while True:
+            replay = self._replay(key, fingerprint)
+            if replay is not None:
+                if collapsed:
+                    self._metrics['collapsed'] += 1
+                return replay
+
+            with self._lock:
+                in_flight = self._in_flight.get(key)
+                if in_flight is None:
+                    in_flight = self._in_flight[key] = threading.Event()
+                    owner = True
+                else:
+                    owner = False
+
+            if owner:
+                break
+
+            #a duplicate is already running in this worker, wait for its response instead of running again
+            collapsed = True
+            if not in_flight.wait(self.wait_timeout):
+                self._metrics['timed_out'] += 1
+                return (self.IN_PROGRESS, None)
+
+        try:
+            claimed = self._claim(key, fingerprint)
+            if claimed is not None:
+                return claimed
+
+            try:
+                response = handler()
+            except Exception:
+                #release the claim so a retry runs again instead of waiting out the lease
+                self._finish(key, fingerprint, None, False)
+                raise
+
+            success = cacheable(response)
+            if success:
+                self._responses.set(key, (fingerprint, response))
+            self._finish(key, fingerprint, response, success)
+            self._metrics['executed'] += 1
+            return (self.EXECUTED, response)
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+            in_flight.set()
+
+    def purge(self):
+        """Delete stored responses and abandoned claims past their expiry"""
+        table = IdempotencyKey.__table__
+        with db.engine.begin() as connection:
+            purged = connection.execute(delete(table).where(table.c.expiresAt < datetime.utcnow())).rowcount
+        self._metrics['purged'] += purged
+        return purged
+
+    def metrics(self):
+        with self._lock:
+            in_flight = len(self._in_flight)
+
+        return {
+            'stored': len(self._responses),
+            'in_flight': in_flight,
+            **self._metrics
+        }
+
+    def clear(self):
+        self._responses.clear()
+
+
+idempotency_store = IdempotencyStore()
+
+
+def init_idempotency_store(app):
+    idempotency_store.configure(
+        ttl_seconds=app.config.get('IDEMPOTENCY_TTL', 86400),
+        max_size=app.config.get('IDEMPOTENCY_MAX_SIZE', 100000),
+        wait_timeout=app.config.get('IDEMPOTENCY_WAIT_TIMEOUT', 10),
+        lease_seconds=app.config.get('IDEMPOTENCY_LEASE_SECONDS', 60)
+    )
+
+    register_background_worker(
+        app,
+        name='idempotency-purge',
+        target=idempotency_store.purge,
+        interval=app.config.get('IDEMPOTENCY_PURGE_INTERVAL', 3600)
+    )
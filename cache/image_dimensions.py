@@ -0,0 +1,184 @@
+"""
+Image dimension store
+In-memory url -> {width, height} map backed by the imageDimensions table.
+Request handlers only read from memory; unknown urls are queued and probed
+by a background worker, so no outbound HTTP happens on the request path.
+"""
+
+import threading
+import logging
+from datetime import datetime
+from sqlalchemy.dialects.postgresql import insert
+from extensions import db
+from models.image_dimension import ImageDimension
+from models.merchant import Merchant
+from models.media import Media
+from utils.img_util import get_image_dimensions_from_url
+from utils.background import register_background_worker
+
+
+logger = logging.getLogger(__name__)
+
+
+class ImageDimensionStore:
+
+    def __init__(self, max_attempts=3, probe_timeout=2):
+        self.max_attempts = max_attempts
+        self.probe_timeout = probe_timeout
+
+        # url -> {"width", "height"}, or None when the url was probed without success
+        self._dimensions = {}
+        self._pending = set()
+        self._lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.loaded = False
+
+
+    def get(self, url):
+        """O(1) lookup, never blocks on the network. Unknown urls are queued for probing."""
+        if not url:
+            return None
+
+        try:
+            return self._dimensions[url]
+        except KeyError:
+            self.request(url)
+            return None
+
+    def request(self, url):
+        if not url or url in self._dimensions:
+            return
+
+        with self._lock:
+            self._pending.add(url)
+        self.wakeup.set()
+
+    def _remember(self, url, dimensions):
+        self._dimensions[url] = dimensions
+
+
+    def load(self):
+        """Warm the in-memory map from the database"""
+        rows = db.session.query(
+            ImageDimension.url, ImageDimension.width, ImageDimension.height
+        ).all()
+
+        for url, width, height in rows:
+            if width is not None and height is not None:
+                self._remember(url, {"width": width, "height": height})
+            else:
+                self._remember(url, None)
+
+        self.loaded = True
+        logger.info(f"Image dimension store loaded {len(rows)} urls")
+
+    def queue_backfill(self):
+        """Queue merchant icons and media urls without stored dimensions"""
+        retry_urls = {
+            url for (url,) in db.session.query(ImageDimension.url).filter(
+                ImageDimension.width.is_(None),
+                ImageDimension.attempts < self.max_attempts
+            )
+        }
+
+        icon_urls = {
+            icon for (icon,) in db.session.query(Merchant.icon).filter(Merchant.icon.isnot(None))
+        }
+
+        media_urls = {
+            url for (url,) in db.session.query(Media.url).filter(
+                Media.url.isnot(None),
+                db.or_(Media.width.is_(None), Media.height.is_(None))
+            )
+        }
+
+        queued = 0
+        with self._lock:
+            for url in icon_urls | media_urls:
+                if url not in self._dimensions or url in retry_urls:
+                    self._pending.add(url)
+                    queued += 1
+
+        logger.info(f"Image dimension store queued {queued} urls for backfill")
+        return queued
+
+
+    def process_pending(self, batch_size=50):
+        """
+        Probe a batch of queued urls and persist the results.
+
+        Returns:
+            int: Number of urls processed
+        """
+        with self._lock:
+            batch = [self._pending.pop() for _ in range(min(batch_size, len(self._pending)))]
+
+        if not batch:
+            return 0
+
+        # another worker process may already have probed some of these
+        existing = {
+            row.url: row for row in ImageDimension.query.filter(ImageDimension.url.in_(batch)).all()
+        }
+
+        rows = []
+        for url in batch:
+            row = existing.get(url)
+            if row is not None and (row.dimensions or row.attempts >= self.max_attempts):
+                self._remember(url, row.dimensions)
+                continue
+
+            dimensions = get_image_dimensions_from_url(url, timeout=self.probe_timeout)
+            rows.append({
+                "url": url,
+                "width": dimensions["width"] if dimensions else None,
+                "height": dimensions["height"] if dimensions else None,
+                "attempts": (row.attempts if row is not None else 0) + 1,
+                "probedAt": datetime.utcnow()
+            })
+            self._remember(url, dimensions)
+
+        if rows:
+            stmt = insert(ImageDimension.__table__).values(rows)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=['url'],
+                set_={
+                    'width': stmt.excluded.width,
+                    'height': stmt.excluded.height,
+                    'attempts': stmt.excluded.attempts,
+                    'probedAt': stmt.excluded.probedAt
+                }
+            )
+            db.session.execute(stmt)
+            db.session.commit()
+
+        return len(batch)
+
+    def run_worker_tick(self):
+        if not self.loaded:
+            self.load()
+            self.queue_backfill()
+
+        while self.process_pending():
+            pass
+
+    @property
+    def pending_count(self):
+        return len(self._pending)
+
+
+image_dimension_store = ImageDimensionStore()
+
+
+def init_image_dimension_store(app):
+    image_dimension_store.max_attempts = app.config.get('IMAGE_DIMENSION_MAX_ATTEMPTS', 3)
+    image_dimension_store.probe_timeout = app.config.get('IMAGE_DIMENSION_PROBE_TIMEOUT', 2)
+
+    if app.config.get('IMAGE_DIMENSION_WORKER_ENABLED', False):
+        register_background_worker(
+            app,
+            name='image-dimension-backfill',
+            target=image_dimension_store.run_worker_tick,
+            interval=app.config.get('IMAGE_DIMENSION_WORKER_INTERVAL', 30),
+            wakeup=image_dimension_store.wakeup
+        )
@@ -0,0 +1,48 @@
+"""
+Known media cache
+Process-local LRU of media IDs (and their URLs) that are known to exist, used by
+MediaValidationService so validating a taste's photos usually needs no query.
+Media rows are never deleted, so a positive entry stays valid; misses are not
+cached because the media may be created by another worker a moment later.
+MediaService adds every media it creates.
+"""
+
+from cache.ttl_cache import TTLCache
+
+
+class KnownMediaCache:
+
+    def __init__(self, ttl_seconds=86400, max_size=100000):
+        self._cache = TTLCache(ttl_seconds, max_size=max_size)
+
+    def configure(self, ttl_seconds, max_size):
+        self._cache = TTLCache(ttl_seconds, max_size=max_size)
+
+    def lookup(self, media_ids=(), urls=()):
+        """
+        Returns:
+            tuple: ({media_id: media_id}, {url: media_id}) for the known entries
+        """
+        found = self._cache.get_many([('id', media_id) for media_id in media_ids] + [('url', url) for url in urls])
+
+        known_ids = {key[1]: media_id for key, media_id in found.items() if key[0] == 'id'}
+        known_urls = {key[1]: media_id for key, media_id in found.items() if key[0] == 'url'}
+        return known_ids, known_urls
+
+    def remember(self, media_id, url=None):
+        self._cache.set(('id', media_id), media_id)
+        if url:
+            self._cache.set(('url', url), media_id)
+
+    def clear(self):
+        self._cache.clear()
+
+
+known_media_cache = KnownMediaCache()
+
+
+def init_known_media_cache(app):
+    known_media_cache.configure(
+        ttl_seconds=app.config.get('KNOWN_MEDIA_CACHE_TTL', 86400),
+        max_size=app.config.get('KNOWN_MEDIA_CACHE_MAX_SIZE', 100000)
+    )
@@ -0,0 +1,69 @@
+"""
+Merchant dish cache
+Per-merchant name and whether the merchant has any dish, used by the merchant
+"user items" endpoint to answer merchants without dishes without querying the
+user's items. Soft-deleted dishes count, as the endpoint always did, and
+dishes never change merchant, so only a new dish changes the flag:
+DishManagementService.create_dish invalidates the merchant in this process and
+the TTL bounds staleness for dishes created by other workers.
+"""
+
+from sqlalchemy import exists
+from extensions import db
+from models.dish import Dish
+from models.merchant import Merchant
+from cache.ttl_cache import TTLCache
+
+
+class MerchantDishCache:
+
+    def __init__(self, ttl_seconds=300, max_size=5000):
+        self._cache = TTLCache(ttl_seconds, max_size=max_size)
+
+    def configure(self, ttl_seconds, max_size):
+        self._cache = TTLCache(ttl_seconds, max_size=max_size)
+
+    def _load(self, merchant_id):
+        merchant = db.session.query(Merchant._id, Merchant.name).filter(Merchant._id == merchant_id).first()
+        if merchant is None:
+            return None
+
+        has_dishes = db.session.query(exists().where(Dish.merchant_col == merchant_id)).scalar()
+
+        return {
+            "_id": merchant._id,
+            "name": merchant.name,
+            "has_dishes": has_dishes
+        }
+
+    def get(self, merchant_id):
+        """
+        Returns:
+            dict: _id, name, has_dishes, or None if the merchant does not exist
+        """
+        entry = self._cache.get(merchant_id)
+        if entry is None:
+            entry = self._load(merchant_id)
+            if entry is not None:
+                self._cache.set(merchant_id, entry)
+        return entry
+
+    def invalidate(self, merchant_id):
+        if merchant_id is not None:
+            self._cache.delete(merchant_id)
+
+    def invalidate_many(self, merchant_ids):
+        self._cache.delete_many([merchant_id for merchant_id in merchant_ids if merchant_id is not None])
+
+    def clear(self):
+        self._cache.clear()
+
+
+merchant_dish_cache = MerchantDishCache()
+
+
+def init_merchant_dish_cache(app):
+    merchant_dish_cache.configure(
+        ttl_seconds=app.config.get('MERCHANT_DISH_CACHE_TTL', 300),
+        max_size=app.config.get('MERCHANT_DISH_CACHE_MAX_SIZE', 5000)
+    )
@@ -0,0 +1,80 @@
+"""
+Request-scoped batch loader
+DataLoader-style helper attached to flask.g: serializers register the keys they
+will need up front (prime), and the first load() for an entity type resolves all
+registered keys with one batched query. Results are memoized for the rest of
+the request (or app context, for background jobs).
+"""
+
+from collections import defaultdict
+from flask import g
+from models.media import Media
+
+
+_BATCH_FUNCTIONS = {}
+
+
+def register_batch_loader(entity):
+    """
+    Register a batch function for an entity type.
+    The function receives a list of keys and returns {key: value} for the keys it found.
+    """
+    def decorator(fn):
+        _BATCH_FUNCTIONS[entity] = fn
+        return fn
+    return decorator
+
+
+class RequestLoader:
+
+    def __init__(self, batch_functions):
+        self._batch_functions = batch_functions
+        self._pending = defaultdict(set)
+        self._memo = defaultdict(dict)
+
+    def prime(self, entity, keys):
+        """Register keys to be fetched by the next batch for this entity"""
+        memo = self._memo[entity]
+        self._pending[entity].update(key for key in keys if key is not None and key not in memo)
+
+    def load(self, entity, key):
+        if key is None:
+            return None
+
+        memo = self._memo[entity]
+        if key not in memo:
+            self._pending[entity].add(key)
+            self._dispatch(entity)
+        return memo.get(key)
+
+    def load_many(self, entity, keys):
+        self.prime(entity, keys)
+        self._dispatch(entity)
+        memo = self._memo[entity]
+        return [memo.get(key) for key in keys]
+
+    def _dispatch(self, entity):
+        keys = list(self._pending.pop(entity, ()))
+        if not keys:
+            return
+
+        found = self._batch_functions[entity](keys)
+
+        memo = self._memo[entity]
+        for key in keys:
+            memo[key] = found.get(key)
+
+
+def get_request_loader():
+    loader = g.get('_request_loader')
+    if loader is None:
+        loader = RequestLoader(_BATCH_FUNCTIONS)
+        g._request_loader = loader
+    return loader
+
+
+@register_batch_loader('media')
+def _load_media(media_ids):
+    return {
+        media._id: media for media in Media.query.filter(Media._id.in_(media_ids)).all()
+    }
@@ -0,0 +1,57 @@
+"""
+User state cache
+Short-lived per-(user, dish) collected / recommended flags used by the dish
+rendering endpoints. UserActionService writes new flags through after each
+commit; the TTL bounds staleness for writes made by other workers.
+"""
+
+from cache.ttl_cache import TTLCache
+
+
+class UserStateCache:
+
+    COLLECTED = 'collected'
+    RECOMMENDED = 'recommended'
+
+    def __init__(self, ttl_seconds=30, max_size=50000):
+        self._cache = TTLCache(ttl_seconds, max_size=max_size)
+
+    def configure(self, ttl_seconds, max_size):
+        self._cache = TTLCache(ttl_seconds, max_size=max_size)
+
+    def get_many(self, user_id, dish_ids):
+        """
+        Returns:
+            dict: dish_id -> (is_collected, is_recommended), for dishes with both flags cached
+        """
+        keys = [(user_id, dish_id, flag) for dish_id in dish_ids for flag in (self.COLLECTED, self.RECOMMENDED)]
+        found = self._cache.get_many(keys)
+
+        states = {}
+        for dish_id in dish_ids:
+            collected = found.get((user_id, dish_id, self.COLLECTED))
+            recommended = found.get((user_id, dish_id, self.RECOMMENDED))
+            if collected is not None and recommended is not None:
+                states[dish_id] = (collected, recommended)
+        return states
+
+    def set_many(self, user_id, states):
+        for dish_id, (collected, recommended) in states.items():
+            self._cache.set((user_id, dish_id, self.COLLECTED), collected)
+            self._cache.set((user_id, dish_id, self.RECOMMENDED), recommended)
+
+    def set_flag(self, user_id, dish_id, flag, value):
+        self._cache.set((user_id, dish_id, flag), value)
+
+    def clear(self):
+        self._cache.clear()
+
+
+user_state_cache = UserStateCache()
+
+
+def init_user_state_cache(app):
+    user_state_cache.configure(
+        ttl_seconds=app.config.get('USER_STATE_CACHE_TTL', 30),
+        max_size=app.config.get('USER_STATE_CACHE_MAX_SIZE', 50000)
+    )
@@ -0,0 +1,85 @@
+"""
+Flask CLI commands for maintenance and backfill jobs
+Run with: flask --app app <command>
+"""
+
+import click
+from extensions import db
+from models.image_dimension import ImageDimension
+from models.dish_flavor_tags import DishFlavorTags
+from models.mq_outbox import MqOutbox
+from models.idempotency_key import IdempotencyKey
+
+
+# tables owned by this service; the rest of the schema is managed upstream
+SERVICE_TABLES = [
+    ImageDimension.__table__,
+    DishFlavorTags.__table__,
+    MqOutbox.__table__,
+    IdempotencyKey.__table__,
+]
+
+
+def register_commands(app):
+
+    @app.cli.command('create-tables')
+    def create_tables():
+        """Create service-owned tables that do not exist yet"""
+        for table in SERVICE_TABLES:
+            table.create(db.engine, checkfirst=True)
+            click.echo(f"Table ready: {table.name}")
+
+
+    @app.cli.command('backfill-image-dimensions')
+    def backfill_image_dimensions():
+        """Probe every merchant icon and media url without stored dimensions"""
+        from cache.image_dimensions import image_dimension_store
+
+        image_dimension_store.load()
+        queued = image_dimension_store.queue_backfill()
+
+        processed = 0
+        while True:
+            count = image_dimension_store.process_pending()
+            if not count:
+                break
+            processed += count
+            click.echo(f"Probed {processed}/{queued} urls")
+
+        click.echo("Image dimension backfill finished")
+
+
+    @app.cli.command('recompute-flavor-tags')
+    @click.option('--batch-size', default=500, show_default=True, help='Profiles per batch')
+    @click.option('--force', is_flag=True, help='Rewrite entries whose profile hash is unchanged')
+    def recompute_flavor_tags(batch_size, force):
+        """Rebuild stored flavor tags from the dish profile batch, run after each model batch"""
+        from services.flavor_tag_store import FlavorTagStore
+
+        stats = FlavorTagStore.recompute_all(batch_size=batch_size, force=force)
+        click.echo(
+            f"Flavor tags recomputed: {stats['updated']} updated, "
+            f"{stats['unchanged']} unchanged, {stats['scanned']} profiles scanned"
+        )
+
+
+    @app.cli.command('reconcile-counters')
+    @click.option('--grace-seconds', type=float, default=None,
+                  help='Skip rows with activity this recent (default COUNTER_RECONCILE_GRACE_SECONDS '
+                       'with the counter buffer enabled, 0 otherwise)')
+    def reconcile_counters(grace_seconds):
+        """Recompute dish recommend counts and taste useful totals, fixing drifted rows"""
+        from services.counter_service import CounterService
+        from cache.counter_buffer import counter_buffer
+
+        if grace_seconds is None:
+            grace_seconds = app.config.get('COUNTER_RECONCILE_GRACE_SECONDS', 60) if counter_buffer.enabled else 0
+
+        #deltas buffered by this process go in first; other workers' are covered by the grace window
+        if counter_buffer.enabled:
+            counter_buffer.flush()
+
+        stats = CounterService.reconcile_all(grace_seconds=grace_seconds)
+        click.echo(
+            f"Counters reconciled: {stats['dishes']} dishes and {stats['tastes']} tastes fixed"
+        )
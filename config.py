@@ -29,6 +29,91 @@ class Config:
     ENABLE_MONGODB_WRITE = os.getenv('ENABLE_MONGODB_WRITE', 'true').lower() == 'true'
     MONGODB_FIRST = os.getenv('MONGODB_FIRST', 'true').lower() == 'true'  # Write to MongoDB first
 
+    #image dimension store (background probing of icon/media urls)
+    IMAGE_DIMENSION_WORKER_ENABLED = os.getenv('IMAGE_DIMENSION_WORKER_ENABLED', 'true').lower() == 'true'
+    IMAGE_DIMENSION_WORKER_INTERVAL = float(os.getenv('IMAGE_DIMENSION_WORKER_INTERVAL', 30))
+    IMAGE_DIMENSION_PROBE_TIMEOUT = float(os.getenv('IMAGE_DIMENSION_PROBE_TIMEOUT', 2))
+    IMAGE_DIMENSION_MAX_ATTEMPTS = int(os.getenv('IMAGE_DIMENSION_MAX_ATTEMPTS', 3))
+
+    #shared (non-personal) dish overview cache
+    DISH_OVERVIEW_CACHE_TTL = float(os.getenv('DISH_OVERVIEW_CACHE_TTL', 120))
+    DISH_OVERVIEW_CACHE_MAX_SIZE = int(os.getenv('DISH_OVERVIEW_CACHE_MAX_SIZE', 10000))
+
+    #third party delivery platforms registry refresh interval (seconds)
+    DELIVERY_PLATFORM_REGISTRY_TTL = float(os.getenv('DELIVERY_PLATFORM_REGISTRY_TTL', 300))
+
+    #per user collected/recommended flags (seconds), written through by UserActionService
+    USER_STATE_CACHE_TTL = float(os.getenv('USER_STATE_CACHE_TTL', 30))
+    USER_STATE_CACHE_MAX_SIZE = int(os.getenv('USER_STATE_CACHE_MAX_SIZE', 50000))
+
+    #per merchant name and has-dishes flag for /v3/merchant/<id>/user-items
+    MERCHANT_DISH_CACHE_TTL = float(os.getenv('MERCHANT_DISH_CACHE_TTL', 300))
+    MERCHANT_DISH_CACHE_MAX_SIZE = int(os.getenv('MERCHANT_DISH_CACHE_MAX_SIZE', 5000))
+
+    #media ids known to exist, checked before querying when validating taste / dish media
+    KNOWN_MEDIA_CACHE_TTL = float(os.getenv('KNOWN_MEDIA_CACHE_TTL', 86400))
+    KNOWN_MEDIA_CACHE_MAX_SIZE = int(os.getenv('KNOWN_MEDIA_CACHE_MAX_SIZE', 100000))
+
+    #flavor tags computed from the profile for dishes without stored tags (seconds / dishes)
+    FLAVOR_TAG_FALLBACK_CACHE_TTL = float(os.getenv('FLAVOR_TAG_FALLBACK_CACHE_TTL', 600))
+    FLAVOR_TAG_FALLBACK_CACHE_MAX_SIZE = int(os.getenv('FLAVOR_TAG_FALLBACK_CACHE_MAX_SIZE', 10000))
+
+    #Idempotency-Key responses of retried user actions (seconds / keys cached per worker, seconds a duplicate waits for the first)
+    IDEMPOTENCY_TTL = float(os.getenv('IDEMPOTENCY_TTL', 86400))
+    IDEMPOTENCY_MAX_SIZE = int(os.getenv('IDEMPOTENCY_MAX_SIZE', 100000))
+    IDEMPOTENCY_WAIT_TIMEOUT = float(os.getenv('IDEMPOTENCY_WAIT_TIMEOUT', 10))
+    #claim lease before another worker may take over a crashed request's key, keep it above the request timeout
+    IDEMPOTENCY_LEASE_SECONDS = float(os.getenv('IDEMPOTENCY_LEASE_SECONDS', 60))
+    IDEMPOTENCY_PURGE_INTERVAL = float(os.getenv('IDEMPOTENCY_PURGE_INTERVAL', 3600))
+
+    #write-behind buffer for recommend / useful counters (flush every N ms or M deltas)
+    COUNTER_BUFFER_ENABLED = os.getenv('COUNTER_BUFFER_ENABLED', 'true').lower() == 'true'
+    COUNTER_BUFFER_FLUSH_INTERVAL_MS = float(os.getenv('COUNTER_BUFFER_FLUSH_INTERVAL_MS', 200))
+    COUNTER_BUFFER_MAX_EVENTS = int(os.getenv('COUNTER_BUFFER_MAX_EVENTS', 500))
+    #reconcile-counters skips rows with activity this recent, their deltas may still be buffered
+    COUNTER_RECONCILE_GRACE_SECONDS = float(os.getenv('COUNTER_RECONCILE_GRACE_SECONDS', 60))
+
+    #shared token for the internal /v3/metrics endpoint, disabled while empty
+    METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+
+    #background MQ publishing with confirms (queue size, batch size, full-queue policy: block / drop_newest / drop_oldest / sync)
+    MQ_PUBLISHER_ASYNC = os.getenv('MQ_PUBLISHER_ASYNC', 'true').lower() == 'true'
+    MQ_PUBLISHER_QUEUE_SIZE = int(os.getenv('MQ_PUBLISHER_QUEUE_SIZE', 10000))
+    MQ_PUBLISHER_BATCH_SIZE = int(os.getenv('MQ_PUBLISHER_BATCH_SIZE', 100))
+    MQ_PUBLISHER_FULL_POLICY = os.getenv('MQ_PUBLISHER_FULL_POLICY', 'block')
+    MQ_PUBLISHER_BLOCK_TIMEOUT_MS = float(os.getenv('MQ_PUBLISHER_BLOCK_TIMEOUT_MS', 50))
+    MQ_PUBLISHER_MAX_RETRIES = int(os.getenv('MQ_PUBLISHER_MAX_RETRIES', 5))
+    MQ_PUBLISHER_RETRY_BACKOFF_MS = float(os.getenv('MQ_PUBLISHER_RETRY_BACKOFF_MS', 500))
+
+    #disk spool for messages the broker could not take, replayed at MQ_SPOOL_REPLAY_RATE messages/s once it is back
+    MQ_SPOOL_ENABLED = os.getenv('MQ_SPOOL_ENABLED', 'true').lower() == 'true'
+    MQ_SPOOL_DIR = os.getenv('MQ_SPOOL_DIR', 'mq_spool')
+    MQ_SPOOL_SEGMENT_BYTES = int(os.getenv('MQ_SPOOL_SEGMENT_BYTES', 8 * 1024 * 1024))
+    MQ_SPOOL_FSYNC_INTERVAL_MS = float(os.getenv('MQ_SPOOL_FSYNC_INTERVAL_MS', 100))
+    MQ_SPOOL_REPLAY_RATE = float(os.getenv('MQ_SPOOL_REPLAY_RATE', 500))
+    MQ_SPOOL_RETRY_INTERVAL = float(os.getenv('MQ_SPOOL_RETRY_INTERVAL', 5))
+
+    #latest-state coalescing window for taste/create and dish/collect messages (ms, 0 disables)
+    MQ_COALESCE_WINDOW_MS = float(os.getenv('MQ_COALESCE_WINDOW_MS', 500))
+
+    #transactional outbox for MQ events (run create-tables first), relayed by N threads every interval ms
+    MQ_OUTBOX_ENABLED = os.getenv('MQ_OUTBOX_ENABLED', 'false').lower() == 'true'
+    MQ_OUTBOX_RELAY_WORKERS = int(os.getenv('MQ_OUTBOX_RELAY_WORKERS', 1))
+    MQ_OUTBOX_RELAY_INTERVAL_MS = float(os.getenv('MQ_OUTBOX_RELAY_INTERVAL_MS', 200))
+    MQ_OUTBOX_BATCH_SIZE = int(os.getenv('MQ_OUTBOX_BATCH_SIZE', 500))
+    MQ_OUTBOX_RETENTION_HOURS = float(os.getenv('MQ_OUTBOX_RETENTION_HOURS', 24))
+
+    #merchant grid index for /v3/dish/nearby
+    MERCHANT_GEO_INDEX_CELL_DEG = float(os.getenv('MERCHANT_GEO_INDEX_CELL_DEG', 0.05))
+    MERCHANT_GEO_INDEX_WORKER_ENABLED = os.getenv('MERCHANT_GEO_INDEX_WORKER_ENABLED', 'true').lower() == 'true'
+    MERCHANT_GEO_INDEX_REFRESH_INTERVAL = float(os.getenv('MERCHANT_GEO_INDEX_REFRESH_INTERVAL', 300))
+
+    #flavor vector index for /v3/dish/<id>/similar
+    FLAVOR_INDEX_WORKER_ENABLED = os.getenv('FLAVOR_INDEX_WORKER_ENABLED', 'true').lower() == 'true'
+    FLAVOR_INDEX_REFRESH_INTERVAL = float(os.getenv('FLAVOR_INDEX_REFRESH_INTERVAL', 600))
+    FLAVOR_INDEX_REBUILD_INTERVAL = float(os.getenv('FLAVOR_INDEX_REBUILD_INTERVAL', 3600))
+    FLAVOR_INDEX_BLOCK_SIZE = int(os.getenv('FLAVOR_INDEX_BLOCK_SIZE', 65536))
+
 
 
 
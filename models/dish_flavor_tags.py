@@ -0,0 +1,23 @@
+from extensions import db
+from datetime import datetime
+
+
+class DishFlavorTags(db.Model):
+    """Flavor tags precomputed from the dish profile batch, keyed by the dish pg_id (DishProfile.dish_id)"""
+
+    __tablename__ = 'dishFlavorTags'
+
+    dish_id = db.Column(db.String(64), primary_key=True)
+    profile_id = db.Column(db.Integer, nullable=True)
+
+    #format_tags_for_display output of FlavorTagService.generate_flavor_tags
+    tags = db.Column(db.JSON, nullable=False, default=list)
+
+    #stale detection: hash of the profile scores the tags were built from, and the tag rules version
+    profile_hash = db.Column(db.String(64), nullable=False)
+    tag_version = db.Column(db.Integer, nullable=False)
+    computedAt = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+    def __repr__(self):
+        return f"<DishFlavorTags(dish_id={self.dish_id}, tag_version={self.tag_version})>"
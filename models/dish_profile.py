@@ -77,6 +77,39 @@ class DishProfile(db.Model):
     
     
     needs_review = db.Column(db.Boolean)
+
+
+    # Named column sets for load_only; call sites pick the narrowest one they need
+    SCORE_FIELDS = (
+        'texture_dryness', 'texture_hardness', 'texture_chewiness', 'texture_juiciness',
+        'texture_moistness', 'texture_creaminess', 'texture_crispiness', 'texture_smoothness',
+        'texture_stickiness', 'texture_tenderness', 'texture_crunchiness', 'texture_springiness',
+        'basic_sour', 'basic_salty', 'basic_spicy', 'basic_sweet', 'basic_umami', 'basic_greasy',
+        'basic_bitterness', 'basic_astringency', 'basic_fat_richness',
+        'detail_burnt', 'detail_dairy', 'detail_meaty', 'detail_nutty', 'detail_smoky',
+        'detail_earthy', 'detail_floral', 'detail_fruity', 'detail_herbal', 'detail_marine',
+        'detail_toasty', 'detail_citrusy', 'detail_peppery', 'detail_roasted', 'detail_fermented',
+        'detail_medicinal', 'detail_sulfurous', 'detail_caramelized', 'detail_offal_gamey',
+        'detail_spice_aroma'
+    )
+
+    LOAD_PROFILES = {
+        # DishService.get_dish_flavor_profile: tags, raw scores and ingredients
+        'flavor_profile_api': ('dish_id',) + SCORE_FIELDS + (
+            'background_cuisine', 'ingredients_main', 'ingredients_methods', 'needs_review'
+        ),
+    }
+
+    @classmethod
+    def load_profile(cls, name):
+        """
+        Query for a named column set, columns outside the set are deferred
+
+        Args:
+            name: Key of LOAD_PROFILES
+        """
+        fields = cls.LOAD_PROFILES[name]
+        return cls.query.options(db.load_only(*[getattr(cls, field) for field in fields]))
     
     
     def __repr__(self):
@@ -0,0 +1,34 @@
+from extensions import db
+from datetime import datetime
+
+
+class IdempotencyKey(db.Model):
+    """Idempotency-Key claims and stored responses, shared by every worker"""
+
+    __tablename__ = 'idempotencyKeys'
+
+    #scope of a key: the caller and the endpoint it was sent to
+    userId = db.Column(db.String(64), primary_key=True)
+    endpoint = db.Column(db.String(255), primary_key=True)
+    key = db.Column(db.String(255), primary_key=True)
+
+    #digest of the request payload, a key reused with another payload is rejected
+    fingerprint = db.Column(db.String(64), nullable=False)
+
+    #empty while the first request runs, set once its successful response is stored
+    response = db.Column(db.JSON, nullable=True)
+    statusCode = db.Column(db.Integer, nullable=True)
+
+    createdAt = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    #end of the claim lease while running (a crashed owner is taken over after it), then of the stored response
+    expiresAt = db.Column(db.DateTime, nullable=False)
+
+
+    __table_args__ = (
+        db.Index('ix_idempotencyKeys_expiresAt', 'expiresAt'),
+    )
+
+
+    def __repr__(self):
+        return f"<IdempotencyKey(userId={self.userId}, endpoint={self.endpoint}, key={self.key})>"
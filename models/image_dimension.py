@@ -0,0 +1,27 @@
+from extensions import db
+from datetime import datetime
+
+
+class ImageDimension(db.Model):
+    """Probed pixel dimensions of remote images (merchant icons, media urls), keyed by url"""
+
+    __tablename__ = 'imageDimensions'
+
+    url = db.Column(db.String(500), primary_key=True)
+    width = db.Column(db.Integer, nullable=True)
+    height = db.Column(db.Integer, nullable=True)
+
+    #failed probes are stored with empty width/height so they are not retried on every request
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    probedAt = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+    @property
+    def dimensions(self):
+        if self.width is None or self.height is None:
+            return None
+        return {"width": self.width, "height": self.height}
+
+
+    def __repr__(self):
+        return f"<ImageDimension(url={self.url}, width={self.width}, height={self.height})>"
@@ -0,0 +1,34 @@
+from extensions import db
+from datetime import datetime
+
+
+class MqOutbox(db.Model):
+    """MQ messages written in the transaction of the change they describe, published by the outbox relay"""
+
+    __tablename__ = 'mqOutbox'
+
+    id = db.Column(db.BigInteger, primary_key=True, autoincrement=True)
+    queue = db.Column(db.String(100), nullable=False)
+
+    #serialized message body, published as is
+    body = db.Column(db.Text, nullable=False)
+
+    createdAt = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    #failed publishes are retried from nextAttemptAt with exponential backoff
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    nextAttemptAt = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    #set once the broker confirmed the message, sent rows are purged after the retention period
+    sentAt = db.Column(db.DateTime, nullable=True)
+
+
+    __table_args__ = (
+        #the relay scans pending rows in id order
+        db.Index('ix_mqOutbox_pending', 'id', postgresql_where=db.text('"sentAt" IS NULL')),
+        db.Index('ix_mqOutbox_sentAt', 'sentAt'),
+    )
+
+
+    def __repr__(self):
+        return f"<MqOutbox(id={self.id}, queue={self.queue}, sentAt={self.sentAt})>"
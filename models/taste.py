@@ -2,6 +2,8 @@ from extensions import db
 from datetime import datetime
 from sqlalchemy.dialects.postgresql import ARRAY, JSON
 from sqlalchemy.sql import func
+from sqlalchemy import case, and_
+from types import SimpleNamespace
 from bson import ObjectId
 from enum import IntEnum, Enum
 
@@ -165,6 +167,34 @@ class Taste(db.Model):
         return state
     
 
+    @classmethod
+    def state_expression(cls, recommend_state):
+        """
+        SQL CASE giving calculate_state() of a stored row once its recommendState is set to
+        recommend_state, for set-based updates (e.g. ON CONFLICT DO UPDATE) that never load the row.
+        """
+        has_comment = func.length(func.btrim(func.coalesce(cls.comment, ''), ' \t\r\n\x0b\x0c')) > 0
+        has_media = case(
+            (func.json_typeof(cls.mediaIds) == 'array', func.json_array_length(cls.mediaIds)),
+            else_=0
+        ) > 0
+
+        #outcomes come from calculate_state itself so both stay in sync
+        def state_for(comment, media):
+            return cls.calculate_state(SimpleNamespace(
+                comment='comment' if comment else None,
+                mediaIds=['media'] if media else [],
+                recommendState=recommend_state
+            ))
+
+        return case(
+            (and_(has_comment, has_media), state_for(True, True)),
+            (has_comment, state_for(True, False)),
+            (has_media, state_for(False, True)),
+            else_=state_for(False, False)
+        )
+
+
     def soft_delete(self):
         self.deletedAt = datetime.utcnow()
         self.updatedAt = datetime.utcnow()
@@ -0,0 +1,126 @@
+"""
+MQ event coalescer
+Holds keyed messages for a short window and only emits the latest state per
+(queue, key), so a user editing the same taste ten times in a second produces
+one taste/create message instead of ten. A message is emitted at most one
+window after the first message of its key arrived, however often it is
+replaced meanwhile. Messages of queues without a key function pass through.
+"""
+
+import threading
+import time
+import logging
+from collections import OrderedDict
+
+
+logger = logging.getLogger(__name__)
+
+
+class EventCoalescer:
+
+    def __init__(self, emit, key_functions, window_seconds=0.5):
+        """
+        Args:
+            emit: emit(queue_name, data_list) publishing coalesced messages
+            key_functions: dict of queue name -> function(data) returning the coalescing key
+            window_seconds: How long the first message of a key is held
+        """
+        self.emit = emit
+        self.key_functions = key_functions
+        self.window_seconds = window_seconds
+        self.enabled = False
+
+        #(queue_name, key) -> [data, due], in arrival order of the first message of each key
+        self._pending = OrderedDict()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+
+        self._metrics = {
+            'received': 0,
+            'suppressed': 0,
+            'emitted': 0
+        }
+
+    def add(self, queue_name, data_list):
+        """
+        Hold the keyed messages of data_list.
+
+        Returns:
+            list: Messages without a key, to be published right away
+        """
+        key_function = self.key_functions.get(queue_name)
+        if key_function is None:
+            return data_list
+
+        passthrough = []
+        due = time.monotonic() + self.window_seconds
+
+        with self._lock:
+            for data in data_list:
+                key = key_function(data)
+                if key is None:
+                    passthrough.append(data)
+                    continue
+
+                self._metrics['received'] += 1
+                entry = self._pending.get((queue_name, key))
+                if entry is None:
+                    self._pending[(queue_name, key)] = [data, due]
+                else:
+                    #latest state wins, the deadline of the first message stays
+                    entry[0] = data
+                    self._metrics['suppressed'] += 1
+
+        return passthrough
+
+    def _take(self, everything):
+        now = time.monotonic()
+        taken = []
+        with self._lock:
+            while self._pending:
+                (queue_name, key), (data, due) = next(iter(self._pending.items()))
+                if not everything and due > now:
+                    break
+                del self._pending[(queue_name, key)]
+                taken.append((queue_name, data))
+        return taken
+
+    def flush(self, everything=False):
+        """
+        Emit the messages whose window ended (all of them with everything=True).
+
+        Returns:
+            int: Number of messages emitted
+        """
+        with self._flush_lock:
+            taken = self._take(everything)
+
+            #consecutive messages of one queue go out as one batch
+            start = 0
+            while start < len(taken):
+                queue_name = taken[start][0]
+                end = start
+                while end < len(taken) and taken[end][0] == queue_name:
+                    end += 1
+
+                try:
+                    self.emit(queue_name, [data for _, data in taken[start:end]])
+                except Exception as e:
+                    logger.error(f"Failed to emit coalesced messages to {queue_name}: {str(e)}")
+                start = end
+
+            with self._lock:
+                self._metrics['emitted'] += len(taken)
+            return len(taken)
+
+    def metrics(self):
+        with self._lock:
+            metrics = dict(self._metrics)
+            pending = len(self._pending)
+
+        return {
+            'enabled': self.enabled,
+            'window_ms': self.window_seconds * 1000,
+            'pending': pending,
+            **metrics
+        }
@@ -0,0 +1,70 @@
+"""
+Transactional outbox
+While a transaction is captured, RabbitMQService writes its messages as
+mqOutbox rows on that session instead of publishing them, so they commit or
+roll back together with the change they describe. The relay
+(services/outbox_relay.py) publishes committed rows; a commit that wrote any
+wakes it up.
+"""
+
+import threading
+from contextlib import contextmanager
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from models.mq_outbox import MqOutbox
+
+
+_STAGED_KEY = 'mq_outbox_staged'
+
+
+class Outbox:
+
+    def __init__(self):
+        self.enabled = False
+        self.wakeup = threading.Event()
+        self._local = threading.local()
+
+    @contextmanager
+    def capture(self, session):
+        """Route the messages sent by this thread inside the block to outbox rows on session"""
+        if not self.enabled:
+            yield
+            return
+
+        previous = getattr(self._local, 'session', None)
+        self._local.session = session
+        try:
+            yield
+        finally:
+            self._local.session = previous
+
+    @property
+    def capturing(self):
+        return getattr(self._local, 'session', None) is not None
+
+    def stage(self, queue_name, bodies):
+        """
+        Returns:
+            bool: True if the messages were written to the captured transaction, False if none is captured
+        """
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            return False
+
+        session.add_all([MqOutbox(queue=queue_name, body=body) for body in bodies])
+        session.info[_STAGED_KEY] = True
+        return True
+
+
+outbox = Outbox()
+
+
+@event.listens_for(Session, 'after_commit')
+def _wake_relay(session):
+    if session.info.pop(_STAGED_KEY, None):
+        outbox.wakeup.set()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _drop_staged_flag(session):
+    session.info.pop(_STAGED_KEY, None)
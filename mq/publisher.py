@@ -0,0 +1,337 @@
+"""
+Asynchronous MQ publisher
+Request threads hand serialized messages to a bounded in-memory queue and
+return immediately; one dedicated thread drains it in batches and publishes
+them over its own confirm-mode channel, so a slow broker no longer slows user
+actions. Messages the broker did not confirm are retried with exponential
+backoff up to MQ_PUBLISHER_MAX_RETRIES; messages that run out of retries, or
+are dropped by a full queue, are handed to the spill callback (the disk spool)
+when one is set, as are all messages while the backlog callback reports
+spilled messages still waiting, so they are not published ahead of them.
+Every message keeps the message id it was enqueued with. When the queue is
+full the configured policy applies:
+
+    block        wait up to MQ_PUBLISHER_BLOCK_TIMEOUT_MS for room, then drop the message
+    drop_newest  drop the message being enqueued
+    drop_oldest  drop the oldest queued message to make room
+    sync         publish on the request thread, as without the pipeline
+
+The worker thread is started by the first enqueue of each process, so a
+gunicorn --preload worker starts its own instead of inheriting a queue that
+no thread drains.
+"""
+
+import os
+import queue
+import threading
+import time
+import logging
+from collections import deque, OrderedDict
+
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncPublisher:
+
+    POLICY_BLOCK = 'block'
+    POLICY_DROP_NEWEST = 'drop_newest'
+    POLICY_DROP_OLDEST = 'drop_oldest'
+    POLICY_SYNC = 'sync'
+    POLICIES = (POLICY_BLOCK, POLICY_DROP_NEWEST, POLICY_DROP_OLDEST, POLICY_SYNC)
+
+    MAX_BACKOFF_SECONDS = 30
+
+    def __init__(self, service_factory, sync_publish, spill=None, backlog=None):
+        """
+        Args:
+            service_factory: Builds the worker's confirm-mode service, which has publish(queue_name, bodies, message_ids=) -> int sent
+            sync_publish: publish(queue_name, bodies, message_ids) -> int sent, used on the request thread by the sync policy
+            spill: Optional spill(queue_name, bodies, message_ids, behind_backlog=False) -> bool keeping messages
+                that would be dropped, or that wait behind the backlog
+            backlog: Optional backlog() -> bool, True while spilled messages wait to be replayed
+        """
+        self.service_factory = service_factory
+        self.sync_publish = sync_publish
+        self.spill = spill
+        self.backlog = backlog
+
+        self.enabled = False
+        self.capacity = 10000
+        self.batch_size = 100
+        self.policy = self.POLICY_BLOCK
+        self.block_timeout = 0.05
+        self.max_retries = 5
+        self.retry_backoff = 0.5
+
+        self._queue = queue.Queue(maxsize=self.capacity)
+        #(not_before, queue_name, body, message_id, attempts) of messages waiting for a retry, only touched by the worker
+        self._retries = deque()
+        self._backoff = 0.0
+        self._stopping = threading.Event()
+        self._thread = None
+        self._service = None
+        #process the worker thread was started in
+        self._pid = None
+        self._start_lock = threading.Lock()
+
+        self._metrics_lock = threading.Lock()
+        self._metrics = {
+            'enqueued': 0,
+            'published': 0,
+            'batches': 0,
+            'retried': 0,
+            'dropped_full': 0,
+            'dropped_failed': 0,
+            'spilled': 0,
+            'spilled_behind_backlog': 0,
+            'sync_fallbacks': 0,
+            'last_confirm_ms': 0.0,
+            'max_confirm_ms': 0.0,
+            'total_confirm_ms': 0.0
+        }
+
+    def configure(self, capacity, batch_size, policy, block_timeout, max_retries, retry_backoff):
+        if policy not in self.POLICIES:
+            logger.warning(f"Unknown MQ publisher full-queue policy {policy}, using {self.POLICY_BLOCK}")
+            policy = self.POLICY_BLOCK
+
+        self.capacity = capacity
+        self.batch_size = batch_size
+        self.policy = policy
+        self.block_timeout = block_timeout
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self._queue = queue.Queue(maxsize=capacity)
+
+    def _count(self, name, amount=1):
+        with self._metrics_lock:
+            self._metrics[name] += amount
+
+    def _drop(self, reason, queue_name, bodies, message_ids):
+        """Spill messages that cannot be published, count them as dropped if that fails too"""
+        if self.spill is not None and self.spill(queue_name, bodies, message_ids):
+            self._count('spilled', len(bodies))
+            return True
+
+        self._count(reason, len(bodies))
+        logger.error(f"MQ publisher dropped {len(bodies)} message(s) for {queue_name} ({reason})")
+        return False
+
+    def _behind_backlog(self):
+        return self.spill is not None and self.backlog is not None and self.backlog()
+
+    def enqueue(self, queue_name, bodies, message_ids):
+        """
+        Hand serialized messages to the worker, starting it in this process if needed.
+
+        Args:
+            message_ids: AMQP message_id per body
+
+        Returns:
+            bool: True if every message was queued (or published by the sync policy)
+        """
+        if self._pid != os.getpid():
+            self.start()
+
+        accepted = True
+
+        for body, message_id in zip(bodies, message_ids):
+            item = (queue_name, body, message_id, 0)
+
+            try:
+                self._queue.put_nowait(item)
+                self._count('enqueued')
+                continue
+            except queue.Full:
+                pass
+
+            if self.policy == self.POLICY_BLOCK:
+                try:
+                    self._queue.put(item, timeout=self.block_timeout)
+                    self._count('enqueued')
+                    continue
+                except queue.Full:
+                    pass
+
+            elif self.policy == self.POLICY_DROP_OLDEST:
+                try:
+                    oldest_queue_name, oldest_body, oldest_message_id, _ = self._queue.get_nowait()
+                    self._drop('dropped_full', oldest_queue_name, [oldest_body], [oldest_message_id])
+                except queue.Empty:
+                    pass
+                try:
+                    self._queue.put_nowait(item)
+                    self._count('enqueued')
+                    continue
+                except queue.Full:
+                    pass
+
+            elif self.policy == self.POLICY_SYNC:
+                self._count('sync_fallbacks')
+                if self._behind_backlog():
+                    if self.spill(queue_name, [body], [message_id], behind_backlog=True):
+                        self._count('spilled_behind_backlog')
+                        continue
+                elif self.sync_publish(queue_name, [body], [message_id]) == 1:
+                    continue
+                if not self._drop('dropped_failed', queue_name, [body], [message_id]):
+                    accepted = False
+                continue
+
+            if not self._drop('dropped_full', queue_name, [body], [message_id]):
+                accepted = False
+
+        return accepted
+
+    def _take_batch(self):
+        batch = []
+        now = time.monotonic()
+        while self._retries and self._retries[0][0] <= now and len(batch) < self.batch_size:
+            _, queue_name, body, message_id, attempts = self._retries.popleft()
+            batch.append((queue_name, body, message_id, attempts))
+
+        if not batch:
+            #wait for work, but wake up for due retries
+            timeout = 0.1 if self._retries else 0.5
+            try:
+                batch.append(self._queue.get(timeout=timeout))
+            except queue.Empty:
+                return batch
+
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+
+        return batch
+
+    def _failed(self, items):
+        """Schedule unconfirmed messages for a retry, or drop those out of attempts"""
+        self._backoff = min(max(self._backoff * 2, self.retry_backoff), self.MAX_BACKOFF_SECONDS)
+        not_before = time.monotonic() + self._backoff
+
+        for queue_name, body, message_id, attempts in items:
+            if attempts >= self.max_retries:
+                self._drop('dropped_failed', queue_name, [body], [message_id])
+                continue
+
+            self._retries.append((not_before, queue_name, body, message_id, attempts + 1))
+            self._count('retried')
+
+    def _publish_batch(self, batch):
+        #one publish per queue, keeping the enqueue order within a queue
+        groups = OrderedDict()
+        for item in batch:
+            groups.setdefault(item[0], []).append(item)
+
+        if self._service is None:
+            self._service = self.service_factory()
+
+        for queue_name, items in groups.items():
+            bodies = [body for _, body, _, _ in items]
+            message_ids = [message_id for _, _, message_id, _ in items]
+
+            #queued behind spilled messages, publishing now would overtake them
+            if self._behind_backlog() and self.spill(queue_name, bodies, message_ids, behind_backlog=True):
+                self._count('spilled_behind_backlog', len(items))
+                continue
+
+            started = time.monotonic()
+            try:
+                sent = self._service.publish(queue_name, bodies, message_ids=message_ids)
+            except Exception as e:
+                logger.error(f"MQ publisher failed publishing to {queue_name}: {str(e)}")
+                sent = 0
+            elapsed_ms = (time.monotonic() - started) * 1000
+
+            if sent:
+                self._backoff = 0.0
+                with self._metrics_lock:
+                    self._metrics['published'] += sent
+                    self._metrics['batches'] += 1
+                    self._metrics['last_confirm_ms'] = elapsed_ms
+                    self._metrics['max_confirm_ms'] = max(self._metrics['max_confirm_ms'], elapsed_ms)
+                    self._metrics['total_confirm_ms'] += elapsed_ms
+
+            if sent < len(items):
+                self._failed(items[sent:])
+
+    def _run(self):
+        while True:
+            stopping = self._stopping.is_set()
+            batch = self._take_batch()
+            if batch:
+                try:
+                    self._publish_batch(batch)
+                except Exception as e:
+                    logger.error(f"MQ publisher batch failed: {str(e)}")
+
+                #back off while the broker keeps failing instead of reconnecting for every batch
+                if self._backoff:
+                    self._stopping.wait(self._backoff)
+            elif stopping:
+                return
+
+    def _reset_after_fork(self):
+        #the parent's thread is gone and its queued messages are the parent's to publish
+        self._queue = queue.Queue(maxsize=self.capacity)
+        self._retries = deque()
+        self._backoff = 0.0
+        self._stopping = threading.Event()
+        self._metrics_lock = threading.Lock()
+        self._thread = None
+        if self._service is not None:
+            #the socket belongs to the parent process, drop it without closing
+            self._service._connection = None
+            self._service = None
+
+    def start(self):
+        """Start the worker thread in the calling process, once"""
+        with self._start_lock:
+            pid = os.getpid()
+            if self._pid is not None and self._pid != pid:
+                self._reset_after_fork()
+            self._pid = pid
+
+            if self._thread is None or not self._thread.is_alive():
+                self._stopping.clear()
+                self._thread = threading.Thread(target=self._run, name='mq-publisher', daemon=True)
+                self._thread.start()
+
+    def stop(self, timeout=5):
+        """
+        Stop after draining the queue (due retries included), waiting at most timeout seconds.
+        Retries not due yet and whatever the worker did not get to are spilled.
+        """
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+        while self._retries:
+            _, queue_name, body, message_id, _ = self._retries.popleft()
+            self._drop('dropped_failed', queue_name, [body], [message_id])
+
+        while True:
+            try:
+                queue_name, body, message_id, _ = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            self._drop('dropped_failed', queue_name, [body], [message_id])
+
+    def metrics(self):
+        with self._metrics_lock:
+            metrics = dict(self._metrics)
+
+        total_confirm_ms = metrics.pop('total_confirm_ms')
+        return {
+            'enabled': self.enabled,
+            'policy': self.policy,
+            'capacity': self.capacity,
+            'backlog': self._queue.qsize(),
+            'retry_backlog': len(self._retries),
+            'avg_confirm_ms': total_confirm_ms / metrics['batches'] if metrics['batches'] else 0.0,
+            **metrics
+        }
+
@@ -0,0 +1,384 @@
+"""
+Disk spool for unsent MQ messages
+Messages the broker could not take (unreachable broker, publisher retries
+exhausted, full publisher queue) are appended to local segment files instead
+of being lost, and replayed at a limited rate once the broker is back.
+
+Each process appends to its own open segment, `<created ns>-<pid>.open`, one
+JSON record (queue, body, message id, spool time) per line. Writes are flushed
+to the OS on every append and fsynced at most every MQ_SPOOL_FSYNC_INTERVAL_MS.
+Full segments are renamed to `.ready`. A replayer claims a ready segment by
+renaming it to `.replay-<pid>`, so several processes can share one directory,
+and records its progress in an `.offset` file. A crash replays from the last
+offset (at least once), replayed messages keep their message id so consumers
+can drop the duplicates.
+
+The writer of an open segment and the replayer of a claimed one hold an
+exclusive flock on it. The kernel releases it when the process dies, so any
+open or claimed segment whose lock can be taken was left behind by a dead
+process and is recovered, whatever pid its name carries.
+
+While segments are pending, `backlog` is set and callers spool new messages
+behind them instead of publishing, so replay does not reorder them. Messages
+spooled behind the backlog while the broker is up are replayed on top of the
+MQ_SPOOL_REPLAY_RATE budget, so the backlog drains at that rate whatever the
+write throughput, and the process returns to publishing directly.
+"""
+
+import os
+import json
+import time
+import fcntl
+import threading
+import logging
+
+
+logger = logging.getLogger(__name__)
+
+
+class DiskSpool:
+
+    #attempts at creating a segment file nobody else locked
+    OPEN_ATTEMPTS = 3
+
+    def __init__(self, service_factory, directory='mq_spool', segment_bytes=8 * 1024 * 1024,
+                 fsync_interval=0.1, replay_rate=500, retry_interval=5):
+        """
+        Args:
+            service_factory: Builds the replayer's confirm-mode service, which has publish(queue_name, bodies) -> int sent
+        """
+        self.service_factory = service_factory
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.fsync_interval = fsync_interval
+        self.replay_rate = replay_rate
+        self.retry_interval = retry_interval
+        self.enabled = False
+        #segments are pending in the directory, new messages should be spooled behind them
+        self.backlog = False
+
+        self._lock = threading.Lock()
+        self._file = None
+        self._base = None
+        self._size = 0
+        self._dirty = False
+        self._last_fsync = 0.0
+        #messages spooled behind the backlog since the last replay tick, replayed on top of the rate budget
+        self._behind_backlog = 0
+
+        #replayer state, only touched by the replayer thread
+        self._service = None
+        #(base, path, locked file) of the segment being replayed
+        self._claimed = None
+        self._retry_at = 0.0
+
+        self._metrics = {
+            'spooled': 0,
+            'replayed': 0,
+            'failed_replays': 0,
+            'corrupt_records': 0,
+            'segments_replayed': 0
+        }
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    @staticmethod
+    def _try_lock(f):
+        try:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except BlockingIOError:
+            return False
+
+    def _open_locked(self, path, mode):
+        """
+        Open and lock path if it still exists under that name and no other process holds it.
+
+        Returns:
+            file: The locked file, or None
+        """
+        try:
+            f = open(path, mode)
+        except FileNotFoundError:
+            return None
+
+        try:
+            #locked and still the file behind path, not renamed by another process meanwhile
+            if self._try_lock(f) and os.fstat(f.fileno()).st_ino == os.stat(path).st_ino:
+                return f
+        except FileNotFoundError:
+            pass
+        f.close()
+        return None
+
+    #writer
+
+    def _fsync(self):
+        os.fsync(self._file.fileno())
+        self._dirty = False
+        self._last_fsync = time.monotonic()
+
+    def _close_segment(self):
+        if self._file is None:
+            return
+        self._fsync()
+        #renamed while still locked, so recover() never sees it half closed
+        os.rename(self._path(self._base + '.open'), self._path(self._base + '.ready'))
+        self._file.close()
+        self._file = None
+        self._base = None
+        self._size = 0
+
+    def _open_segment(self):
+        for _ in range(self.OPEN_ATTEMPTS):
+            self._base = f"{time.time_ns():020d}-{os.getpid()}"
+            self._file = self._open_locked(self._path(self._base + '.open'), 'ab')
+            if self._file is not None:
+                return
+        self._base = None
+        raise OSError(f"Cannot create a segment in {self.directory}")
+
+    def append(self, queue_name, bodies, message_ids, behind_backlog=False):
+        """
+        Args:
+            behind_backlog: The broker took messages, these are only spooled to stay behind the backlog
+
+        Returns:
+            bool: True once the messages are written (fsynced within the fsync interval)
+        """
+        now = time.time()
+        records = b''.join(
+            json.dumps({'q': queue_name, 'b': body, 'i': message_id, 't': now}, ensure_ascii=False).encode('utf-8') + b'\n'
+            for body, message_id in zip(bodies, message_ids)
+        )
+
+        try:
+            with self._lock:
+                if self._file is None:
+                    self._open_segment()
+                self.backlog = True
+
+                self._file.write(records)
+                self._file.flush()
+                self._size += len(records)
+                self._dirty = True
+                self._metrics['spooled'] += len(bodies)
+                if behind_backlog:
+                    self._behind_backlog += len(bodies)
+
+                if self._size >= self.segment_bytes:
+                    self._close_segment()
+                elif time.monotonic() - self._last_fsync >= self.fsync_interval:
+                    self._fsync()
+            return True
+
+        except Exception as e:
+            logger.error(f"Failed to spool {len(bodies)} message(s) for {queue_name}: {str(e)}")
+            return False
+
+    def sync(self):
+        """fsync pending appends, run every fsync interval"""
+        with self._lock:
+            if self._file is not None and self._dirty:
+                self._fsync()
+
+    def rotate(self):
+        """Close the open segment so it can be replayed"""
+        with self._lock:
+            self._close_segment()
+
+    #replayer
+
+    def recover(self):
+        """Make open or claimed segments nobody holds a lock on (their process died) replayable again"""
+        for name in os.listdir(self.directory):
+            base, _, state = name.partition('.')
+            if state != 'open' and not state.startswith('replay-'):
+                continue
+
+            f = self._open_locked(self._path(name), 'rb')
+            if f is None:
+                continue
+
+            try:
+                os.rename(self._path(name), self._path(base + '.ready'))
+                logger.info(f"Recovered MQ spool segment {base}")
+            except FileNotFoundError:
+                pass
+            finally:
+                f.close()
+
+    def _ready(self):
+        return sorted(name for name in os.listdir(self.directory) if name.endswith('.ready'))
+
+    def _claim(self):
+        ready = self._ready()
+        if not ready:
+            #nothing rotated yet, replay what this process spooled so far and what dead processes left
+            self.rotate()
+            self.recover()
+            ready = self._ready()
+
+        for name in ready:
+            base = name[:-len('.ready')]
+            f = self._open_locked(self._path(name), 'rb')
+            if f is None:
+                continue
+
+            claimed = self._path(f"{base}.replay-{os.getpid()}")
+            try:
+                #atomic, only one process wins a segment
+                os.rename(self._path(name), claimed)
+                return base, claimed, f
+            except FileNotFoundError:
+                f.close()
+        return None
+
+    def _pending(self):
+        return any(
+            name.endswith(('.open', '.ready')) or '.replay-' in name
+            for name in os.listdir(self.directory)
+        )
+
+    def _read_offset(self, base):
+        try:
+            with open(self._path(base + '.offset')) as f:
+                return int(f.read().strip() or 0)
+        except FileNotFoundError:
+            return 0
+
+    def _write_offset(self, base, offset):
+        tmp = self._path(base + '.offset.tmp')
+        with open(tmp, 'w') as f:
+            f.write(str(offset))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self._path(base + '.offset'))
+
+    def _publish(self, queue_name, bodies, message_ids, timestamps):
+        if self._service is None:
+            self._service = self.service_factory()
+        try:
+            return self._service.publish(queue_name, bodies, message_ids=message_ids, timestamps=timestamps)
+        except Exception as e:
+            logger.error(f"MQ spool replay to {queue_name} failed: {str(e)}")
+            return 0
+
+    def replay(self, budget):
+        """
+        Publish up to budget spooled messages, oldest segment first.
+
+        Returns:
+            int: Number of messages replayed
+        """
+        #shared by every process of the directory, each replayer tick refreshes it
+        self.backlog = self._pending()
+
+        if time.monotonic() < self._retry_at:
+            return 0
+
+        replayed = 0
+        while replayed < budget:
+            if self._claimed is None:
+                self._claimed = self._claim()
+                if self._claimed is None:
+                    self.backlog = self._pending()
+                    return replayed
+
+            base, path, f = self._claimed
+            offset = self._read_offset(base)
+
+            #(line end offset, queue, body, message id, spool time) of the next records
+            records = []
+            f.seek(offset)
+            position = offset
+            while len(records) < budget - replayed:
+                line = f.readline()
+                if not line:
+                    break
+                position += len(line)
+                try:
+                    record = json.loads(line)
+                    records.append((position, record['q'], record['b'], record.get('i'), record.get('t')))
+                except (ValueError, KeyError):
+                    #torn write at a crash, skipped below
+                    records.append((position, None, None, None, None))
+
+            if not records:
+                os.remove(path)
+                try:
+                    os.remove(self._path(base + '.offset'))
+                except FileNotFoundError:
+                    pass
+                f.close()
+                self._claimed = None
+                self._metrics['segments_replayed'] += 1
+                continue
+
+            #consecutive records of one queue are published as one batch
+            start = 0
+            while start < len(records):
+                queue_name = records[start][1]
+                end = start
+                while end < len(records) and records[end][1] == queue_name:
+                    end += 1
+
+                batch = records[start:end]
+                if queue_name is None:
+                    sent = len(batch)
+                    self._metrics['corrupt_records'] += sent
+                else:
+                    sent = self._publish(
+                        queue_name,
+                        [record[2] for record in batch],
+                        [record[3] for record in batch],
+                        [record[4] for record in batch]
+                    )
+                    replayed += sent
+                    self._metrics['replayed'] += sent
+
+                if sent:
+                    offset = batch[sent - 1][0]
+                    self._write_offset(base, offset)
+
+                if sent < len(batch):
+                    self._metrics['failed_replays'] += 1
+                    self._retry_at = time.monotonic() + self.retry_interval
+                    return replayed
+
+                start = end
+
+        return replayed
+
+    def run_replay_tick(self, interval):
+        #budget per tick keeps replay of the outage under replay_rate messages per second,
+        #messages spooled behind the backlog since are replayed on top so it shrinks
+        with self._lock:
+            behind_backlog, self._behind_backlog = self._behind_backlog, 0
+        self.replay(max(1, int(self.replay_rate * interval)) + behind_backlog)
+
+    def metrics(self):
+        segments = 0
+        pending_bytes = 0
+        oldest_created_ns = None
+
+        try:
+            for name in os.listdir(self.directory):
+                base, _, state = name.partition('.')
+                if state not in ('open', 'ready') and not state.startswith('replay-'):
+                    continue
+                segments += 1
+                pending_bytes += os.path.getsize(self._path(name)) - self._read_offset(base)
+                created_ns = int(base.split('-', 1)[0])
+                oldest_created_ns = created_ns if oldest_created_ns is None else min(oldest_created_ns, created_ns)
+        except OSError:
+            pass
+
+        return {
+            'enabled': self.enabled,
+            'segments': segments,
+            'pending_bytes': pending_bytes,
+            'oldest_age_seconds': (time.time_ns() - oldest_created_ns) / 1e9 if oldest_created_ns else 0.0,
+            **self._metrics
+        }
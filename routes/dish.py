@@ -8,6 +8,8 @@ from utils.response_utils import create_response
 
 dish_bp = Blueprint('dish', __name__, url_prefix='/v3/dish')
 
+MAX_NEARBY_RADIUS_KM = 50
+
 
 
 
@@ -38,6 +40,130 @@ def get_dish_overview(dish_id):
     
     else:
         return create_response(code=200, data=response['data'], message=response['msg']), 200
-    
-    
-    
+
+
+
+@dish_bp.route('/overviews', methods=['POST'])
+@jwt_required(optional=True)
+def get_dish_overviews():
+    """
+    Batch dish overviews for feed rendering
+
+    Request Body:
+        dishIds: Array of dish IDs (at most 50)
+        lat: Optional user latitude
+        lon: Optional user longitude
+
+    Returns:
+        JSON list of dish overviews in request order
+    """
+    data = request.get_json(silent=True)
+    if not data:
+        return create_response(code=200, message="Request body is required"), 200
+
+    dish_ids = data.get('dishIds')
+    if not isinstance(dish_ids, list) or not dish_ids:
+        return create_response(code=200, message="dishIds must be a non-empty list"), 200
+
+    try:
+        lat = float(data['lat']) if data.get('lat') is not None else None
+        lon = float(data['lon']) if data.get('lon') is not None else None
+    except (TypeError, ValueError):
+        return create_response(code=200, message="Invalid lat/lon"), 200
+
+    current_user_id = get_current_user_id()
+
+    response = DishService.get_dish_overviews(dish_ids, lat, lon, current_user_id)
+
+    if response['code'] == 0:
+        return create_response(code=0, data=response['data'], message=response['msg']), 200
+
+    else:
+        return create_response(code=200, data=response['data'], message=response['msg']), 200
+
+
+
+@dish_bp.route('/nearby', methods=['GET'])
+@jwt_required(optional=True)
+def get_nearby_dishes():
+    """
+    Dishes from merchants near the user
+
+    Query Params:
+        lat, lon: User location (required)
+        radius: Search radius in km (default 5, at most 50)
+        sort: 'distance' (default) or 'popular'
+        limit: Number of dishes (default 20, at most 50)
+
+    Returns:
+        JSON list of dish overviews in ranking order
+    """
+    lat = request.args.get('lat', type=float)
+    lon = request.args.get('lon', type=float)
+    radius = request.args.get('radius', default=5.0, type=float)
+    sort = request.args.get('sort', default='distance')
+    limit = request.args.get('limit', default=20, type=int)
+
+    if lat is None or lon is None or not (-90 <= lat <= 90) or not (-180 <= lon <= 180):
+        return create_response(code=200, message="Valid lat and lon are required"), 200
+
+    if radius is None or radius <= 0 or radius > MAX_NEARBY_RADIUS_KM:
+        return create_response(code=200, message=f"radius must be between 0 and {MAX_NEARBY_RADIUS_KM} km"), 200
+
+    if sort not in ('distance', 'popular'):
+        return create_response(code=200, message="sort must be 'distance' or 'popular'"), 200
+
+    if limit is None or limit < 1 or limit > DishService.MAX_BATCH_OVERVIEW_IDS:
+        return create_response(code=200, message=f"limit must be between 1 and {DishService.MAX_BATCH_OVERVIEW_IDS}"), 200
+
+    current_user_id = get_current_user_id()
+
+    response = DishService.get_nearby_dishes(lat, lon, radius, sort, limit, current_user_id)
+
+    if response['code'] == 0:
+        return create_response(code=0, data=response['data'], message=response['msg']), 200
+
+    else:
+        return create_response(code=200, data=response['data'], message=response['msg']), 200
+
+
+
+@dish_bp.route('/<string:dish_id>/similar', methods=['GET'])
+@jwt_required(optional=True)
+def get_similar_dishes(dish_id):
+    """
+    Dishes with the closest flavor profile
+
+    Query Params:
+        limit: Number of dishes (default 10, at most 50)
+        cuisine: Optional cuisine filter (profile background cuisine, case-insensitive)
+        lat, lon: Optional user location for distance
+        radius: Optional radius in km around lat/lon (at most 50)
+
+    Returns:
+        JSON list of dish overviews with a 'similarity' score, best match first
+    """
+    limit = request.args.get('limit', default=10, type=int)
+    cuisine = request.args.get('cuisine') or None
+    lat = request.args.get('lat', type=float)
+    lon = request.args.get('lon', type=float)
+    radius = request.args.get('radius', type=float)
+
+    if limit is None or limit < 1 or limit > DishService.MAX_BATCH_OVERVIEW_IDS:
+        return create_response(code=200, message=f"limit must be between 1 and {DishService.MAX_BATCH_OVERVIEW_IDS}"), 200
+
+    if radius is not None:
+        if lat is None or lon is None:
+            return create_response(code=200, message="lat and lon are required with radius"), 200
+        if radius <= 0 or radius > MAX_NEARBY_RADIUS_KM:
+            return create_response(code=200, message=f"radius must be between 0 and {MAX_NEARBY_RADIUS_KM} km"), 200
+
+    current_user_id = get_current_user_id()
+
+    response = DishService.get_similar_dishes(dish_id, limit, cuisine, lat, lon, radius, current_user_id)
+
+    if response['code'] == 0:
+        return create_response(code=0, data=response['data'], message=response['msg']), 200
+
+    else:
+        return create_response(code=200, data=response['data'], message=response['msg']), 200
@@ -0,0 +1,48 @@
+import hmac
+from flask import Blueprint, request, current_app
+from utils.response_utils import create_response
+from cache.counter_buffer import counter_buffer
+from cache.idempotency import idempotency_store
+from services.rabbitmq_service import async_publisher, event_coalescer, disk_spool
+from services.outbox_relay import outbox_relay
+import logging
+
+
+logger = logging.getLogger(__name__)
+
+metrics_bp = Blueprint('metrics', __name__, url_prefix='/v3/metrics')
+
+
+@metrics_bp.before_request
+def require_metrics_token():
+    #internal only: hidden unless the caller presents the configured token
+    token = current_app.config.get('METRICS_TOKEN')
+    presented = request.headers.get('X-Metrics-Token', '')
+    if not token or not hmac.compare_digest(presented.encode('utf-8'), token.encode('utf-8')):
+        return create_response(code=404, message='Not found'), 404
+
+
+@metrics_bp.route('', methods=['GET'])
+def get_metrics():
+    """
+    In-process runtime metrics for this worker
+    
+    Returns:
+        JSON response with counter buffer size and flush latency, idempotency replays, MQ publish backlog, coalescing, spool depth and outbox relay
+    """
+    try:
+        return create_response(
+            code=0,
+            data={
+                "counterBuffer": counter_buffer.metrics(),
+                "idempotency": idempotency_store.metrics(),
+                "mqPublisher": async_publisher.metrics(),
+                "mqCoalescer": event_coalescer.metrics(),
+                "mqSpool": disk_spool.metrics(),
+                "mqOutbox": outbox_relay.metrics()
+            },
+            message="Success"
+        ), 200
+    except Exception as e:
+        logger.error(f"Error getting metrics: {str(e)}")
+        return create_response(code=500, message="Failed to get metrics"), 200
@@ -2,6 +2,7 @@ from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from services.user_action_service import UserActionService
 from utils.response_utils import create_response
+from utils.idempotency import idempotent, mark_idempotent_result
 import requests
 import logging
 
@@ -81,24 +82,16 @@ def create_many_tastes():
     if not current_user_id:
         return create_response(code=200, message="User authentication required"), 200
 
-    #iterate over items in request body
     items = request.get_json().get('items',[])
 
-    results = []
-    for item in items:
-        result = UserActionService.create_taste(
-            user_id=current_user_id,
-            dish_id=item.get('dishId',""),
-            comment=item.get('comment',""),
-            media_ids=item.get('mediaIds',[]),
-            mood=item.get('mood',0),
-            tags=item.get('tags',[]),
-            recommend_state=item.get('recommendState', 0)
-        )
-        results.append(result)
-    print(results)
-    if all(result['code'] == 0 for result in results):
-        return create_response(code=0, data=results, message="Taste created successfully"), 200
+    #all items are validated and upserted in one transaction
+    result = UserActionService.create_tastes(
+        user_id=current_user_id,
+        items=items
+    )
+
+    if result['code'] == 0:
+        return create_response(code=0, data=result['data'], message="Taste created successfully"), 200
     else:
         return create_response(code=200, message="Failed to create tastes"), 200
 
@@ -106,6 +99,7 @@ def create_many_tastes():
 
 @user_actions_bp.route('/taste/create', methods=['POST'])
 @jwt_required()
+@idempotent
 def create_taste():
     current_user_id = get_current_user_id()
     
@@ -216,6 +210,66 @@ def get_user_merchant_items(merchant_id):
     return create_response(code=0, data=result['data'], message=result['msg']), 200
 
 
+def _list_user_activity(list_items):
+    """
+    Shared handler of the keyset-paginated user activity listings
+
+    Query Params:
+        cursor: nextCursor of the previous page, omitted for the first page
+        limit: Page size (default 20, at most 50)
+        lat, lon: Optional user location for dish distance
+
+    Returns:
+        JSON with 'items' and 'nextCursor' (null on the last page)
+    """
+    current_user_id = get_current_user_id()
+
+    if not current_user_id:
+        return create_response(code=200, message="User authentication required"), 200
+
+    cursor = request.args.get('cursor') or None
+    limit = request.args.get('limit', default=UserActionService.DEFAULT_PAGE_SIZE, type=int)
+    lat = request.args.get('lat', type=float)
+    lon = request.args.get('lon', type=float)
+
+    if limit is None or limit < 1 or limit > UserActionService.MAX_PAGE_SIZE:
+        return create_response(code=200, message=f"limit must be between 1 and {UserActionService.MAX_PAGE_SIZE}"), 200
+
+    result = list_items(
+        user_id=current_user_id,
+        cursor=cursor,
+        limit=limit,
+        user_lat=lat,
+        user_lon=lon
+    )
+
+    if result['code'] == 0:
+        return create_response(code=0, data=result['data'], message=result['msg']), 200
+    else:
+        return create_response(code=200, message=result['msg']), 200
+
+
+@user_actions_bp.route('/user/tastes', methods=['GET'])
+@jwt_required()
+def list_user_tastes():
+    """User's tastes with their dish, most recently updated first"""
+    return _list_user_activity(UserActionService.list_user_tastes)
+
+
+@user_actions_bp.route('/user/collections', methods=['GET'])
+@jwt_required()
+def list_user_collections():
+    """User's collected dishes, most recently collected first"""
+    return _list_user_activity(UserActionService.list_user_collections)
+
+
+@user_actions_bp.route('/user/likes', methods=['GET'])
+@jwt_required()
+def list_user_likes():
+    """Tastes the user liked with their dish, most recently liked first"""
+    return _list_user_activity(UserActionService.list_user_likes)
+
+
 # recommend dish
 @user_actions_bp.route('/dish/recommend/<string:dish_id>', methods=['POST'])
 @jwt_required()
@@ -259,6 +313,7 @@ def unrecommend_dish(dish_id):
 # collect dish
 @user_actions_bp.route('/dish/collect/<string:dish_id>', methods=['POST'])
 @jwt_required()
+@idempotent
 def collect_dish(dish_id):
     current_user_id = get_current_user_id()
     result = UserActionService.collect_dish(
@@ -279,6 +334,9 @@ def collect_dish(dish_id):
             )
         except Exception as e:
             logger.error(f"Push error for collect: {e}")
+
+    #the response code is 0 either way, only store a real collect for retries
+    mark_idempotent_result(result['code'] == 0)
     
     if result['code']==0:
         status_code = 0
@@ -343,6 +401,7 @@ def unlike_taste(taste_id):
 # Add this new route for UGC dish creation
 @user_actions_bp.route('/taste/addDish', methods=['POST'])
 @jwt_required(optional=True)
+@idempotent
 def add_dish_ugc():
 
     current_user_id = get_current_user_id()
@@ -1,6 +1,7 @@
 from extensions import ma
 from schemas.merchant import MerchantSchema
-from models.media import Media
+from cache.request_loader import get_request_loader
+from cache.image_dimensions import image_dimension_store
 
 
 class DishOverviewSchema(ma.Schema):
@@ -47,6 +48,18 @@ class DishOverviewSchema(ma.Schema):
 
 
 
+    def dump(self, obj, *, many=None):
+        many = self.many if many is None else bool(many)
+        dishes = obj if many else [obj]
+
+        get_request_loader().prime('media', [
+            dish.media[0].get("mediaId") for dish in dishes
+            if getattr(dish, 'media', None)
+        ])
+
+        return super().dump(obj, many=many)
+
+
     def get_title(self, obj):
         if hasattr(obj, 'display_title') and obj.display_title:
             return obj.display_title
@@ -67,7 +80,11 @@ class DishOverviewSchema(ma.Schema):
         if not media_id:
             return None
         
-        media_item = Media.query.get(media_id)
+        #all media ids of the dump are primed in dump(), resolved with one query
+        media_item = get_request_loader().load('media', media_id)
+
+        if not media_item:
+            return None
 
         width = None
         height = None
@@ -92,6 +109,12 @@ class DishOverviewSchema(ma.Schema):
             elif isinstance(media_item.height, list) and len(media_item.height) > 0:
                 height = media_item.height[0]
 
+        #fall back to probed dimensions for media rows saved without width/height
+        if width is None or height is None:
+            dimensions = image_dimension_store.get(media_item.url)
+            if dimensions:
+                width = width or dimensions['width']
+                height = height or dimensions['height']
 
 
         return {
@@ -165,4 +188,5 @@ class DishFlavorProfileSchema(ma.Schema):
 
 
 dish_overview_schema = DishOverviewSchema()
+dish_overviews_schema = DishOverviewSchema(many=True)
 dish_flavor_profile_schema = DishFlavorProfileSchema()
\ No newline at end of file
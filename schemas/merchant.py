@@ -1,6 +1,6 @@
 from extensions import ma
 from utils.img_util import get_image_dimensions_safe
-from models.thirdparty import ThirdPartyDelivery
+from cache.delivery_platforms import delivery_platform_registry
 
 class MerchantSchema(ma.Schema):
 
@@ -34,22 +34,17 @@ class MerchantSchema(ma.Schema):
 
     def get_third_party_delivery_items(self, obj):
         if not hasattr(obj, '_third_party_delivery_items_cache'):
-            obj._third_party_delivery_items_cache = []
-            platforms = ThirdPartyDelivery.get_all_active_platforms()
             merchant_external_ids = obj.get_all_external_ids()
-                
-            for platform in platforms:
-                external_id = merchant_external_ids.get(platform.name)
-                if external_id:
-                    delivery_url = platform.construct_url(external_id)
-                    if delivery_url:
-                        obj._third_party_delivery_items_cache.append(
-                        {
-                            "id": platform._id,
-                            "name": platform.name,
-                            "redirectUrl": delivery_url,
-                            "icon": platform.icon
-                        })
+
+            obj._third_party_delivery_items_cache = [
+                {
+                    "id": platform._id,
+                    "name": platform.name,
+                    "redirectUrl": delivery_url,
+                    "icon": platform.icon
+                }
+                for platform, delivery_url in delivery_platform_registry.links_for(merchant_external_ids)
+            ]
         
         return obj._third_party_delivery_items_cache
 
@@ -67,7 +62,7 @@ class MerchantDeliverySchema(ma.Schema):
         delivery_links = []
         
         if obj.external_ids:
-            platforms = ThirdPartyDelivery.get_all_active_platforms()
+            platforms = delivery_platform_registry.all()
             
             for platform in platforms:
                 external_id = obj.external_ids.get(platform.platform_key)
@@ -0,0 +1,173 @@
+"""
+Denormalized counters
+Dish.recommendedCount and Taste.usefulTotal are maintained with atomic +1/-1
+UPDATEs executed in the same transaction as the action that changes them, so
+a recommend or like never scans the whole tastes / likes table. Callers commit
+(and invalidate caches) themselves. When the counter buffer is enabled the
+deltas are staged on the transaction instead and coalesced per row after
+commit. reconcile_all recomputes exact counts in bulk and only rewrites rows
+that drifted, run periodically with the reconcile-counters command.
+"""
+
+from datetime import datetime, timedelta
+from sqlalchemy import func, select, exists, and_
+from extensions import db
+from models.dish import Dish
+from models.taste import Taste, TasteRecommendState
+from models.like import Like
+from cache.counter_buffer import counter_buffer
+
+
+class CounterService:
+
+    OBJECT_TYPE_TASTE = 'TASTE'
+
+    #recommend states counted in Dish.recommendedCount
+    RECOMMENDING_STATES = (TasteRecommendState.YES.value, TasteRecommendState.DEFAULT.value)
+
+    @staticmethod
+    def recommend_weight(taste):
+        """
+        Contribution of one taste to its dish's recommend count in its current (unflushed) state.
+        Read it before and after changing a taste and pass the difference to adjust_dish_recommend.
+        """
+        if taste is None or taste.deletedAt is not None:
+            return 0
+        return 1 if taste.recommendState in CounterService.RECOMMENDING_STATES else 0
+
+
+    @staticmethod
+    def adjust_dish_recommend(dish_id, delta):
+        """Add delta to Dish.recommendedCount inside the current transaction"""
+        if not delta:
+            return
+
+        if counter_buffer.enabled:
+            counter_buffer.stage(db.session, counter_buffer.DISH_RECOMMEND, dish_id, delta)
+            return
+
+        db.session.execute(
+            db.update(Dish)
+            .where(Dish._id == dish_id)
+            #counter changes are not edits, updatedAt stays put
+            .values({
+                Dish.recommendedCount: func.coalesce(Dish.recommendedCount, 0) + delta,
+                Dish.updatedAt: Dish.updatedAt
+            })
+        )
+
+
+    @staticmethod
+    def adjust_dish_recommend_many(deltas):
+        """
+        Add per-dish deltas inside the current transaction with one batched UPDATE.
+
+        Args:
+            deltas: dict of dish_id -> delta
+        """
+        rows = [(dish_id, delta) for dish_id, delta in deltas.items() if delta]
+        if not rows:
+            return
+
+        if counter_buffer.enabled:
+            for dish_id, delta in rows:
+                counter_buffer.stage(db.session, counter_buffer.DISH_RECOMMEND, dish_id, delta)
+            return
+
+        counter_buffer.apply(counter_buffer.DISH_RECOMMEND, rows)
+
+
+    @staticmethod
+    def adjust_taste_useful(taste_id, delta):
+        """Add delta to Taste.usefulTotal inside the current transaction"""
+        if not delta:
+            return
+
+        if counter_buffer.enabled:
+            counter_buffer.stage(db.session, counter_buffer.TASTE_USEFUL, taste_id, delta)
+            return
+
+        db.session.execute(
+            db.update(Taste)
+            .where(Taste._id == taste_id)
+            #pinned, otherwise onupdate bumps it and the taste jumps to the top of /v3/user/tastes
+            .values({Taste.usefulTotal: Taste.usefulTotal + delta, Taste.updatedAt: Taste.updatedAt})
+        )
+
+
+    @staticmethod
+    def _reconcile(table, key_column, count_column, counts, recent):
+        """
+        Rewrite count_column from the (key, total) subquery where it drifted.
+        Rows whose key is in the recent subquery are left alone, their deltas may still be buffered.
+
+        Returns:
+            int: Number of rows fixed
+        """
+        settled = ~exists().where(recent.c.key == key_column)
+
+        fixed = db.session.execute(
+            db.update(table)
+            .where(key_column == counts.c.key)
+            .where(func.coalesce(count_column, 0) != counts.c.total)
+            .where(settled)
+            .values({count_column: counts.c.total, table.updatedAt: table.updatedAt})
+        ).rowcount
+
+        #rows that still carry a count but have nothing left to count
+        fixed += db.session.execute(
+            db.update(table)
+            .where(func.coalesce(count_column, 0) != 0)
+            .where(~exists().where(counts.c.key == key_column))
+            .where(settled)
+            .values({count_column: 0, table.updatedAt: table.updatedAt})
+        ).rowcount
+
+        return fixed
+
+
+    @staticmethod
+    def reconcile_all(grace_seconds=0):
+        """
+        Recompute recommend and useful counts with one aggregate per counter and fix drift.
+
+        Deltas of committed actions may still sit in the write-behind buffer of a worker,
+        and applying them on top of a recomputed total would count them twice. Rows with a
+        taste (dishes) or like (tastes) updated in the last grace_seconds are therefore
+        skipped; the next run fixes them.
+
+        Args:
+            grace_seconds: Skip window, at least the longest time a delta stays buffered
+
+        Returns:
+            dict: dishes / tastes fixed
+        """
+        cutoff = datetime.utcnow() - timedelta(seconds=grace_seconds)
+
+        recommend_counts = select(
+            Taste.dishId.label('key'),
+            func.count().label('total')
+        ).where(
+            Taste.deletedAt.is_(None),
+            Taste.recommendState.in_(CounterService.RECOMMENDING_STATES)
+        ).group_by(Taste.dishId).subquery()
+
+        useful_counts = select(
+            Like.object.label('key'),
+            func.count().label('total')
+        ).where(
+            and_(Like.objectType == CounterService.OBJECT_TYPE_TASTE, Like.deletedAt.is_(None))
+        ).group_by(Like.object).subquery()
+
+        recent_tastes = select(Taste.dishId.label('key')).where(Taste.updatedAt > cutoff).subquery()
+
+        recent_likes = select(Like.object.label('key')).where(
+            and_(Like.objectType == CounterService.OBJECT_TYPE_TASTE, Like.updatedAt > cutoff)
+        ).subquery()
+
+        stats = {
+            'dishes': CounterService._reconcile(Dish, Dish._id, Dish.recommendedCount, recommend_counts, recent_tastes),
+            'tastes': CounterService._reconcile(Taste, Taste._id, Taste.usefulTotal, useful_counts, recent_likes)
+        }
+        db.session.commit()
+        return stats
@@ -2,6 +2,7 @@ from extensions import db
 from models.thirdparty import ThirdPartyDelivery
 from models.merchant import Merchant
 from utils.response_utils import create_response
+from cache.delivery_platforms import delivery_platform_registry
 
 class DeliveryService:
 
@@ -22,23 +23,17 @@ class DeliveryService:
             if not merchant:
                 return create_response(code=404, message="Merchant not found")
             
-            # Get all active delivery platforms
-            platforms = ThirdPartyDelivery.get_all_active_platforms()
-            
-            delivery_links = []
+            # Build links from the in-memory platform registry
             merchant_external_ids = merchant.get_all_external_ids()
-            # print(merchant_external_ids)
-            for platform in platforms:
-                external_id = merchant_external_ids.get(platform.name)
-                if external_id:
-                    delivery_url = platform.construct_url(external_id)
-                    if delivery_url:
-                        delivery_links.append({
-                            "id": platform._id,
-                            "name": platform.name,
-                            "redirect_url": delivery_url,
-                            "icon": platform.icon,
-                        })
+            delivery_links = [
+                {
+                    "id": platform._id,
+                    "name": platform.name,
+                    "redirect_url": delivery_url,
+                    "icon": platform.icon,
+                }
+                for platform, delivery_url in delivery_platform_registry.links_for(merchant_external_ids)
+            ]
             
             return create_response(
                 code=0,
@@ -74,7 +69,7 @@ class DeliveryService:
                 return create_response(code=404, message="Merchant not found")
             
             # Get platform
-            platform = ThirdPartyDelivery.get_platform_by_name(platform_name)
+            platform = delivery_platform_registry.get(platform_name)
             if not platform:
                 return create_response(code=404, message="Delivery platform not found")
             
@@ -135,6 +130,7 @@ class DeliveryService:
             
             db.session.add(platform)
             db.session.commit()
+            delivery_platform_registry.invalidate()
             
             return create_response(
                 code=0,
@@ -10,6 +10,9 @@ from utils.response_utils import create_response
 from sqlalchemy import and_, or_
 from datetime import datetime
 from bson import ObjectId
+from cache.dish_overview import dish_overview_cache
+from cache.merchant_dishes import merchant_dish_cache
+from services.media_validation import MediaValidationService
 import logging
 
 
@@ -41,10 +44,8 @@ class DishManagementService:
                 return create_response(code=200, message="Merchant not found")
             
             
-            if media_ids:
-                valid_media = Media.query.filter(Media._id.in_(media_ids)).all()
-                if len(valid_media) != len(media_ids):
-                    return create_response(code=200, message="Some media IDs are invalid")
+            if media_ids and not MediaValidationService.all_exist(media_ids):
+                return create_response(code=200, message="Some media IDs are invalid")
             
             new_dish = Dish(
                 _id=str(ObjectId()),
@@ -72,6 +73,7 @@ class DishManagementService:
             # Add to session and commit
             db.session.add(new_dish)
             db.session.commit()
+            merchant_dish_cache.invalidate(merchant_id)
             
             # Return created dish data
             return create_response(
@@ -118,8 +120,7 @@ class DishManagementService:
                 media_ids = update_data.pop('media_ids')
                 if media_ids is not None:
                     # Validate media IDs
-                    valid_media = Media.query.filter(Media._id.in_(media_ids)).all()
-                    if len(valid_media) != len(media_ids):
+                    if not MediaValidationService.all_exist(media_ids):
                         return create_response(code=400, message="Some media IDs are invalid")
                     
                     dish.media = [{"mediaId": media_id} for media_id in media_ids]
@@ -138,6 +139,7 @@ class DishManagementService:
             
             # Commit changes
             db.session.commit()
+            dish_overview_cache.invalidate(dish_id)
             
             # Update recommendation count if needed
             DishManagementService._update_dish_stats(dish_id)
@@ -202,6 +204,7 @@ class DishManagementService:
             })
             
             db.session.commit()
+            dish_overview_cache.invalidate(dish_id)
             
             return create_response(code=0, message="Dish deleted successfully")
             
@@ -267,6 +270,7 @@ class DishManagementService:
                 }, synchronize_session=False)
             
             db.session.commit()
+            dish_overview_cache.invalidate_many([dish._id for dish in dishes])
             
             return create_response(
                 code=0,
@@ -314,6 +318,7 @@ class DishManagementService:
             # This is a business decision - you might not want to restore these
             
             db.session.commit()
+            dish_overview_cache.invalidate(dish_id)
             
             # Update dish statistics
             DishManagementService._update_dish_stats(dish_id)
@@ -361,6 +366,7 @@ class DishManagementService:
             })
             
             db.session.commit()
+            dish_overview_cache.invalidate(dish_id)
             
         except Exception as e:
             logger.error(f"Error updating dish stats: {str(e)}")
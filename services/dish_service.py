@@ -1,16 +1,20 @@
 from extensions import db
+from sqlalchemy import func, values, column, String, Float
 from models.dish import Dish
 from models.merchant import Merchant
-from models.collection import Collection
-from models.taste import Taste
 from models.thirdparty import ThirdPartyDelivery
 from utils.response_utils import create_response
-from schemas.dish import dish_overview_schema
+from schemas.dish import dish_overview_schema, dish_overviews_schema
 
 
 from services.tag_gen import FlavorTagService
+from services.flavor_tag_store import FlavorTagStore
+from services.user_state_service import UserStateService
 from utils.geo_utils import haversine
-from utils.img_util import get_image_dimensions_safe
+from cache.image_dimensions import image_dimension_store
+from cache.dish_overview import dish_overview_cache
+from cache.geo_index import merchant_geo_index
+from cache.flavor_index import flavor_vector_index
 import requests
 from models.dish_profile import DishProfile
 
@@ -23,100 +27,266 @@ INGREDIENT_API_BASE_URL = os.getenv('INGREDIENT_API_BASE_URL')
 
 
 class DishService:
+
+    MAX_BATCH_OVERVIEW_IDS = 50
+
     @staticmethod
     def get_dish_overview(dish_id, user_lat, user_lon, current_user_id):
         try:
-            dish = db.session.query(Dish).options(
-                db.joinedload(Dish.merchant)
-            ).filter(Dish._id == dish_id).first()
-        
+            entry = DishService._get_shared_overview(dish_id)
 
-            if not dish:
+            if not entry:
                 return None,'Dish not found' , 404
 
-            merchant = dish.merchant
-            distance = None
 
-            if user_lat and user_lon:
-                if merchant.latitude is not None and merchant.longitude is not None:
-                    try:
-                        distance = haversine(user_lat, user_lon, merchant.latitude, merchant.longitude)
-                        merchant._distance_km = distance
+            #logic for show if current user collected or recommended
+            is_collected, is_recommended = UserStateService.resolve(current_user_id, [dish_id])[dish_id]
+
 
-                    except Exception as e:
-                        merchant._distance_km = None
+            result = DishService._apply_user_overlay(entry, user_lat, user_lon, is_collected, is_recommended)
 
-            else:
-                merchant._distance_km = None
+            return create_response(code=0, data=result, message="Success")
+        
+        except Exception as e:
+            print(f"Error getting dish overview: {e}")
+            return create_response(code=500, message="Failed to get dish overview", data=None)
 
 
-            #fetch icon dimensions
-            if merchant.icon:
+    @staticmethod
+    def get_dish_overviews(dish_ids, user_lat, user_lon, current_user_id):
+        """
+        Get overviews for a page of dishes (feed rendering).
 
-                merchant._icon_dimensions = get_image_dimensions_safe(merchant.icon)
-            else:
-                merchant._icon_dimensions = None
+        Cache misses are loaded with one IN-query per entity (dishes + merchants,
+        profiles, and media through the request loader) and dumped in a single
+        many=True pass; user state is
+        resolved with one query for the whole page.
+
+        Args:
+            dish_ids: List of dish IDs, order is preserved and duplicates dropped
+            user_lat/user_lon: Optional user location for distance
+            current_user_id: Optional user ID for isCollected/isRecommended
 
+        Returns:
+            dict: Standardized response with a list of overviews (unknown IDs are skipped)
+        """
+        try:
+            dish_ids = list(dict.fromkeys(dish_id for dish_id in dish_ids if dish_id))
 
+            if len(dish_ids) > DishService.MAX_BATCH_OVERVIEW_IDS:
+                return create_response(
+                    code=400,
+                    message=f"At most {DishService.MAX_BATCH_OVERVIEW_IDS} dish IDs per request"
+                )
 
-            dish_profile = DishProfile.query.filter_by(dish_id=str(dish.pg_id)).first()
+            entries = DishService._get_shared_overviews(dish_ids)
 
-            if dish_profile:
-                ai_tags = FlavorTagService.generate_flavor_tags(dish_profile)
-                formatted_tags = FlavorTagService.format_tags_for_display(ai_tags)
+            user_states = UserStateService.resolve(current_user_id, list(entries.keys()))
 
+            results = [
+                DishService._apply_user_overlay(entries[dish_id], user_lat, user_lon, *user_states[dish_id])
+                for dish_id in dish_ids if dish_id in entries
+            ]
 
+            return create_response(code=0, data=results, message="Success")
 
-                dish._ai_flavor_tags  = [tag for tag in formatted_tags
-                                        if tag['category'] in ['basic_flavor', 'detail_flavor', 'texture']]
-                
-                dish._ai_unique_tags  = [tag['tag'] for tag in formatted_tags
-                                         if tag['category'] == ['texture', 'combined_texture', 'cuisine']]
-                
-                dish._ingredients_data = dish._ai_flavor_tags + dish._ai_unique_tags
+        except Exception as e:
+            print(f"Error getting dish overviews: {e}")
+            return create_response(code=500, message="Failed to get dish overviews", data=None)
+
+
+    @staticmethod
+    def get_nearby_dishes(user_lat, user_lon, radius_km, sort, limit, current_user_id):
+        """
+        Get overviews of dishes from merchants within radius_km of the user.
+
+        Args:
+            user_lat/user_lon: User location
+            radius_km: Search radius in kilometres
+            sort: 'distance' (nearest first, then most recommended) or 'popular' (the reverse)
+            limit: Maximum number of dishes, at most MAX_BATCH_OVERVIEW_IDS
+            current_user_id: Optional user ID for isCollected/isRecommended
+
+        Returns:
+            dict: Standardized response with a list of overviews in ranking order
+        """
+        try:
+            merchant_geo_index.ensure_loaded()
+            distance_by_merchant = dict(merchant_geo_index.query(user_lat, user_lon, radius_km))
+
+            if not distance_by_merchant:
+                return create_response(code=0, data=[], message="Success")
+
+            #merchant distances joined as a VALUES list, so ranking and limit happen in SQL
+            nearby = values(
+                column('merchant_id', String), column('distance', Float), name='nearby'
+            ).data(list(distance_by_merchant.items()))
+
+            recommended = func.coalesce(Dish.recommendedCount, 0).desc()
+            if sort == 'popular':
+                order = (recommended, nearby.c.distance, Dish._id)
             else:
-                dish._ai_flavor_tags = []
-                dish._ai_unique_tags = []
-                dish._ingredients_data = []
+                order = (nearby.c.distance, recommended, Dish._id)
 
+            dish_ids = [
+                row._id for row in db.session.query(Dish._id)
+                .join(nearby, nearby.c.merchant_id == Dish.merchant_col)
+                .order_by(*order)
+                .limit(limit)
+            ]
 
-            #logic for show if current user collected or recommended
-            is_collected = False
-            is_recommended = False
-
-            if current_user_id:
-                is_collected = Collection.active_collections().filter_by(
-                    user=current_user_id,
-                    object=dish_id
-                ).first() is not None
-                
-                is_recommended = Taste.active_tastes().filter_by(
-                    userId=current_user_id,
-                    dishId=dish_id
-                ).first() is not None
-    
+            return DishService.get_dish_overviews(dish_ids, user_lat, user_lon, current_user_id)
+
+        except Exception as e:
+            print(f"Error getting nearby dishes: {e}")
+            return create_response(code=500, message="Failed to get nearby dishes", data=None)
+
+
+    @staticmethod
+    def get_similar_dishes(dish_id, limit, cuisine, user_lat, user_lon, radius_km, current_user_id):
+        """
+        Get overviews of the dishes whose flavor profile is closest to dish_id.
+
+        Args:
+            dish_id: Dish ID
+            limit: Maximum number of dishes, at most MAX_BATCH_OVERVIEW_IDS
+            cuisine: Optional background_cuisine filter
+            user_lat/user_lon: Optional user location, for distance and the radius filter
+            radius_km: Optional radius around the user location
+            current_user_id: Optional user ID for isCollected/isRecommended
+
+        Returns:
+            dict: Standardized response with overviews best match first, each with a 'similarity'
+        """
+        try:
+            if not flavor_vector_index.ensure_loaded():
+                return create_response(code=503, message="Similar dishes are not available yet, retry shortly", data=None)
+
+            merchant_ids = None
+            if radius_km and user_lat is not None and user_lon is not None:
+                merchant_geo_index.ensure_loaded()
+                merchant_ids = [merchant_id for merchant_id, _ in merchant_geo_index.query(user_lat, user_lon, radius_km)]
 
-            dish._is_collected = is_collected
-            dish._is_recommended = is_recommended
+            matches = flavor_vector_index.similar(dish_id, k=limit, cuisine=cuisine, merchant_ids=merchant_ids)
 
+            if matches is None:
+                return create_response(code=404, message="Dish flavor profile not found", data=None)
+
+            response = DishService.get_dish_overviews([match_id for match_id, _ in matches], user_lat, user_lon, current_user_id)
+
+            if response['code'] == 0:
+                similarity_by_dish = dict(matches)
+                for overview in response['data']:
+                    overview['similarity'] = round(similarity_by_dish[overview['_id']], 4)
+
+            return response
+
+        except Exception as e:
+            print(f"Error getting similar dishes: {e}")
+            return create_response(code=500, message="Failed to get similar dishes", data=None)
+
+
+    @staticmethod
+    def _get_shared_overview(dish_id):
+        """
+        Get the non-personal overview payload of a dish, building and caching it on a miss.
+
+        Returns:
+            dict: Cache entry with 'payload', 'latitude', 'longitude', or None if the dish does not exist
+        """
+        return DishService._get_shared_overviews([dish_id]).get(dish_id)
+
+
+    @staticmethod
+    def _get_shared_overviews(dish_ids):
+        """
+        Batched version of _get_shared_overview.
+
+        Returns:
+            dict: dish_id -> cache entry, for the dishes that exist
+        """
+        entries = dish_overview_cache.get_many(dish_ids)
+        missing_ids = [dish_id for dish_id in dish_ids if dish_id not in entries]
+
+        if not missing_ids:
+            return entries
+
+        dishes = db.session.query(Dish).options(
+            db.joinedload(Dish.merchant)
+        ).filter(Dish._id.in_(missing_ids)).all()
+
+        if not dishes:
+            return entries
+
+        #flavor tags are precomputed per dish pg_id, one query
+        tags_by_dish = FlavorTagStore.get_tags_many([str(dish.pg_id) for dish in dishes])
+
+        for dish in dishes:
+            merchant = dish.merchant
+            merchant._distance_km = None
+
+            #icon dimensions come from the in-memory store, unknown icons are probed in the background
+            merchant._icon_dimensions = image_dimension_store.get(merchant.icon)
+
+            DishService._attach_flavor_tags(dish, tags_by_dish.get(str(dish.pg_id)))
+
+            #per-user fields are layered on in _apply_user_overlay
+            dish._is_collected = False
+            dish._is_recommended = False
+
+        payloads = dish_overviews_schema.dump(dishes)
+
+        for dish, payload in zip(dishes, payloads):
+            entries[dish._id] = dish_overview_cache.set(
+                dish._id, payload, dish.merchant.latitude, dish.merchant.longitude
+            )
+
+        return entries
+
+
+    @staticmethod
+    def _attach_flavor_tags(dish, formatted_tags):
+        if formatted_tags is not None:
+            dish._ai_flavor_tags  = [tag for tag in formatted_tags
+                                    if tag['category'] in ['basic_flavor', 'detail_flavor', 'texture']]
             
-    
+            dish._ai_unique_tags  = [tag['tag'] for tag in formatted_tags
+                                     if tag['category'] == ['texture', 'combined_texture', 'cuisine']]
             
+            dish._ingredients_data = dish._ai_flavor_tags + dish._ai_unique_tags
+        else:
+            dish._ai_flavor_tags = []
+            dish._ai_unique_tags = []
+            dish._ingredients_data = []
 
-            result = dish_overview_schema.dump(dish)
 
-            return create_response(code=0, data=result, message="Success")
-        
-        except Exception as e:
-            print(f"Error getting dish overview: {e}")
-            return create_response(code=500, message="Failed to get dish overview", data=None)
+    @staticmethod
+    def _apply_user_overlay(entry, user_lat, user_lon, is_collected, is_recommended):
+        """Copy a cached overview payload and fill in distance and the user's collect/recommend flags"""
+        result = dict(entry['payload'])
+
+        distance = None
+        if user_lat and user_lon:
+            if entry['latitude'] is not None and entry['longitude'] is not None:
+                try:
+                    distance = haversine(user_lat, user_lon, entry['latitude'], entry['longitude'])
+                except Exception as e:
+                    distance = None
+
+        if result.get('merchant') is not None:
+            result['merchant'] = dict(result['merchant'], distance_km=distance)
+
+        result['isCollected'] = is_collected
+        result['isRecommended'] = is_recommended
+
+        return result
     
 
     @staticmethod
     def get_dish_flavor_profile(dish_id):
 
         try:
-            dish_profile = DishProfile.query.filter_by(dish_id=dish_id).first()
+            dish_profile = DishProfile.load_profile('flavor_profile_api').filter_by(dish_id=dish_id).first()
             
             if not dish_profile:
                 return create_response(code=404, message="Dish flavor profile not found", data=None)
@@ -0,0 +1,176 @@
+"""
+Materialized flavor tags
+Flavor tags only depend on the DishProfile scores, which change when a new model
+batch lands. The recompute-flavor-tags job stores the formatted tags per dish in
+dishFlavorTags with a hash of the scores and the tag rules version, so overview
+requests read the stored tags instead of loading the wide DishProfile row.
+Dishes without a current entry fall back to computing from the profile in
+memory; the result (or the absence of a profile) is kept in the fallback flavor
+tag cache so overview misses do not reload the profile every time. Only
+the recompute-flavor-tags job writes dishFlavorTags, so the read path never
+commits the request session.
+"""
+
+import json
+import hashlib
+import logging
+from datetime import datetime
+from sqlalchemy.dialects.postgresql import insert
+from extensions import db
+from models.dish_profile import DishProfile
+from models.dish_flavor_tags import DishFlavorTags
+from services.tag_gen import FlavorTagService
+from services.tag_engine import flavor_tag_engine
+from cache.fallback_flavor_tags import fallback_flavor_tag_cache
+
+
+logger = logging.getLogger(__name__)
+
+
+class FlavorTagStore:
+
+    @staticmethod
+    def profile_hash(scores, cuisine):
+        """Hash of one load_matrix row (tag source scores) and the profile cuisine"""
+        return hashlib.sha1(json.dumps([scores, cuisine]).encode('utf-8')).hexdigest()
+
+
+    @staticmethod
+    def _build_rows(profile_ids, dish_ids, cuisines, matrix, computed_at):
+        ai_tags = flavor_tag_engine.generate_from_matrix(matrix, cuisines)
+
+        rows = []
+        for profile_id, dish_id, cuisine, scores, tags in zip(
+            profile_ids, dish_ids, cuisines, matrix.tolist(), ai_tags
+        ):
+            rows.append({
+                'dish_id': dish_id,
+                'profile_id': profile_id,
+                'tags': FlavorTagService.format_tags_for_display(tags),
+                'profile_hash': FlavorTagStore.profile_hash(scores, cuisine),
+                'tag_version': FlavorTagService.TAG_VERSION,
+                'computedAt': computed_at
+            })
+        return rows
+
+
+    @staticmethod
+    def _latest_per_dish(rows):
+        #rows come ordered by profile id, later profiles of a dish replace earlier ones
+        return list({row['dish_id']: row for row in rows}.values())
+
+
+    @staticmethod
+    def _upsert(rows):
+        if not rows:
+            return
+
+        stmt = insert(DishFlavorTags.__table__).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['dish_id'],
+            set_={
+                'profile_id': stmt.excluded.profile_id,
+                'tags': stmt.excluded.tags,
+                'profile_hash': stmt.excluded.profile_hash,
+                'tag_version': stmt.excluded.tag_version,
+                'computedAt': stmt.excluded.computedAt
+            }
+        )
+        db.session.execute(stmt)
+        db.session.commit()
+
+
+    @staticmethod
+    def get_tags_many(dish_ids):
+        """
+        Args:
+            dish_ids: Dish pg_ids as strings (DishProfile.dish_id)
+
+        Returns:
+            dict: dish_id -> formatted tags, for the dishes that have a profile
+        """
+        dish_ids = list(set(dish_ids))
+        if not dish_ids:
+            return {}
+
+        tags_by_dish = {
+            row.dish_id: row.tags
+            for row in DishFlavorTags.query.filter(
+                DishFlavorTags.dish_id.in_(dish_ids),
+                DishFlavorTags.tag_version == FlavorTagService.TAG_VERSION
+            ).all()
+        }
+
+        missing_ids = [dish_id for dish_id in dish_ids if dish_id not in tags_by_dish]
+        if not missing_ids:
+            return tags_by_dish
+
+        for dish_id, tags in fallback_flavor_tag_cache.get_many(missing_ids).items():
+            if tags is not None:
+                tags_by_dish[dish_id] = tags
+            missing_ids.remove(dish_id)
+
+        if not missing_ids:
+            return tags_by_dish
+
+        #not materialized yet (or built by older tag rules), compute from the latest profile in memory
+        rows = FlavorTagStore._latest_per_dish(FlavorTagStore._build_rows(
+            *flavor_tag_engine.load_matrix(DishProfile.dish_id.in_(missing_ids)), datetime.utcnow()
+        ))
+
+        computed = {row['dish_id']: row['tags'] for row in rows}
+        for dish_id in missing_ids:
+            #remember dishes without a profile too, so they are not looked up on every miss
+            fallback_flavor_tag_cache.set(dish_id, computed.get(dish_id))
+
+        tags_by_dish.update(computed)
+        return tags_by_dish
+
+
+    @staticmethod
+    def recompute_all(batch_size=500, force=False):
+        """
+        Recompute stored tags for every dish profile, run after a new model batch lands.
+        Scores are loaded in id order straight into the tag engine, so the latest profile
+        of a dish wins; entries whose hash and tag version are unchanged are skipped
+        unless force is set.
+
+        Returns:
+            dict: scanned / updated / unchanged counts
+        """
+        stats = {'scanned': 0, 'updated': 0, 'unchanged': 0}
+        last_id = None
+
+        while True:
+            criteria = [] if last_id is None else [DishProfile.id > last_id]
+            profile_ids, dish_ids, cuisines, matrix = flavor_tag_engine.load_matrix(*criteria, limit=batch_size)
+
+            if not profile_ids:
+                break
+
+            last_id = profile_ids[-1]
+            stats['scanned'] += len(profile_ids)
+
+            latest_rows = FlavorTagStore._latest_per_dish(
+                FlavorTagStore._build_rows(profile_ids, dish_ids, cuisines, matrix, datetime.utcnow())
+            )
+
+            existing = {}
+            if not force:
+                existing = {
+                    row.dish_id: (row.profile_hash, row.tag_version)
+                    for row in db.session.query(
+                        DishFlavorTags.dish_id, DishFlavorTags.profile_hash, DishFlavorTags.tag_version
+                    ).filter(DishFlavorTags.dish_id.in_([row['dish_id'] for row in latest_rows])).all()
+                }
+
+            rows = [
+                row for row in latest_rows
+                if existing.get(row['dish_id']) != (row['profile_hash'], row['tag_version'])
+            ]
+
+            FlavorTagStore._upsert(rows)
+            stats['updated'] += len(rows)
+            stats['unchanged'] += len(latest_rows) - len(rows)
+
+        return stats
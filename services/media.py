@@ -16,10 +16,12 @@ from models.media import Media
 from utils.response_utils import create_response
 from sqlalchemy import and_
 import warnings
-from services.rabbitmq_service import RabbitMQService
+from services.rabbitmq_service import get_rabbitmq_service
 from mq.enums import *
 from bson import ObjectId
 from services.aws import AWSService
+from cache.known_media import known_media_cache
+from utils.unit_of_work import UnitOfWork
 
 logger = logging.getLogger(__name__)
 
@@ -28,7 +30,7 @@ class MediaService:
     
     @staticmethod
     def _get_rabbitmq_service():
-        return RabbitMQService()
+        return get_rabbitmq_service()
 
 
     @staticmethod
@@ -84,12 +86,12 @@ class MediaService:
                 userId=user_id, 
                 blurHashAt=datetime.utcnow()
             )
-            db.session.add(media)
-            db.session.flush()
-            
-            MediaService._send_media_create_event(media)
-
-            db.session.commit()
+            uow = UnitOfWork()
+            uow.add(media)
+            #published after commit, or written to the outbox with the media row
+            uow.publish(MediaService._send_media_create_event, media)
+            uow.after_commit(known_media_cache.remember, media._id, media.url)
+            uow.commit()
 
             return create_response(
                 code=0,
@@ -369,12 +371,12 @@ class MediaService:
                 source = source,
                 blurHashAt=datetime.utcnow()
             )
-            db.session.add(media)
-            db.session.flush()
-            
-            MediaService._send_media_create_event(media)
-
-            db.session.commit()
+            uow = UnitOfWork()
+            uow.add(media)
+            #published after commit, or written to the outbox with the media row
+            uow.publish(MediaService._send_media_create_event, media)
+            uow.after_commit(known_media_cache.remember, media._id, media.url)
+            uow.commit()
 
             return create_response(
                 code=0,
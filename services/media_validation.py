@@ -0,0 +1,61 @@
+from sqlalchemy import or_
+from extensions import db
+from models.media import Media
+from cache.known_media import known_media_cache
+
+
+class MediaValidationService:
+    """Resolves lists of media IDs / URLs with the known media cache and at most one query"""
+
+    @staticmethod
+    def is_url(media_ref):
+        return media_ref.startswith('http')
+
+
+    @staticmethod
+    def resolve(media_refs, allow_urls=True):
+        """
+        Args:
+            media_refs: Media IDs, or URLs when allow_urls is set
+            allow_urls: Treat references starting with http as media URLs
+
+        Returns:
+            dict: reference -> media ID, for the references that exist
+        """
+        media_refs = [media_ref for media_ref in dict.fromkeys(media_refs) if media_ref]
+        urls = [media_ref for media_ref in media_refs if allow_urls and MediaValidationService.is_url(media_ref)]
+        url_set = set(urls)
+        media_ids = [media_ref for media_ref in media_refs if media_ref not in url_set]
+
+        known_ids, known_urls = known_media_cache.lookup(media_ids, urls)
+        missing_ids = [media_id for media_id in media_ids if media_id not in known_ids]
+        missing_urls = [url for url in urls if url not in known_urls]
+
+        resolved = {**known_ids, **known_urls}
+        if not missing_ids and not missing_urls:
+            return resolved
+
+        conditions = []
+        if missing_ids:
+            conditions.append(Media._id.in_(missing_ids))
+        if missing_urls:
+            conditions.append(Media.url.in_(missing_urls))
+
+        missing_id_set = set(missing_ids)
+        missing_url_set = set(missing_urls)
+        for media_id, url in db.session.query(Media._id, Media.url).filter(or_(*conditions)).all():
+            known_media_cache.remember(media_id, url)
+            if media_id in missing_id_set:
+                resolved[media_id] = media_id
+            #several media can share a url, keep the first one like filter_by(url=...).first()
+            if url in missing_url_set and url not in resolved:
+                resolved[url] = media_id
+
+        return resolved
+
+
+    @staticmethod
+    def all_exist(media_ids):
+        """True if every media ID exists"""
+        resolved = MediaValidationService.resolve(media_ids, allow_urls=False)
+        return all(media_id in resolved for media_id in media_ids)
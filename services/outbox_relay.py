@@ -0,0 +1,200 @@
+"""
+Outbox relay
+Publishes committed mqOutbox rows to RabbitMQ in id order. Each batch is
+claimed with SELECT ... FOR UPDATE SKIP LOCKED, so several relay threads (or
+workers) share the backlog without publishing a row twice at the same time.
+Rows are marked sent in the claiming transaction once the broker confirmed
+them; unconfirmed rows are retried with exponential backoff. A crash between
+the confirm and that commit republishes the row, so messages carry the outbox
+id as AMQP message_id for consumers to drop duplicates.
+
+With coalescing on, rows of keyed queues (taste/create per taste, dish/collect
+per user and dish) are held until the oldest row of their key is
+MQ_COALESCE_WINDOW_MS old, like the in-memory coalescer does. Only the latest
+row of a key is published; the rows it supersedes are marked sent with it.
+"""
+
+import json
+import time
+import threading
+import logging
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from extensions import db
+from models.mq_outbox import MqOutbox
+from mq.outbox import outbox
+from services.rabbitmq_service import RabbitMQService, event_coalescer
+from utils.background import register_background_worker
+
+
+logger = logging.getLogger(__name__)
+
+
+class OutboxRelay:
+
+    MAX_BACKOFF_SECONDS = 300
+    PURGE_INTERVAL_SECONDS = 60
+
+    def __init__(self, batch_size=500, retention_hours=24):
+        self.batch_size = batch_size
+        self.retention_hours = retention_hours
+
+        #confirm-mode publisher per relay thread
+        self._local = threading.local()
+        self._last_purge = 0.0
+        self._lock = threading.Lock()
+
+        self._metrics = {
+            'batches': 0,
+            'relayed': 0,
+            'failed': 0,
+            'coalesced': 0,
+            'purged': 0,
+            'last_batch_ms': 0.0,
+            'max_batch_ms': 0.0
+        }
+
+    def _service(self):
+        service = getattr(self._local, 'service', None)
+        if service is None:
+            service = self._local.service = RabbitMQService(confirm_delivery=True)
+        return service
+
+    @staticmethod
+    def _coalesce(rows, now):
+        """
+        Latest-state coalescing of keyed rows, in id order.
+
+        Returns:
+            tuple: (rows to publish, superseded rows), rows of keys still inside their window are in neither
+        """
+        if not event_coalescer.enabled:
+            return rows, []
+
+        #(queue, key) -> rows of that key, in id order
+        keyed = OrderedDict()
+        for row in rows:
+            key_function = event_coalescer.key_functions.get(row.queue)
+            if key_function is not None:
+                try:
+                    keyed.setdefault((row.queue, key_function(json.loads(row.body))), []).append(row)
+                except ValueError:
+                    pass
+
+        due = now - timedelta(seconds=event_coalescer.window_seconds)
+        held = set()
+        superseded = []
+        for key_rows in keyed.values():
+            if key_rows[0].createdAt > due:
+                held.update(row.id for row in key_rows)
+            else:
+                superseded.extend(key_rows[:-1])
+
+        skipped = held | {row.id for row in superseded}
+        return [row for row in rows if row.id not in skipped], superseded
+
+    def relay_batch(self):
+        """
+        Claim, publish and mark one batch of due rows.
+
+        Returns:
+            int: Number of rows published or superseded, rows held for coalescing are not counted
+        """
+        started = time.monotonic()
+        now = datetime.utcnow()
+
+        rows = MqOutbox.query.filter(
+            MqOutbox.sentAt.is_(None),
+            MqOutbox.nextAttemptAt <= now
+        ).order_by(MqOutbox.id).limit(self.batch_size).with_for_update(skip_locked=True).all()
+
+        if not rows:
+            db.session.rollback()
+            return 0
+
+        publish, superseded = self._coalesce(rows, now)
+        for row in superseded:
+            row.sentAt = now
+
+        groups = OrderedDict()
+        for row in publish:
+            groups.setdefault(row.queue, []).append(row)
+
+        relayed = 0
+        failed = 0
+        for queue_name, group in groups.items():
+            sent = self._service().publish(
+                queue_name,
+                [row.body for row in group],
+                message_ids=[str(row.id) for row in group]
+            )
+
+            for row in group[:sent]:
+                row.sentAt = now
+            for row in group[sent:]:
+                row.attempts += 1
+                row.nextAttemptAt = now + timedelta(seconds=min(2 ** row.attempts, self.MAX_BACKOFF_SECONDS))
+
+            relayed += sent
+            failed += len(group) - sent
+
+        db.session.commit()
+
+        elapsed_ms = (time.monotonic() - started) * 1000
+        with self._lock:
+            self._metrics['batches'] += 1
+            self._metrics['relayed'] += relayed
+            self._metrics['failed'] += failed
+            self._metrics['coalesced'] += len(superseded)
+            self._metrics['last_batch_ms'] = elapsed_ms
+            self._metrics['max_batch_ms'] = max(self._metrics['max_batch_ms'], elapsed_ms)
+
+        if failed:
+            logger.error(f"Outbox relay could not publish {failed} messages, retrying later")
+
+        return len(publish) + len(superseded)
+
+    def purge(self):
+        """Delete rows sent longer than the retention period ago"""
+        cutoff = datetime.utcnow() - timedelta(hours=self.retention_hours)
+        purged = MqOutbox.query.filter(MqOutbox.sentAt < cutoff).delete(synchronize_session=False)
+        db.session.commit()
+
+        with self._lock:
+            self._metrics['purged'] += purged
+        return purged
+
+    def run_worker_tick(self):
+        #keep draining while batches come back full
+        while self.relay_batch() >= self.batch_size:
+            pass
+
+        if time.monotonic() - self._last_purge >= self.PURGE_INTERVAL_SECONDS:
+            self._last_purge = time.monotonic()
+            self.purge()
+
+    def metrics(self):
+        with self._lock:
+            metrics = dict(self._metrics)
+        return {'enabled': outbox.enabled, **metrics}
+
+
+outbox_relay = OutboxRelay()
+
+
+def init_outbox(app):
+    outbox.enabled = app.config.get('MQ_OUTBOX_ENABLED', False)
+    outbox_relay.batch_size = app.config.get('MQ_OUTBOX_BATCH_SIZE', 500)
+    outbox_relay.retention_hours = app.config.get('MQ_OUTBOX_RETENTION_HOURS', 24)
+
+    if not outbox.enabled:
+        return
+
+    for index in range(app.config.get('MQ_OUTBOX_RELAY_WORKERS', 1)):
+        register_background_worker(
+            app,
+            name=f'mq-outbox-relay-{index}',
+            target=outbox_relay.run_worker_tick,
+            interval=app.config.get('MQ_OUTBOX_RELAY_INTERVAL_MS', 200) / 1000,
+            wakeup=outbox.wakeup
+        )
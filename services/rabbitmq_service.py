@@ -1,13 +1,21 @@
 
 import json
+import uuid
 import pika
 import logging
 from datetime import datetime
 from typing import Dict, Any, Optional, List
 from dataclasses import asdict
 import os
+import atexit
+import threading
 from contextlib import contextmanager
 from mq.enums import *
+from mq.publisher import AsyncPublisher
+from mq.outbox import outbox
+from mq.coalescer import EventCoalescer
+from mq.spool import DiskSpool
+from utils.background import register_background_worker
 from bson import ObjectId
 from models.taste import TasteRecommendState
 
@@ -18,7 +26,7 @@ logger = logging.getLogger(__name__)
 class RabbitMQService:
     
 
-    def __init__(self):
+    def __init__(self, confirm_delivery: bool = False):
         self.connection_params = pika.ConnectionParameters(
             host=os.getenv('RABBITMQ_HOST', 'localhost'),
             port=int(os.getenv('RABBITMQ_PORT', 5672)),
@@ -28,20 +36,43 @@ class RabbitMQService:
                 password=os.getenv('RABBITMQ_PASS', 'guest')
             ),
             connection_attempts=3,
-            retry_delay=2
+            retry_delay=2,
+            heartbeat=int(os.getenv('RABBITMQ_HEARTBEAT', 60)),
+            blocked_connection_timeout=float(os.getenv('RABBITMQ_BLOCKED_CONNECTION_TIMEOUT', 30))
         )
         self.exchange = os.getenv('RABBITMQ_EXCHANGE', 'app_exchange')
+        #wait for a broker ack on every publish (async publisher worker)
+        self.confirm_delivery = confirm_delivery
         self._connection = None
         self._channel = None
+        #queues declared and bound on the current channel
+        self._declared_queues = set()
     
 
 
+    def _reset(self):
+        try:
+            if self._connection and not self._connection.is_closed:
+                self._connection.close()
+        except Exception:
+            pass
+        self._connection = None
+        self._channel = None
+        self._declared_queues = set()
+
     @contextmanager
     def get_channel(self):
         try:
-            if not self._connection or self._connection.is_closed:
+            if self._connection and self._connection.is_open:
+                #services heartbeats and surfaces a connection the broker dropped while idle
+                self._connection.process_data_events(time_limit=0)
+
+            if not self._connection or self._connection.is_closed or not self._channel or self._channel.is_closed:
+                self._reset()
                 self._connection = pika.BlockingConnection(self.connection_params)
                 self._channel = self._connection.channel()
+                if self.confirm_delivery:
+                    self._channel.confirm_delivery()
                 
 
 
@@ -58,35 +89,113 @@ class RabbitMQService:
             raise
         finally:
             pass
+
+    def _declare_queue(self, channel, queue_name: str):
+        if queue_name in self._declared_queues:
+            return
+
+        channel.queue_declare(queue=queue_name, durable=True)
+        
+        channel.queue_bind(
+            exchange=self.exchange,
+            queue=queue_name,
+            routing_key=queue_name
+        )
+        self._declared_queues.add(queue_name)
     
     def send_message(self, queue_name: str, data: Dict[str, Any]) -> bool:
-        try:
-            with self.get_channel() as channel:
-                channel.queue_declare(queue=queue_name, durable=True)
-                
-                channel.queue_bind(
-                    exchange=self.exchange,
-                    queue=queue_name,
-                    routing_key=queue_name
-                )
-                
-                channel.basic_publish(
-                    exchange=self.exchange,
-                    routing_key=queue_name,
-                    body=json.dumps(data, ensure_ascii=False),
-                    properties=pika.BasicProperties(
-                        delivery_mode=2,
-                        content_type='application/json',
-                        timestamp=int(datetime.utcnow().timestamp())
-                    )
-                )
-                
-                logger.info(f"Message sent successfully to queue: {queue_name}")
+        return self.send_messages(queue_name, [data])
+
+    def send_messages(self, queue_name: str, data_list: List[Dict[str, Any]]) -> bool:
+        """
+        Publish several messages to one queue: as outbox rows inside a captured transaction,
+        otherwise after the coalescing window (keyed queues) and through the async publisher
+        when they are enabled
+        """
+        if not data_list:
+            return True
+
+        if event_coalescer.enabled and not outbox.capturing:
+            data_list = event_coalescer.add(queue_name, data_list)
+            if not data_list:
                 return True
-                
-        except Exception as e:
-            logger.error(f"Failed to send message to {queue_name}: {str(e)}")
-            return False
+
+        return self._dispatch(queue_name, data_list)
+
+    def _dispatch(self, queue_name: str, data_list: List[Dict[str, Any]]) -> bool:
+        bodies = [json.dumps(data, ensure_ascii=False) for data in data_list]
+
+        if outbox.stage(queue_name, bodies):
+            return True
+
+        #kept through retries and spool replays, so consumers can drop duplicates
+        message_ids = [uuid.uuid4().hex for _ in bodies]
+
+        if async_publisher.enabled:
+            return async_publisher.enqueue(queue_name, bodies, message_ids)
+
+        #spooled messages are waiting, publishing now would overtake them
+        if disk_spool.enabled and disk_spool.backlog:
+            return disk_spool.append(queue_name, bodies, message_ids, behind_backlog=True)
+
+        sent = self.publish(queue_name, bodies, message_ids=message_ids)
+        if sent < len(bodies) and disk_spool.enabled:
+            return disk_spool.append(queue_name, bodies[sent:], message_ids[sent:])
+
+        return sent == len(bodies)
+
+    def publish(self, queue_name: str, bodies: List[str], message_ids: Optional[List[str]] = None,
+                timestamps: Optional[List[float]] = None) -> int:
+        """
+        Publish serialized messages to one queue over the long-lived channel, in order.
+        A dropped connection is reopened and the rest of the batch retried once.
+
+        Args:
+            message_ids: Optional AMQP message_id per body, lets consumers drop redelivered duplicates
+            timestamps: Optional original send time per body (spool replays), defaults to now
+
+        Returns:
+            int: Number of messages published (confirmed by the broker in confirm mode)
+        """
+        sent = 0
+
+        for attempt in (1, 2):
+            try:
+                with self.get_channel() as channel:
+                    self._declare_queue(channel, queue_name)
+                    
+                    timestamp = int(datetime.utcnow().timestamp())
+                    for index in range(sent, len(bodies)):
+                        properties = pika.BasicProperties(
+                            delivery_mode=2,
+                            content_type='application/json',
+                            timestamp=int(timestamps[index]) if timestamps and timestamps[index] else timestamp,
+                            message_id=message_ids[index] if message_ids else None
+                        )
+                        channel.basic_publish(
+                            exchange=self.exchange,
+                            routing_key=queue_name,
+                            body=bodies[index],
+                            properties=properties
+                        )
+                        sent += 1
+                    
+                    logger.info(f"{len(bodies)} message(s) sent successfully to queue: {queue_name}")
+                    return sent
+
+            except (pika.exceptions.AMQPConnectionError, pika.exceptions.AMQPChannelError) as e:
+                self._reset()
+                if attempt == 1:
+                    logger.warning(f"RabbitMQ connection lost publishing to {queue_name}, reconnecting: {str(e)}")
+                    continue
+                logger.error(f"Failed to send messages to {queue_name}: {str(e)}")
+                return sent
+                    
+            except Exception as e:
+                logger.error(f"Failed to send messages to {queue_name}: {str(e)}")
+                return sent
+
+        return sent
     
     def send_media_create(self, media_id: str, media_type: MediaType, 
                          url: str, source: MediaSource,
@@ -119,9 +228,9 @@ class RabbitMQService:
         return self.send_message(QueueName.DISH_COLLECT.value, asdict(message))
     
 
-    def send_taste_create(self, taste_id: str, user_id: str, dish_id: str,
-                         comment: str, recommend_state: int,
-                         media_ids: Optional[List[str]] = None) -> bool:
+    def _taste_create_data(self, taste_id: str, user_id: str, dish_id: str,
+                           comment: str, recommend_state: int,
+                           media_ids: Optional[List[str]] = None) -> Dict[str, Any]:
         message = TasteCreateMessage(
             id=taste_id,
             userId=user_id,
@@ -131,9 +240,23 @@ class RabbitMQService:
             mediaIds=media_ids
         )
         
-        data = {k: v for k, v in asdict(message).items() if v is not None}
+        return {k: v for k, v in asdict(message).items() if v is not None}
+
+    def send_taste_create(self, taste_id: str, user_id: str, dish_id: str,
+                         comment: str, recommend_state: int,
+                         media_ids: Optional[List[str]] = None) -> bool:
+        data = self._taste_create_data(taste_id, user_id, dish_id, comment, recommend_state, media_ids)
         
         return self.send_message(QueueName.TASTE_CREATE.value, data)
+
+    def send_taste_create_many(self, messages: List[Dict[str, Any]]) -> bool:
+        """
+        Args:
+            messages: send_taste_create keyword arguments, one dict per taste
+        """
+        data_list = [self._taste_create_data(**message) for message in messages]
+        
+        return self.send_messages(QueueName.TASTE_CREATE.value, data_list)
     
     def send_taste_add_dish(self, id: str, user_id: str, merchant_id: str, name: str,
                            price: Optional[int] = None,
@@ -164,14 +287,119 @@ class RabbitMQService:
         self.close()
 
 
-# _rabbitmq_service = None
+disk_spool = DiskSpool(service_factory=lambda: RabbitMQService(confirm_delivery=True))
+
+
+def init_disk_spool(app):
+    disk_spool.enabled = app.config.get('MQ_SPOOL_ENABLED', False)
+    disk_spool.directory = app.config.get('MQ_SPOOL_DIR', 'mq_spool')
+    disk_spool.segment_bytes = app.config.get('MQ_SPOOL_SEGMENT_BYTES', 8 * 1024 * 1024)
+    disk_spool.fsync_interval = app.config.get('MQ_SPOOL_FSYNC_INTERVAL_MS', 100) / 1000
+    disk_spool.replay_rate = app.config.get('MQ_SPOOL_REPLAY_RATE', 500)
+    disk_spool.retry_interval = app.config.get('MQ_SPOOL_RETRY_INTERVAL', 5)
+
+    if not disk_spool.enabled:
+        return
+
+    try:
+        os.makedirs(disk_spool.directory, exist_ok=True)
+        disk_spool.recover()
+    except OSError as e:
+        logger.error(f"MQ spool directory {disk_spool.directory} unusable, spool disabled: {str(e)}")
+        disk_spool.enabled = False
+        return
+
+    register_background_worker(
+        app,
+        name='mq-spool-sync',
+        target=disk_spool.sync,
+        interval=disk_spool.fsync_interval
+    )
+
+    replay_interval = 0.1
+    register_background_worker(
+        app,
+        name='mq-spool-replayer',
+        target=lambda: disk_spool.run_replay_tick(replay_interval),
+        interval=replay_interval
+    )
+
+    atexit.register(disk_spool.rotate)
+
+
+async_publisher = AsyncPublisher(
+    service_factory=lambda: RabbitMQService(confirm_delivery=True),
+    sync_publish=lambda queue_name, bodies, message_ids: get_rabbitmq_service().publish(
+        queue_name, bodies, message_ids=message_ids
+    ),
+    spill=lambda queue_name, bodies, message_ids, behind_backlog=False: (
+        disk_spool.enabled and disk_spool.append(queue_name, bodies, message_ids, behind_backlog)
+    ),
+    backlog=lambda: disk_spool.backlog
+)
+
+
+def init_async_publisher(app):
+    async_publisher.enabled = app.config.get('MQ_PUBLISHER_ASYNC', False)
+    async_publisher.configure(
+        capacity=app.config.get('MQ_PUBLISHER_QUEUE_SIZE', 10000),
+        batch_size=app.config.get('MQ_PUBLISHER_BATCH_SIZE', 100),
+        policy=app.config.get('MQ_PUBLISHER_FULL_POLICY', AsyncPublisher.POLICY_BLOCK),
+        block_timeout=app.config.get('MQ_PUBLISHER_BLOCK_TIMEOUT_MS', 50) / 1000,
+        max_retries=app.config.get('MQ_PUBLISHER_MAX_RETRIES', 5),
+        retry_backoff=app.config.get('MQ_PUBLISHER_RETRY_BACKOFF_MS', 500) / 1000
+    )
+
+    if not async_publisher.enabled:
+        return
+
+    #the worker thread starts with the first enqueue of each process
+    atexit.register(async_publisher.stop)
+
+
+event_coalescer = EventCoalescer(
+    emit=lambda queue_name, data_list: get_rabbitmq_service()._dispatch(queue_name, data_list),
+    key_functions={
+        #latest state per taste, and per (user, dish) for collects
+        QueueName.TASTE_CREATE.value: lambda data: data.get('id'),
+        QueueName.DISH_COLLECT.value: lambda data: (data.get('userId'), data.get('dishId')),
+    }
+)
+
+
+def init_event_coalescer(app):
+    window_ms = app.config.get('MQ_COALESCE_WINDOW_MS', 500)
+    event_coalescer.window_seconds = window_ms / 1000
+    event_coalescer.enabled = window_ms > 0
+
+    if not event_coalescer.enabled:
+        return
+
+    register_background_worker(
+        app,
+        name='mq-event-coalescer',
+        target=event_coalescer.flush,
+        interval=event_coalescer.window_seconds / 4
+    )
+
+    #registered after the async publisher, so it runs before the publisher stops
+    atexit.register(event_coalescer.flush, everything=True)
+
+
+#pika connections are not thread-safe, so each thread of each worker process keeps its own
+_publishers = threading.local()
 
 
-# def get_rabbitmq_service() -> RabbitMQService:
-#     global _rabbitmq_service
-#     if _rabbitmq_service is None:
-#         _rabbitmq_service = RabbitMQService()
-#     return _rabbitmq_service
+def get_rabbitmq_service() -> RabbitMQService:
+    """Long-lived publisher of the calling thread, rebuilt after a fork"""
+    service = getattr(_publishers, 'service', None)
+    if service is None or _publishers.pid != os.getpid():
+        if service is not None:
+            #the socket belongs to the parent process, drop it without closing
+            service._connection = None
+        service = _publishers.service = RabbitMQService()
+        _publishers.pid = os.getpid()
+    return service
 
 
 # #helper funcs
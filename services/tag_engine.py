@@ -0,0 +1,246 @@
+"""
+Vectorized flavor tag engine
+Compiles the FlavorTagService maps and patterns into threshold arrays once and
+generates tags for many profiles at a time from an (N x features) score matrix.
+Output is identical to FlavorTagService.generate_flavor_tags for every profile.
+"""
+
+import numpy as np
+from operator import itemgetter
+from sqlalchemy import func
+from extensions import db
+from models.dish_profile import DishProfile
+from services.tag_gen import FlavorTagService
+
+
+_priority = itemgetter('priority')
+
+
+class FlavorTagEngine:
+
+    INDIVIDUAL_PRIORITY = 2
+    TEXTURE_PRIORITY = 3
+    MAX_TEXTURE_TAGS = 2
+
+    def __init__(self, tag_service=FlavorTagService):
+        self.tag_service = tag_service
+
+        #individual tags, in the order FlavorTagService appends candidates
+        individual = [
+            (field, config, 'basic_flavor') for field, config in tag_service.BASIC_FLAVOR_MAP.items()
+            if not config['exclude']
+        ] + [
+            (field, config, 'detail_flavor') for field, config in tag_service.DETAIL_FLAVOR_MAP.items()
+            if not config['exclude']
+        ]
+        texture = [
+            (field, config, 'texture') for field, config in tag_service.TEXTURE_MAP.items()
+            if not config['exclude']
+        ]
+        combined = [
+            (pattern, 'combined_flavor') for pattern in tag_service.COMBINED_FLAVOR_PATTERNS
+        ] + [
+            (pattern, 'combined_texture') for pattern in tag_service.COMBINED_TEXTURE_PATTERNS
+        ]
+
+        #one matrix column per profile attribute any rule reads
+        fields = []
+        for field, _, _ in individual + texture:
+            if field not in fields:
+                fields.append(field)
+        for pattern, _ in combined:
+            for field in pattern['pattern']:
+                if field not in fields:
+                    fields.append(field)
+
+        self.fields = tuple(fields)
+        column = {field: index for index, field in enumerate(self.fields)}
+
+        self._individual_columns = np.array([column[field] for field, _, _ in individual], dtype=np.intp)
+        self._individual_thresholds = np.array([config['threshold'] for _, config, _ in individual])
+
+        self._texture_columns = np.array([column[field] for field, _, _ in texture], dtype=np.intp)
+        self._texture_thresholds = np.array([config['threshold'] for _, config, _ in texture])
+
+        #candidate index -> (text, emoji, category, priority); textures follow the individual tags
+        self._candidate_tags = [
+            (config['tag'], config['emoji'], category, self.INDIVIDUAL_PRIORITY)
+            for _, config, category in individual
+        ] + [
+            (config['tag'], config['emoji'], category, self.TEXTURE_PRIORITY)
+            for _, config, category in texture
+        ]
+
+        #combined patterns as a (patterns x columns) membership mask against per-column thresholds
+        self._combined_tags = []
+        self._combined_masks = np.zeros((len(combined), len(self.fields)), dtype=bool)
+        self._combined_thresholds = np.zeros((len(combined), len(self.fields)))
+        for index, (pattern, category) in enumerate(combined):
+            for field in pattern['pattern']:
+                self._combined_masks[index, column[field]] = True
+                self._combined_thresholds[index, column[field]] = pattern['threshold']
+            self._combined_tags.append({
+                'text': pattern['tag'],
+                'emoji': pattern['emoji'],
+                'category': category,
+                'priority': pattern['priority']
+            })
+        self._combined_bits = 1 << np.arange(len(combined), dtype=np.int64)
+
+        self._combined_sets = {}
+        self._cuisine_tags = {}
+
+
+    def build_matrix(self, profiles):
+        """
+        Args:
+            profiles: DishProfile objects, or rows exposing the same attribute names
+
+        Returns:
+            np.ndarray: (N x len(self.fields)) float64 scores, missing values as 0
+        """
+        return np.array(
+            [[getattr(profile, field, 0) or 0 for field in self.fields] for profile in profiles],
+            dtype=np.float64
+        ).reshape(len(profiles), len(self.fields))
+
+
+    def load_matrix(self, *criteria, limit=None):
+        """
+        Load profile scores straight into a matrix without building DishProfile objects.
+
+        Args:
+            criteria: Filters applied to the DishProfile query
+            limit: Optional row limit
+
+        Returns:
+            tuple: (profile ids, dish ids, cuisines, matrix), ordered by profile id
+        """
+        #coalesce matches the "or 0" applied to missing scores
+        columns = [func.coalesce(getattr(DishProfile, field), 0) for field in self.fields]
+        query = db.session.query(
+            DishProfile.id, DishProfile.dish_id, DishProfile.background_cuisine, *columns
+        ).filter(*criteria).order_by(DishProfile.id)
+        if limit is not None:
+            query = query.limit(limit)
+        rows = query.all()
+
+        profile_ids = [row[0] for row in rows]
+        dish_ids = [row[1] for row in rows]
+        cuisines = [row[2] for row in rows]
+        matrix = np.array([row[3:] for row in rows], dtype=np.float64).reshape(len(rows), len(self.fields))
+
+        return profile_ids, dish_ids, cuisines, matrix
+
+
+    def generate_many(self, profiles, max_tags=5):
+        """Same as calling FlavorTagService.generate_flavor_tags for each profile"""
+        profiles = list(profiles)
+        if not profiles:
+            return []
+
+        matrix = self.build_matrix(profiles)
+        cuisines = [getattr(profile, 'background_cuisine', None) for profile in profiles]
+        return self.generate_from_matrix(matrix, cuisines, max_tags=max_tags)
+
+
+    def generate_from_matrix(self, matrix, cuisines, max_tags=5):
+        """
+        Args:
+            matrix: Scores from build_matrix / load_matrix
+            cuisines: background_cuisine per row
+            max_tags: Maximum number of tags per row
+
+        Returns:
+            list: Tag lists, one per row
+        """
+        count = matrix.shape[0]
+        if count == 0:
+            return []
+
+        with np.errstate(invalid='ignore'):
+            #patterns reject on value < threshold, so a NaN score does not break a pattern
+            failed = matrix[:, None, :] < self._combined_thresholds[None, :, :]
+            combined_hits = ~np.any(failed & self._combined_masks[None, :, :], axis=2)
+
+            #individual tags require value >= threshold, which NaN never passes
+            individual_scores = matrix[:, self._individual_columns]
+            individual_hits = individual_scores >= self._individual_thresholds
+
+            texture_scores = matrix[:, self._texture_columns]
+            texture_hits = texture_scores >= self._texture_thresholds
+
+        #stable sort on -score keeps map order for equal scores, same as list.sort;
+        #no row can use more than max_tags candidates so the rest is dropped here
+        individual_order = np.argsort(
+            np.where(individual_hits, -individual_scores, np.inf), axis=1, kind='stable'
+        )[:, :max(max_tags, 0)]
+        texture_order = np.argsort(
+            np.where(texture_hits, -texture_scores, np.inf), axis=1, kind='stable'
+        )[:, :self.MAX_TEXTURE_TAGS]
+
+        #priority 2 candidates always sort ahead of the textures
+        candidate_index = np.concatenate(
+            [individual_order, texture_order + len(self._individual_columns)], axis=1
+        )
+        candidate_score = np.concatenate([
+            np.take_along_axis(individual_scores, individual_order, axis=1),
+            np.take_along_axis(texture_scores, texture_order, axis=1)
+        ], axis=1)
+        candidate_valid = np.concatenate([
+            np.take_along_axis(individual_hits, individual_order, axis=1),
+            np.take_along_axis(texture_hits, texture_order, axis=1)
+        ], axis=1)
+
+        #combined tags come first, candidates fill what is left of max_tags
+        combined_counts = combined_hits.sum(axis=1)
+        rank = np.cumsum(candidate_valid, axis=1)
+        selected = candidate_valid & (rank <= (max_tags - combined_counts)[:, None])
+
+        flat_candidates = zip(candidate_index[selected].tolist(), candidate_score[selected].tolist())
+        selected_counts = selected.sum(axis=1).tolist()
+        combined_codes = (combined_hits @ self._combined_bits).tolist()
+
+        candidate_tags = self._candidate_tags
+        results = []
+        for code, selected_count, cuisine in zip(combined_codes, selected_counts, cuisines):
+            tags = [dict(tag) for tag in self._get_combined_tags(code)]
+
+            for _ in range(selected_count):
+                index, score = next(flat_candidates)
+                text, emoji, category, priority = candidate_tags[index]
+                tags.append({
+                    'text': text,
+                    'emoji': emoji,
+                    'category': category,
+                    'priority': priority,
+                    'score': score
+                })
+
+            if len(tags) < max_tags and cuisine:
+                cuisine_tag = self._get_cuisine_tag(cuisine)
+                if cuisine_tag:
+                    tags.append(dict(cuisine_tag))
+
+            #every tag carries a priority, so this matches x.get('priority', 99)
+            tags.sort(key=_priority)
+            results.append(tags[:max_tags])
+
+        return results
+
+
+    def _get_combined_tags(self, code):
+        if code not in self._combined_sets:
+            self._combined_sets[code] = tuple(
+                tag for index, tag in enumerate(self._combined_tags) if code >> index & 1
+            )
+        return self._combined_sets[code]
+
+
+    def _get_cuisine_tag(self, cuisine):
+        if cuisine not in self._cuisine_tags:
+            self._cuisine_tags[cuisine] = self.tag_service._get_cuisine_tag(cuisine)
+        return self._cuisine_tags[cuisine]
+
+
+flavor_tag_engine = FlavorTagEngine()
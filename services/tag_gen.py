@@ -3,6 +3,9 @@ from models.dish_profile import DishProfile
 
 class FlavorTagService:
     """Service for generating user-friendly flavor tags from AI dish profiles"""
+
+    # Bump when the maps, patterns or selection rules below change so stored tags are recomputed
+    TAG_VERSION = 1
     
     BASIC_FLAVOR_MAP = {
         'basic_sweet': {'threshold': 0.4, 'tag': 'Sweet', 'emoji': '🍬', 'exclude': False},
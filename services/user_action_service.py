@@ -5,26 +5,79 @@ from models.taste import Taste
 from models.collection import Collection
 from models.like import Like
 from datetime import datetime
+from bson import ObjectId
+import uuid
+from sqlalchemy import select, exists, literal, literal_column, Boolean
+from sqlalchemy.dialects.postgresql import insert
 from utils.response_utils import create_response
-from sqlalchemy.orm import joinedload
 from models.merchant import Merchant
 from models.media import Media
 from models.taste import TasteRecommendState
 from mq.enums import *
-from services.rabbitmq_service import RabbitMQService
+from services.rabbitmq_service import get_rabbitmq_service
 from services.dish_management_service import DishManagementService
+from cache.dish_overview import dish_overview_cache
+from cache.merchant_dishes import merchant_dish_cache
+from services.user_state_service import UserStateService
+from services.counter_service import CounterService
+from utils.unit_of_work import UnitOfWork
+from services.media_validation import MediaValidationService
+from services.dish_service import DishService
+from utils.pagination import keyset_page
 
 class UserActionService:
 
     OBJECT_TYPE_DISH = 'DISH' 
     OBJECT_TYPE_TASTE = 'TASTE'
 
+    #user activity listings
+    DEFAULT_PAGE_SIZE = 20
+    MAX_PAGE_SIZE = 50
+
     TASTE_MESSAGE = "From Quick Recommendation"
 
 
     @staticmethod
     def _get_rabbitmq_service():
-        return RabbitMQService()
+        return get_rabbitmq_service()
+
+    @staticmethod
+    def _publish_taste_create(**message):
+        UserActionService._get_rabbitmq_service().send_taste_create(**message)
+
+    @staticmethod
+    def _publish_dish_collect(**message):
+        UserActionService._get_rabbitmq_service().send_dish_collect(**message)
+
+    @staticmethod
+    def _insert_or_restore(table, constraint, row, restore_values, target_exists):
+        """
+        Insert row, or restore the soft-deleted row it conflicts with, in one statement.
+        Nothing is written when target_exists is false or the conflicting row is active.
+
+        Args:
+            table: Table with a deletedAt soft delete column
+            constraint: Unique constraint name the conflict is detected on
+            row: Column values of a new row
+            restore_values: Columns set (besides deletedAt = NULL) when restoring
+            target_exists: EXISTS clause for the object the row points to
+
+        Returns:
+            tuple: (row id, created) or None when nothing was written
+        """
+        source = select(
+            *[literal(value, table.c[name].type).label(name) for name, value in row.items()]
+        ).where(target_exists)
+
+        stmt = insert(table).from_select(list(row), source)
+        stmt = stmt.on_conflict_do_update(
+            constraint=constraint,
+            set_={'deletedAt': None, **restore_values},
+            where=table.c.deletedAt.isnot(None)
+        ).returning(table.c._id, literal_column('xmax = 0', Boolean).label('created'))
+
+        written = db.session.execute(stmt).first()
+        return (written._id, written.created) if written else None
 
     @staticmethod
     def _check_object_exists(object_id, object_type):
@@ -47,49 +100,30 @@ class UserActionService:
             dict: Standardized response with collected and recommended dish lists
         """
         try:
-            # Verify merchant exists
-            merchant = Merchant.query.filter_by(_id=merchant_id).first()
+            # Merchant name and whether it has dishes come from the per-merchant cache
+            merchant = merchant_dish_cache.get(merchant_id)
             if not merchant:
                 return create_response(code=404, message="Merchant not found")
             
-            # Get all dishes for this merchant with proper eager loading
-            merchant_dishes = db.session.query(Dish).filter(
-                Dish.merchant_col == merchant_id
-            ).options(
-                joinedload(Dish.merchant)
-            ).all()
-            
-            if not merchant_dishes:
+            if not merchant["has_dishes"]:
                 return create_response(
                     code=0, 
                     data={"collected": [], "recommended": []},
                     message="No dishes found for this merchant"
                 )
             
-            dish_ids = [dish._id for dish in merchant_dishes]
-            
-            # Get user's collections for these dishes
-            user_collections = Collection.query.filter(
-                Collection.user == user_id,
-                Collection.object.in_(dish_ids),
-                Collection.objectType == UserActionService.OBJECT_TYPE_DISH
-            ).all()
-            
-            # Get user's recommendations (tastes) for these dishes
-            user_recommendations = Taste.query.filter(
-                Taste.userId == user_id,
-                Taste.dishId.in_(dish_ids)
-            ).all()
+            # Get the user's collection and taste IDs for these dishes
+            user_collections, user_recommendations = UserStateService.merchant_item_ids(user_id, merchant_id)
             
             
             return create_response(
                 code=0,
                 data={
-                    "collected": [dish._id for dish in user_collections],
-                    "recommended": [taste._id for taste in user_recommendations],
+                    "collected": user_collections,
+                    "recommended": user_recommendations,
                     "merchant": {
-                        "_id": merchant._id,
-                        "name": merchant.name
+                        "_id": merchant["_id"],
+                        "name": merchant["name"]
                     }
                 },
                 message=f"Found {len(user_collections)} collected and {len(user_recommendations)} recommended dishes"
@@ -103,81 +137,69 @@ class UserActionService:
 
     @staticmethod
     def recommend_dish(user_id, dish_id):
-        if not UserActionService._check_object_exists(dish_id, UserActionService.OBJECT_TYPE_DISH):
-            return False, "Object not found", 404
+        now = datetime.utcnow()
+        uow = UnitOfWork()
 
-        existing_taste = Taste.active_tastes().filter_by(
-            userId=user_id,
-            dishId=dish_id
-        ).first()
+        #create, or restore a soft-deleted taste, in one statement; an active taste is left alone
+        try:
+            written = UserActionService._insert_or_restore(
+                Taste.__table__,
+                constraint='_user_dish_taste_uc',
+                row={
+                    '_id': str(ObjectId()),
+                    'userId': user_id,
+                    'dishId': dish_id,
+                    'comment': None,
+                    'isVerified': False,
+                    'recommendState': TasteRecommendState.DEFAULT.value,
+                    'usefulTotal': 0,
+                    'mediaIds': [],
+                    'mood': 0,
+                    'state': 1,
+                    'createdAt': now,
+                    'updatedAt': now,
+                    'deletedAt': None,
+                    '__v': 0
+                },
+                restore_values={
+                    'recommendState': TasteRecommendState.DEFAULT.value,
+                    'state': Taste.state_expression(TasteRecommendState.DEFAULT.value),
+                    'updatedAt': now
+                },
+                target_exists=exists().where(Dish._id == dish_id)
+            )
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error recommend object: {e}")
+            return create_response(code=500, message="Failed to recommend", data=None)
 
-        if existing_taste:
+        if written is None:
+            db.session.rollback()
+            if not UserActionService._check_object_exists(dish_id, UserActionService.OBJECT_TYPE_DISH):
+                return create_response(code=404, message="Object not found", data=None)
             return create_response(code=409, message="Already recommended", data=None)
-        
-
-        deleted_taste = Taste.deleted_tastes().filter_by(
-            userId=user_id,
-            dishId=dish_id
-        ).first()
-        
-        if deleted_taste:
-            # Restore the deleted taste
-            deleted_taste.restore()
-            deleted_taste.recommendState = TasteRecommendState.DEFAULT.value
-            deleted_taste.state = deleted_taste.calculate_state()
-            deleted_taste.updatedAt = datetime.utcnow()
-
-
-        else:
-            new_taste = Taste(
-                            userId=user_id, 
-                            dishId=dish_id,
-                            comment = None,
-                          isVerified = False,
-                          recommendState = TasteRecommendState.DEFAULT.value,
-                          usefulTotal = 0,
-                          mediaIds = [],
-                          mood = 0,
-                          state = 1,
-                          createdAt = datetime.utcnow(),
-                          updatedAt = datetime.utcnow(),
-                          )
-        
-            db.session.add(new_taste)
 
+        taste_id, _ = written
 
-        UserActionService._update_dish_recommend_count(dish_id)
+        #created and restored tastes are both DEFAULT, counted once
+        CounterService.adjust_dish_recommend(dish_id, 1)
 
+        uow.after_commit(dish_overview_cache.invalidate, dish_id)
+        uow.after_commit(UserStateService.mark_recommended, user_id, dish_id, True)
+        uow.publish(
+            UserActionService._publish_taste_create,
+            taste_id=taste_id,
+            user_id=user_id,
+            dish_id=dish_id,
+            comment="",
+            recommend_state=TasteRecommendState.DEFAULT.value,
+            media_ids=[]
+        )
 
         try:
-            db.session.commit()
-
-            if deleted_taste:
-                rabbitmq = UserActionService._get_rabbitmq_service()
-                rabbitmq.send_taste_create(
-                taste_id=deleted_taste._id,
-                user_id=user_id,
-                dish_id=dish_id,
-                comment="",
-                recommend_state=TasteRecommendState.DEFAULT.value,
-                media_ids=[]
-            )
-
-            else:
-                rabbitmq = UserActionService._get_rabbitmq_service()
-                rabbitmq.send_taste_create(
-                    taste_id=new_taste._id,
-                    user_id=user_id,
-                    dish_id=dish_id,
-                    comment="",
-                    recommend_state=TasteRecommendState.DEFAULT.value,
-                    media_ids=[]
-                )
-            
-
+            uow.commit()
             return create_response(code=0, message="Recommended successfully", data=None)
         except Exception as e:
-            db.session.rollback()
             print(f"Error recommend object: {e}")
             return create_response(code=500, message="Failed to recommend", data=None)
 
@@ -193,30 +215,33 @@ class UserActionService:
         if not taste:
             return create_response(code=404, message="Not recommended yet", data=None)
 
+        recommend_weight = CounterService.recommend_weight(taste)
+
         taste.recommendState = TasteRecommendState.NO.value
         taste.state = taste.calculate_state()
 
 
         taste.soft_delete()
-        UserActionService._update_dish_recommend_count(dish_id)
-            
+        CounterService.adjust_dish_recommend(dish_id, -recommend_weight)
+
+        uow = UnitOfWork()
+        uow.after_commit(dish_overview_cache.invalidate, dish_id)
+        uow.after_commit(UserStateService.mark_recommended, user_id, dish_id, False)
+        uow.publish(
+            UserActionService._publish_taste_create,
+            taste_id=taste._id,
+            user_id=user_id,
+            dish_id=dish_id,
+            comment="",
+            recommend_state=TasteRecommendState.NO.value,
+            media_ids=[]
+        )
 
         try:
-            db.session.commit()
-
-            rabbitmq = UserActionService._get_rabbitmq_service()
-            rabbitmq.send_taste_create(
-                taste_id=taste._id,
-                user_id=user_id,
-                dish_id=dish_id,
-                comment="",
-                recommend_state=TasteRecommendState.NO.value,
-                media_ids=[]
-            )
+            uow.commit()
             return create_response(code=0, message="Unrecommended successfully", data=None)
         
         except Exception as e:
-            db.session.rollback()
             print(f"Error unrecommending object: {e}")
             return create_response(code=500, message="Failed to unrecommend", data=None)
 
@@ -224,50 +249,52 @@ class UserActionService:
 
     @staticmethod
     def collect_dish(user_id, dish_id):
-        if not UserActionService._check_object_exists(dish_id, UserActionService.OBJECT_TYPE_DISH):
-            return create_response(code=404, message="Object not found", data=None)
+        now = datetime.utcnow()
 
-        existing_collection = Collection.active_collections().filter_by(
-            user=user_id,
-            object=dish_id,
-            objectType=UserActionService.OBJECT_TYPE_DISH
-        ).first()
+        try:
+            written = UserActionService._insert_or_restore(
+                Collection.__table__,
+                constraint='_user_object_collection_uc',
+                row={
+                    '_id': str(uuid.uuid4()),
+                    'user': user_id,
+                    'object': dish_id,
+                    'objectType': UserActionService.OBJECT_TYPE_DISH,
+                    'createdAt': now,
+                    'updatedAt': now,
+                    'deletedAt': None,
+                    '__v': 0
+                },
+                restore_values={
+                    'objectType': UserActionService.OBJECT_TYPE_DISH,
+                    'updatedAt': now
+                },
+                target_exists=exists().where(Dish._id == dish_id)
+            )
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error collecting object: {e}")
+            return create_response(code=500, message="Failed to collect", data=None)
 
-        if existing_collection:
+        if written is None:
+            db.session.rollback()
+            if not UserActionService._check_object_exists(dish_id, UserActionService.OBJECT_TYPE_DISH):
+                return create_response(code=404, message="Object not found", data=None)
             return create_response(code=409, message="Already collected", data=None)
 
-        deleted_collection = Collection.deleted_collections().filter_by(
-            user=user_id,
-            object=dish_id,
-            objectType=UserActionService.OBJECT_TYPE_DISH
-        ).first()
-
-        if deleted_collection:
-            # Restore the deleted collection
-            deleted_collection.restore()
-
-
-        else:
-            new_collection = Collection(user=user_id, 
-                                        object=dish_id, 
-                                        objectType=UserActionService.OBJECT_TYPE_DISH
-                                        )
-                                    
-            db.session.add(new_collection)
+        uow = UnitOfWork()
+        uow.after_commit(UserStateService.mark_collected, user_id, dish_id, True)
+        uow.publish(
+            UserActionService._publish_dish_collect,
+            user_id=user_id,
+            dish_id=dish_id,
+            state=CollectState.COLLECT
+        )
 
         try:
-            db.session.commit()
-
-            rabbitmq = UserActionService._get_rabbitmq_service()
-
-            rabbitmq.send_dish_collect(user_id=user_id, 
-                                       dish_id=dish_id, 
-                                       state=CollectState.COLLECT)
-            
-
+            uow.commit()
             return create_response(code=0, message="Collected successfully", data=None)
         except Exception as e:
-            db.session.rollback()
             print(f"Error collecting object: {e}")
             return create_response(code=500, message="Failed to collect", data=None)
 
@@ -286,70 +313,64 @@ class UserActionService:
 
         collection.soft_delete()
 
-        try:
-            db.session.commit()
-
-            rabbitmq = UserActionService._get_rabbitmq_service()
-            rabbitmq.send_dish_collect(user_id=user_id, 
-                                       dish_id=dish_id, 
-                                       state=CollectState.UNCOLLECT)
+        uow = UnitOfWork()
+        uow.after_commit(UserStateService.mark_collected, user_id, dish_id, False)
+        uow.publish(
+            UserActionService._publish_dish_collect,
+            user_id=user_id,
+            dish_id=dish_id,
+            state=CollectState.UNCOLLECT
+        )
 
+        try:
+            uow.commit()
             return create_response(code=0, message="Uncollected successfully", data=None)
         except Exception as e:
-            db.session.rollback()
             print(f"Error uncollecting object: {e}")
             return create_response(code=200, message="Failed to uncollect", data=None)
         
 
     @staticmethod
     def like_taste(user_id, taste_id):
-        taste = Taste.active_tastes().filter_by(
-            _id=taste_id
-        ).first()
-
-        if not taste:
-            return create_response(code=404, message="Taste not found", data=None)
-        
-        existing_like = Like.active_likes().filter_by(
-            user=user_id,
-            object=taste_id,
-            objectType=UserActionService.OBJECT_TYPE_TASTE,
-        ).first()
+        now = datetime.utcnow()
 
-        if existing_like:
-            return create_response(code=409, message="Already liked", data=None)
-        
-        deleted_like = Like.deleted_likes().filter_by(
-            user=user_id,
-            object=taste_id,
-            objectType=UserActionService.OBJECT_TYPE_TASTE,
-        ).first()
-        
-
-        if deleted_like:
-            # Restore the deleted like
-            deleted_like.restore()
-
-        else:
-            new_like = Like(
-                user=user_id,
-                object=taste_id,
-                objectType=UserActionService.OBJECT_TYPE_TASTE,
-                createdAt=datetime.utcnow(),
-                updatedAt=datetime.utcnow(),
-                # state = 1
+        try:
+            written = UserActionService._insert_or_restore(
+                Like.__table__,
+                constraint='_user_object_type_like_uc',
+                row={
+                    '_id': str(uuid.uuid4()),
+                    'user': user_id,
+                    'object': taste_id,
+                    'objectType': UserActionService.OBJECT_TYPE_TASTE,
+                    'createdAt': now,
+                    'updatedAt': now,
+                    'deletedAt': None,
+                    '__v': 0
+                },
+                restore_values={
+                    'updatedAt': now
+                },
+                target_exists=exists().where(Taste._id == taste_id, Taste.deletedAt.is_(None))
             )
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error liking taste: {e}")
+            return create_response(code=500, message="Failed to like", data=None)
 
-            db.session.add(new_like)
+        if written is None:
+            db.session.rollback()
+            if not Taste.active_tastes().filter_by(_id=taste_id).first():
+                return create_response(code=404, message="Taste not found", data=None)
+            return create_response(code=409, message="Already liked", data=None)
 
-        UserActionService._update_taste_useful_total(taste_id)
+        CounterService.adjust_taste_useful(taste_id, 1)
 
 
         try:
-            db.session.commit()
+            UnitOfWork().commit()
             return create_response(code=0, message="Liked successfully", data=None)
         except Exception as e:
-            db.session.rollback()
             print(f"Error liking taste: {e}")
             return create_response(code=500, message="Failed to like", data=None)
         
@@ -367,13 +388,12 @@ class UserActionService:
         
         like.soft_delete()
 
-        UserActionService._update_taste_useful_total(taste_id)
+        CounterService.adjust_taste_useful(taste_id, -1)
 
         try:
-            db.session.commit()
+            UnitOfWork().commit()
             return create_response(code=0, message="Unliked successfully", data=None)
         except Exception as e:
-            db.session.rollback()
             print(f"Error unliking taste: {e}")
             return create_response(code=500, message="Failed to unlike", data=None)
         
@@ -392,6 +412,8 @@ class UserActionService:
             if not taste:
                 return create_response(code=404, message="Taste not found or you don't have permission to edit")
             
+            recommend_weight = CounterService.recommend_weight(taste)
+            
             # Update fields if provided
             if comment is not None:
                 taste.comment = comment
@@ -404,18 +426,15 @@ class UserActionService:
                 taste.recommendState = recommend_state
 
             if media_ids is not None:
-                #check if media ids are objectids or urls
+                #check if media ids are objectids or urls, resolved together in one lookup
+                resolved_media = MediaValidationService.resolve(media_ids)
                 valid_media_ids = []
                 for media_id in media_ids:
-                    if media_id.startswith('http'):
-                        media = Media.query.filter_by(url=media_id).first()
-                        if not media:
+                    if media_id not in resolved_media:
+                        if MediaValidationService.is_url(media_id):
                             return create_response(code=400, message="Invalid media url")
-                        valid_media_ids.append(media._id)
-                    else:
-                        if not Media.query.filter_by(_id=media_id).first():
-                            return create_response(code=400, message="Invalid media ids")
-                        valid_media_ids.append(media_id)
+                        return create_response(code=400, message="Invalid media ids")
+                    valid_media_ids.append(resolved_media[media_id])
                 
                 if len(valid_media_ids) != len(media_ids):
                     return create_response(code=400, message="Invalid media ids")
@@ -442,22 +461,25 @@ class UserActionService:
             # Update timestamp
             taste.updatedAt = datetime.utcnow()
             
-            # Commit changes
-            db.session.commit()
-
-            rabbitmq = UserActionService._get_rabbitmq_service()
-            rabbitmq.send_taste_create(
+            # Update dish statistics if recommendation state changed
+            recommend_delta = CounterService.recommend_weight(taste) - recommend_weight
+            CounterService.adjust_dish_recommend(taste.dishId, recommend_delta)
+            
+            uow = UnitOfWork()
+            if recommend_delta:
+                uow.after_commit(dish_overview_cache.invalidate, taste.dishId)
+            uow.publish(
+                UserActionService._publish_taste_create,
                 taste_id=taste._id,
                 user_id=taste.userId,
                 dish_id=taste.dishId,
                 comment=taste.comment,
                 recommend_state=recommend_state,
                 media_ids=taste.mediaIds
-            )   
-
-            # Update dish statistics if recommendation state changed
-            if recommend_state is not None:
-                UserActionService._update_dish_recommend_count(taste.dishId)
+            )
+            
+            # Commit changes
+            uow.commit()
              
             return create_response(
                 code=0, 
@@ -476,84 +498,181 @@ class UserActionService:
 
 
     @staticmethod
-    def _update_dish_recommend_count(dish_id):
-        """
-        Update the recommendation count for a dish.
+    def get_taste(user_id, taste_id):
+        try:
+            taste = Taste.active_tastes().filter_by(
+                _id=taste_id,
+                userId=user_id
+            ).first()
+            
+            if not taste:
+                return create_response(code=0, message="Taste not found")
+            
+            taste_data = UserActionService._taste_data(taste)
+        
+            return create_response(code=0, data=taste_data, message="Success")
         
+        except Exception as e:
+            print(f"Error getting taste: {e}")
+            return create_response(code=0, message="Failed to get taste")
+
+
+    @staticmethod
+    def _taste_data(taste):
+        return {
+            "id": taste._id,
+            "dishId": taste.dishId,
+            "comment": taste.comment,
+            "recommendState": taste.recommendState,
+            "mediaIds": taste.mediaIds or [],
+            "mood": taste.mood,
+            "tags": taste.tags or [],
+            "state": taste.state,
+            "isVerified": taste.isVerified,
+            "usefulTotal": taste.usefulTotal,
+            "createdAt": taste.createdAt.isoformat() if taste.createdAt else None,
+            "updatedAt": taste.updatedAt.isoformat() if taste.updatedAt else None
+        }
+
+
+    @staticmethod
+    def _dish_overviews_by_id(dish_ids, user_id, user_lat, user_lon):
+        """Overviews of a page of dishes keyed by dish ID, one cache/IN lookup and one user state query"""
+        dish_ids = list(dict.fromkeys(dish_id for dish_id in dish_ids if dish_id))
+        entries = DishService._get_shared_overviews(dish_ids)
+        user_states = UserStateService.resolve(user_id, list(entries.keys()))
+
+        return {
+            dish_id: DishService._apply_user_overlay(entry, user_lat, user_lon, *user_states[dish_id])
+            for dish_id, entry in entries.items()
+        }
+
+
+    @staticmethod
+    def list_user_tastes(user_id, cursor=None, limit=DEFAULT_PAGE_SIZE, user_lat=None, user_lon=None):
+        """
+        The user's tastes, most recently updated first, with their dish embedded.
+
         Args:
-            dish_id: The dish ID
+            user_id: User ID
+            cursor: nextCursor of the previous page, None for the first page
+            limit: Page size, at most MAX_PAGE_SIZE
+            user_lat/user_lon: Optional user location for dish distance
+
+        Returns:
+            dict: Standardized response with 'items' and 'nextCursor' (None on the last page)
         """
         try:
-            # Count recommendations for this dish (both YES and DEFAULT states)
-            recommend_count = Taste.active_tastes().filter(
-                Taste.dishId == dish_id,
-                Taste.recommendState.in_([TasteRecommendState.YES.value, TasteRecommendState.DEFAULT.value])
-            ).count()
-            
-            # Update dish
-            db.session.execute(
-                db.update(Dish)
-                .where(Dish._id == dish_id)
-                .values(recommendedCount=recommend_count)
+            tastes, next_cursor = keyset_page(
+                Taste.active_tastes().filter(Taste.userId == user_id),
+                Taste.updatedAt, Taste._id, cursor, limit
             )
-            
-            db.session.commit()
+
+            dishes = UserActionService._dish_overviews_by_id(
+                [taste.dishId for taste in tastes], user_id, user_lat, user_lon
+            )
+
+            items = [
+                dict(UserActionService._taste_data(taste), dish=dishes.get(taste.dishId))
+                for taste in tastes
+            ]
+
+            return create_response(code=0, data={"items": items, "nextCursor": next_cursor}, message="Success")
+
+        except ValueError as e:
+            return create_response(code=400, message=str(e))
+
         except Exception as e:
-            print(f"Error updating dish recommend count: {e}")
+            print(f"Error listing user tastes: {e}")
+            return create_response(code=500, message="Failed to list user tastes")
 
 
     @staticmethod
-    def _update_taste_useful_total(taste_id):
+    def list_user_collections(user_id, cursor=None, limit=DEFAULT_PAGE_SIZE, user_lat=None, user_lon=None):
+        """
+        The user's collected dishes, most recently collected first, with the dish embedded.
+        Same arguments and response shape as list_user_tastes.
+        """
         try:
-            # Count active likes for this taste
-            useful_count = Like.active_likes().filter_by(
-                object=taste_id,
-                objectType=UserActionService.OBJECT_TYPE_TASTE
-            ).count()
-            
-            # Update taste
-            db.session.execute(
-                db.update(Taste)
-                .where(Taste._id == taste_id)
-                .values(usefulTotal=useful_count)
+            collections, next_cursor = keyset_page(
+                Collection.active_collections().filter(
+                    Collection.user == user_id,
+                    Collection.objectType == UserActionService.OBJECT_TYPE_DISH
+                ),
+                Collection.updatedAt, Collection._id, cursor, limit
             )
-            
-            db.session.commit()
+
+            dishes = UserActionService._dish_overviews_by_id(
+                [collection.object for collection in collections], user_id, user_lat, user_lon
+            )
+
+            items = [
+                {
+                    "id": collection._id,
+                    "dishId": collection.object,
+                    "createdAt": collection.createdAt.isoformat() if collection.createdAt else None,
+                    "updatedAt": collection.updatedAt.isoformat() if collection.updatedAt else None,
+                    "dish": dishes.get(collection.object)
+                }
+                for collection in collections
+            ]
+
+            return create_response(code=0, data={"items": items, "nextCursor": next_cursor}, message="Success")
+
+        except ValueError as e:
+            return create_response(code=400, message=str(e))
+
         except Exception as e:
-            print(f"Error updating taste useful count: {e}")
+            print(f"Error listing user collections: {e}")
+            return create_response(code=500, message="Failed to list user collections")
 
 
     @staticmethod
-    def get_taste(user_id, taste_id):
+    def list_user_likes(user_id, cursor=None, limit=DEFAULT_PAGE_SIZE, user_lat=None, user_lon=None):
+        """
+        The tastes the user liked, most recently liked first, with the taste and its dish embedded.
+        Same arguments and response shape as list_user_tastes; a liked taste that was
+        deleted since is returned with taste and dish set to None.
+        """
         try:
-            taste = Taste.active_tastes().filter_by(
-                _id=taste_id,
-                userId=user_id
-            ).first()
-            
-            if not taste:
-                return create_response(code=0, message="Taste not found")
-            
-            taste_data = {
-                "id": taste._id,
-                "dishId": taste.dishId,
-                "comment": taste.comment,
-                "recommendState": taste.recommendState,
-                "mediaIds": taste.mediaIds or [],
-                "mood": taste.mood,
-                "tags": taste.tags or [],
-                "state": taste.state,
-                "isVerified": taste.isVerified,
-                "usefulTotal": taste.usefulTotal,
-                "createdAt": taste.createdAt.isoformat() if taste.createdAt else None,
-                "updatedAt": taste.updatedAt.isoformat() if taste.updatedAt else None
-            }
-        
-            return create_response(code=0, data=taste_data, message="Success")
-        
+            likes, next_cursor = keyset_page(
+                Like.active_likes().filter(
+                    Like.user == user_id,
+                    Like.objectType == UserActionService.OBJECT_TYPE_TASTE
+                ),
+                Like.updatedAt, Like._id, cursor, limit
+            )
+
+            taste_ids = [like.object for like in likes]
+            tastes = {
+                taste._id: taste
+                for taste in Taste.active_tastes().filter(Taste._id.in_(taste_ids)).all()
+            } if taste_ids else {}
+
+            dishes = UserActionService._dish_overviews_by_id(
+                [taste.dishId for taste in tastes.values()], user_id, user_lat, user_lon
+            )
+
+            items = []
+            for like in likes:
+                taste = tastes.get(like.object)
+                items.append({
+                    "id": like._id,
+                    "tasteId": like.object,
+                    "createdAt": like.createdAt.isoformat() if like.createdAt else None,
+                    "updatedAt": like.updatedAt.isoformat() if like.updatedAt else None,
+                    "taste": UserActionService._taste_data(taste) if taste else None,
+                    "dish": dishes.get(taste.dishId) if taste else None
+                })
+
+            return create_response(code=0, data={"items": items, "nextCursor": next_cursor}, message="Success")
+
+        except ValueError as e:
+            return create_response(code=400, message=str(e))
+
         except Exception as e:
-            print(f"Error getting taste: {e}")
-            return create_response(code=0, message="Failed to get taste")
+            print(f"Error listing user likes: {e}")
+            return create_response(code=500, message="Failed to list user likes")
 
 
     @staticmethod
@@ -592,6 +711,7 @@ class UserActionService:
 
             if existing_taste or deleted_taste:
                 taste = existing_taste if existing_taste else deleted_taste
+                recommend_weight = CounterService.recommend_weight(taste)
 
                 if deleted_taste and not existing_taste:
                     taste.restore()
@@ -604,13 +724,9 @@ class UserActionService:
                 taste.recommendState = recommend_state
 
                 if media_ids:
-                    valid_media_ids = []
-                    for media_id in media_ids:
-                        if Media.query.filter_by(_id=media_id).first():
-                            valid_media_ids.append(media_id)
-                    if len(valid_media_ids) != len(media_ids):
+                    if not MediaValidationService.all_exist(media_ids):
                         return create_response(code=0, message="Invalid media ids")   
-                    taste.mediaIds = valid_media_ids
+                    taste.mediaIds = list(media_ids)
                 else: 
                     taste.mediaIds = []
 
@@ -624,13 +740,16 @@ class UserActionService:
                 taste.state = taste.calculate_state()
                 taste.updatedAt = datetime.utcnow()
 
-                db.session.commit()
-
-                UserActionService._update_dish_recommend_count(taste.dishId)
+                CounterService.adjust_dish_recommend(
+                    taste.dishId, CounterService.recommend_weight(taste) - recommend_weight
+                )
 
+                uow = UnitOfWork()
+                uow.after_commit(dish_overview_cache.invalidate, taste.dishId)
+                uow.after_commit(UserStateService.mark_recommended, taste.userId, taste.dishId, True)
                 #call rabbitmq
-                rabbitmq = UserActionService._get_rabbitmq_service()
-                rabbitmq.send_taste_create(
+                uow.publish(
+                    UserActionService._publish_taste_create,
                     taste_id=taste._id,
                     user_id=taste.userId,
                     dish_id=taste.dishId,
@@ -638,6 +757,7 @@ class UserActionService:
                     recommend_state=recommend_state,
                     media_ids=taste.mediaIds
                 )
+                uow.commit()
 
                 return create_response(
                     code=0, 
@@ -671,13 +791,9 @@ class UserActionService:
                     taste.recommendState = recommend_state
                 
                 if media_ids:
-                    valid_media_ids = []
-                    for media_id in media_ids:
-                        if Media.query.filter_by(_id=media_id).first():
-                            valid_media_ids.append(media_id)
-                    if len(valid_media_ids) != len(media_ids):
+                    if not MediaValidationService.all_exist(media_ids):
                         return create_response(code=0, message="Invalid media ids")   
-                    taste.mediaIds = valid_media_ids
+                    taste.mediaIds = list(media_ids)
                 
                 if mood is not None:
                     if mood not in [0, 1, 2, 3]:
@@ -696,22 +812,24 @@ class UserActionService:
                 # Update timestamp
                 taste.updatedAt = datetime.utcnow()
                 
-                # Commit changes
-                db.session.add(taste)
-                db.session.commit()
-
-                UserActionService._update_dish_recommend_count(taste._id)
-
-
-                rabbitmq = UserActionService._get_rabbitmq_service()
-                rabbitmq.send_taste_create(
+                uow = UnitOfWork()
+                uow.add(taste)
+                CounterService.adjust_dish_recommend(taste.dishId, CounterService.recommend_weight(taste))
+
+                uow.after_commit(dish_overview_cache.invalidate, taste.dishId)
+                uow.after_commit(UserStateService.mark_recommended, taste.userId, taste.dishId, True)
+                #taste._id is only assigned on flush, read it when the publish runs
+                uow.publish(lambda: UserActionService._publish_taste_create(
                     taste_id=taste._id,
                     user_id=taste.userId,
                     dish_id=taste.dishId,
                     comment=taste.comment,
                     recommend_state=recommend_state,
                     media_ids=taste.mediaIds
-                )
+                ))
+
+                # Commit changes
+                uow.commit()
 
 
                 return create_response(
@@ -732,6 +850,163 @@ class UserActionService:
 
 
 
+    @staticmethod
+    def _validate_taste_item(item, valid_media_ids):
+        """
+        Normalize one createMany item, with the same rules as create_taste.
+
+        Returns:
+            tuple: (values, None) for a valid item, (None, error message) otherwise
+        """
+        recommend_state = item.get('recommendState', 0)
+        if recommend_state not in [0, 1, 2]:
+            return None, "Invalid recommend state"
+
+        media_ids = item.get('mediaIds', []) or []
+        if any(media_id not in valid_media_ids for media_id in media_ids):
+            return None, "Invalid media ids"
+
+        mood = item.get('mood', 0)
+        if mood not in [0, 1, 2, 3]:
+            return None, "Invalid mood value"
+
+        return {
+            'dishId': item.get('dishId', ""),
+            'comment': item.get('comment', ""),
+            'recommendState': recommend_state,
+            'mediaIds': list(media_ids),
+            'mood': mood,
+            'tags': item.get('tags', []) or []
+        }, None
+
+
+    @staticmethod
+    def create_tastes(user_id, items):
+        """
+        Create or update many tastes of one user in a single transaction.
+        Media IDs are validated in one lookup, all tastes are upserted with one
+        INSERT ... ON CONFLICT ("userId", "dishId") and dish recommend counts get
+        one batched delta. taste/create messages are published as one batch after commit.
+        Invalid items are skipped and answered the same way create_taste answers them.
+
+        Args:
+            user_id: The user ID
+            items: createMany request items (dishId, comment, mediaIds, mood, tags, recommendState)
+
+        Returns:
+            dict: Standardized response, data is one create_taste style result per item
+        """
+        try:
+            valid_media_ids = MediaValidationService.resolve(
+                [media_id for item in items for media_id in (item.get('mediaIds') or [])], allow_urls=False
+            )
+
+            results = [None] * len(items)
+            #dish_id -> (item indexes, values), a later item for the same dish wins like sequential creates
+            tastes_by_dish = {}
+            for index, item in enumerate(items):
+                values, error = UserActionService._validate_taste_item(item, valid_media_ids)
+                if error:
+                    results[index] = create_response(code=0, message=error)
+                    continue
+
+                indexes = tastes_by_dish.get(values['dishId'], ([], None))[0]
+                indexes.append(index)
+                tastes_by_dish[values['dishId']] = (indexes, values)
+
+            if not tastes_by_dish:
+                return create_response(code=0, data=results, message="Taste created successfully")
+
+            dish_ids = list(tastes_by_dish)
+            #locked until commit, so the recommend delta is taken against the row the upsert overwrites;
+            #dish order keeps concurrent batches of one user from deadlocking
+            previous = {
+                row.dishId: row for row in db.session.query(
+                    Taste.dishId, Taste.recommendState, Taste.deletedAt
+                ).filter(Taste.userId == user_id, Taste.dishId.in_(dish_ids))
+                .order_by(Taste.dishId).with_for_update().all()
+            }
+
+            now = datetime.utcnow()
+            rows = []
+            recommend_deltas = {}
+            for dish_id, (_, values) in tastes_by_dish.items():
+                taste = Taste(userId=user_id, **values)
+                rows.append({
+                    **values,
+                    '_id': str(ObjectId()),
+                    'userId': user_id,
+                    'isVerified': False,
+                    'usefulTotal': 0,
+                    'state': taste.calculate_state(),
+                    'createdAt': now,
+                    'updatedAt': now,
+                    'deletedAt': None,
+                    '__v': 0
+                })
+                recommend_deltas[dish_id] = (
+                    CounterService.recommend_weight(taste) - CounterService.recommend_weight(previous.get(dish_id))
+                )
+
+            table = Taste.__table__
+            stmt = insert(table).values(rows)
+            stmt = stmt.on_conflict_do_update(
+                constraint='_user_dish_taste_uc',
+                set_={
+                    'comment': stmt.excluded.comment,
+                    'recommendState': stmt.excluded.recommendState,
+                    'mediaIds': stmt.excluded.mediaIds,
+                    'mood': stmt.excluded.mood,
+                    'tags': stmt.excluded.tags,
+                    'isVerified': stmt.excluded.isVerified,
+                    'state': stmt.excluded.state,
+                    'updatedAt': stmt.excluded.updatedAt,
+                    'deletedAt': None
+                }
+            ).returning(table.c._id, table.c.dishId, table.c.state, table.c.recommendState)
+
+            upserted = {row.dishId: row for row in db.session.execute(stmt).all()}
+            CounterService.adjust_dish_recommend_many(recommend_deltas)
+
+            messages = []
+            for dish_id, (indexes, values) in tastes_by_dish.items():
+                row = upserted[dish_id]
+                messages.append({
+                    'taste_id': row._id,
+                    'user_id': user_id,
+                    'dish_id': dish_id,
+                    'comment': values['comment'],
+                    'recommend_state': values['recommendState'],
+                    'media_ids': values['mediaIds']
+                })
+
+                for position, index in enumerate(indexes):
+                    data = {
+                        "id": row._id,
+                        "state": row.state,
+                        "recommendState": row.recommendState
+                    }
+                    if dish_id in previous or position > 0:
+                        data["updated"] = True
+                    results[index] = create_response(code=0, data=data, message="Taste created successfully")
+
+            uow = UnitOfWork()
+            uow.after_commit(dish_overview_cache.invalidate_many, dish_ids)
+            for dish_id in dish_ids:
+                uow.after_commit(UserStateService.mark_recommended, user_id, dish_id, True)
+            uow.publish(
+                lambda: UserActionService._get_rabbitmq_service().send_taste_create_many(messages)
+            )
+            uow.commit()
+
+            return create_response(code=0, data=results, message="Taste created successfully")
+
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error creating tastes: {e}")
+            return create_response(code=500, message="Failed to create tastes")
+
+
     @staticmethod
     def delete_taste(user_id, taste_id):
         taste = Taste.active_tastes().filter_by(
@@ -744,24 +1019,29 @@ class UserActionService:
             return create_response(code=200, message="Taste not found")
 
         else:
-            rabbitmq = UserActionService._get_rabbitmq_service()
-            rabbitmq.send_taste_create(
-                    taste_id=taste._id,
-                    user_id=taste.userId,
-                    dish_id=taste.dishId,
-                    comment=taste.comment,
-                    recommend_state=TasteRecommendState.DEFAULT.value,
-                    media_ids=taste.mediaIds
-                )
+            uow = UnitOfWork()
+            uow.publish(
+                UserActionService._publish_taste_create,
+                taste_id=taste._id,
+                user_id=taste.userId,
+                dish_id=taste.dishId,
+                comment=taste.comment,
+                recommend_state=TasteRecommendState.DEFAULT.value,
+                media_ids=taste.mediaIds
+            )
+
+            recommend_weight = CounterService.recommend_weight(taste)
 
             taste.recommendState = TasteRecommendState.DEFAULT.value
             taste.state = taste.calculate_state()
 
             taste.soft_delete()
 
-            UserActionService._update_dish_recommend_count(taste.dishId)
+            CounterService.adjust_dish_recommend(taste.dishId, -recommend_weight)
 
-            db.session.commit()
+            uow.after_commit(dish_overview_cache.invalidate, taste.dishId)
+            uow.after_commit(UserStateService.mark_recommended, taste.userId, taste.dishId, False)
+            uow.commit()
             return create_response(code=0, message="Taste deleted successfully")
 
     @staticmethod
@@ -777,10 +1057,8 @@ class UserActionService:
                 return create_response(code=404, message="Merchant not found")
             
 
-            if media_ids:
-                valid_media = Media.query.filter(Media._id.in_(media_ids)).all()
-                if len(valid_media) != len(media_ids):
-                    return create_response(code=400, message="Some media IDs are invalid")
+            if media_ids and not MediaValidationService.all_exist(media_ids):
+                return create_response(code=400, message="Some media IDs are invalid")
             
             response =  DishManagementService.create_dish(
                 user_id=user_id,
@@ -0,0 +1,86 @@
+"""
+Background workers
+Periodic jobs registered by the init_* functions run on daemon threads, but the
+threads are only started on the first request a process serves. Threads do not
+survive fork, so threads started while the app is imported would be missing in
+gunicorn --preload workers, which would inherit queues and buffers nothing
+drains. Each serving process starts its own set instead, and a forked process
+first drops the DB connections it inherited from its parent.
+"""
+
+import os
+import threading
+import logging
+from extensions import db
+
+
+logger = logging.getLogger(__name__)
+
+
+#(app, name, target, interval, wakeup) of every registered worker
+_workers = []
+_created_pid = os.getpid()
+_started_pid = None
+_start_lock = threading.Lock()
+
+
+def register_background_worker(app, name, target, interval, wakeup=None):
+    """
+    Run `target` periodically on a daemon thread inside an app context, in every
+    process that serves requests.
+
+    Args:
+        app: Flask app the worker runs against
+        name: Thread name, also used in log lines
+        target: Zero-argument callable executed on every tick
+        interval: Seconds between ticks
+        wakeup: Optional threading.Event that triggers an early tick when set
+    """
+    _workers.append((app, name, target, interval, wakeup))
+
+
+def _start_worker(app, name, target, interval, wakeup):
+    def run():
+        while True:
+            try:
+                with app.app_context():
+                    target()
+            except Exception as e:
+                logger.error(f"Background worker {name} failed: {str(e)}")
+
+            if wakeup is not None:
+                wakeup.wait(interval)
+                wakeup.clear()
+            else:
+                threading.Event().wait(interval)
+
+    thread = threading.Thread(target=run, name=name, daemon=True)
+    thread.start()
+    return thread
+
+
+def start_background_workers():
+    """Start the registered workers once per process, runs before every request"""
+    global _started_pid
+
+    pid = os.getpid()
+    if _started_pid == pid:
+        return
+
+    with _start_lock:
+        if _started_pid == pid:
+            return
+
+        if pid != _created_pid:
+            #pooled connections opened before the fork belong to the parent
+            db.engine.dispose(close=False)
+
+        for app, name, target, interval, wakeup in _workers:
+            _start_worker(app, name, target, interval, wakeup)
+        _started_pid = pid
+
+    logger.info(f"Started {len(_workers)} background workers in process {pid}")
+
+
+def init_background_workers(app):
+    app.before_request(start_background_workers)
@@ -1,10 +1,17 @@
 import math
+import numpy as np
+
+
+EARTH_RADIUS_KM = 6371.0
+
+#same sphere as haversine, so bounding boxes never cut off what haversine puts inside a radius
+KM_PER_DEGREE_LAT = math.pi * EARTH_RADIUS_KM / 180
 
 
 #util for calculating distance between two points
 def haversine(lat1, lon1, lat2, lon2):
 
-    R = 6371.0
+    R = EARTH_RADIUS_KM
 
     #convert decimal degrees to radians
     lat1_rad, lon1_rad, lat2_rad, lon2_rad = map(math.radians, [lat1, lon1, lat2, lon2])
@@ -22,3 +29,16 @@ def haversine(lat1, lon1, lat2, lon2):
 
     return round(distance, 1)
 
+
+#vectorized haversine from one point (degrees) to arrays of points (radians), unrounded km
+def haversine_many(lat, lon, lats_rad, lons_rad):
+
+    R = EARTH_RADIUS_KM
+
+    lat_rad = math.radians(lat)
+    lon_rad = math.radians(lon)
+
+    a = np.sin((lats_rad - lat_rad)/2)**2 + math.cos(lat_rad) * np.cos(lats_rad) * np.sin((lons_rad - lon_rad)/2)**2
+    c = 2 * np.arctan2(np.sqrt(a), np.sqrt(1-a))
+
+    return R * c
@@ -0,0 +1,64 @@
+import hashlib
+from functools import wraps
+from flask import request, g
+from flask_jwt_extended import get_jwt_identity
+from cache.idempotency import idempotency_store
+from utils.response_utils import create_response
+
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+
+
+def mark_idempotent_result(success):
+    """For routes whose response code does not tell success apart, decide whether the response is stored"""
+    g.idempotent_success = success
+
+
+def _is_success(response):
+    success = g.pop('idempotent_success', None)
+    if success is not None:
+        return success
+
+    body = response[0] if isinstance(response, tuple) else response
+    return isinstance(body, dict) and body.get('code') == 0
+
+
+def idempotent(view):
+    """
+    Make a mutating route safe to retry with an Idempotency-Key header.
+
+    Requests without the header run as usual. Keys are scoped to the caller and
+    the endpoint (anonymous callers share one scope, guarded by the payload
+    check); a successful response is replayed for the same key, a key reused
+    with a different payload is rejected. Place it under @jwt_required().
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        idempotency_key = request.headers.get(IDEMPOTENCY_HEADER)
+        if not idempotency_key:
+            return view(*args, **kwargs)
+
+        if len(idempotency_key) > MAX_KEY_LENGTH:
+            return create_response(code=200, message=f"{IDEMPOTENCY_HEADER} must be at most {MAX_KEY_LENGTH} characters"), 200
+
+        key = (str(get_jwt_identity()), f"{request.method} {request.path}", idempotency_key)
+        fingerprint = hashlib.sha1(request.get_data()).hexdigest()
+
+        outcome, response = idempotency_store.run(
+            key, fingerprint, lambda: view(*args, **kwargs), _is_success
+        )
+
+        if outcome == idempotency_store.MISMATCH:
+            return create_response(code=200, message=f"{IDEMPOTENCY_HEADER} was already used with a different request"), 200
+
+        if outcome == idempotency_store.IN_PROGRESS:
+            return create_response(code=200, message=f"A request with this {IDEMPOTENCY_HEADER} is still in progress"), 200
+
+        if outcome == idempotency_store.REPLAYED:
+            body, status = response if isinstance(response, tuple) else (response, 200)
+            return body, status, {'Idempotent-Replayed': 'true'}
+
+        return response
+
+    return wrapper
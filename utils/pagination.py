@@ -0,0 +1,71 @@
+import json
+import base64
+from datetime import datetime
+from sqlalchemy import tuple_
+
+
+def encode_cursor(sort_value, row_id):
+    """Opaque cursor for the (sort_value, row_id) position of the last row of a page"""
+    payload = [sort_value.isoformat() if sort_value is not None else None, row_id]
+    return base64.urlsafe_b64encode(json.dumps(payload).encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """
+    Returns:
+        tuple: (sort_value datetime or None, row_id)
+
+    Raises:
+        ValueError: If the cursor was not produced by encode_cursor
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        sort_value, row_id = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        return (datetime.fromisoformat(sort_value) if sort_value is not None else None, str(row_id))
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+
+def keyset_page(query, sort_column, id_column, cursor=None, limit=20):
+    """
+    One page of query ordered newest first by (sort_column, id_column), rows with a NULL
+    sort value last. Rows are read in two phases that each seek straight to the cursor
+    position: a row-value comparison (sort_column, id_column) < (v, id) over the non-NULL
+    rows, then the NULL rows by id. A page therefore costs the same at any depth given an
+    index on the filter columns plus (sort_column, id_column); the NULL phase only runs
+    once the non-NULL rows are exhausted.
+
+    Args:
+        query: Filtered SQLAlchemy query
+        sort_column/id_column: Keyset columns, id_column must be unique
+        cursor: Cursor returned with the previous page, None for the first page
+        limit: Page size
+
+    Returns:
+        tuple: (rows, next cursor or None on the last page)
+
+    Raises:
+        ValueError: On an invalid cursor
+    """
+    sort_value, row_id = decode_cursor(cursor) if cursor else (None, None)
+    in_null_phase = cursor and sort_value is None
+
+    rows = []
+    if not in_null_phase:
+        dated = query.filter(sort_column.isnot(None))
+        if cursor:
+            dated = dated.filter(tuple_(sort_column, id_column) < tuple_(sort_value, row_id))
+        rows = dated.order_by(sort_column.desc(), id_column.desc()).limit(limit + 1).all()
+
+    if len(rows) <= limit:
+        undated = query.filter(sort_column.is_(None))
+        if in_null_phase:
+            undated = undated.filter(id_column < row_id)
+        rows += undated.order_by(id_column.desc()).limit(limit + 1 - len(rows)).all()
+
+    if len(rows) <= limit:
+        return rows, None
+
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, encode_cursor(getattr(last, sort_column.key), getattr(last, id_column.key))
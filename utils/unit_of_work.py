@@ -0,0 +1,71 @@
+import logging
+from extensions import db
+from mq.outbox import outbox
+
+
+logger = logging.getLogger(__name__)
+
+
+class UnitOfWork:
+    """
+    One transaction per user action.
+
+    The action rows and the counter deltas staged by CounterService are committed
+    together by a single commit(). Side effects that must only happen for
+    committed data (MQ publish, cache write-through) are queued with after_commit
+    and run in order once the commit succeeds; they are dropped on failure.
+    MQ publishes queued with publish() instead become outbox rows of the same
+    transaction when the outbox is enabled.
+    """
+
+    def __init__(self, session=None):
+        self.session = session if session is not None else db.session
+        #(callback, args, kwargs, is_publish)
+        self._callbacks = []
+
+    def add(self, instance):
+        self.session.add(instance)
+
+    def after_commit(self, callback, *args, **kwargs):
+        """Queue callback(*args, **kwargs) to run after a successful commit"""
+        self._callbacks.append((callback, args, kwargs, False))
+
+    def publish(self, callback, *args, **kwargs):
+        """
+        Queue a callback that sends MQ messages. With the outbox enabled it runs
+        right before the commit (after a flush, so generated IDs are set) and its
+        messages are committed with the action; otherwise it runs after commit.
+        """
+        self._callbacks.append((callback, args, kwargs, True))
+
+    def commit(self):
+        """
+        Commit the transaction, then run the queued callbacks.
+        A failing callback is logged and does not affect the committed action.
+
+        Raises:
+            Exception: Whatever the commit (or an outbox publish) raised, after rolling back
+        """
+        callbacks, self._callbacks = self._callbacks, []
+        transactional = outbox.enabled
+
+        try:
+            publishes = [entry for entry in callbacks if entry[3]]
+            if transactional and publishes:
+                self.session.flush()
+                with outbox.capture(self.session):
+                    for callback, args, kwargs, _ in publishes:
+                        callback(*args, **kwargs)
+
+            self.session.commit()
+        except Exception:
+            self.session.rollback()
+            raise
+
+        for callback, args, kwargs, is_publish in callbacks:
+            if is_publish and transactional:
+                continue
+            try:
+                callback(*args, **kwargs)
+            except Exception as e:
+                logger.error(f"After-commit callback {getattr(callback, '__name__', callback)} failed: {str(e)}")